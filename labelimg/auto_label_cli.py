@@ -1,59 +1,60 @@
 #!/usr/bin/env python3
 import os
 import argparse
-from PyQt5.QtWidgets import QApplication
-from labelimg.controller.label_controller import LabelController
-from labelimg.gui.main_window import LabelingTool as MainWindow
+import time
+
+from labelimg.inference.batch_label import (PROGRESS_FILENAME, BatchAutoLabeler, annotation_file, build_visuals,
+                                            list_images, load_classes)
 
 def main():
-    parser = argparse.ArgumentParser(description='批量自動標註工具')
+    parser = argparse.ArgumentParser(description='批量自動標註工具（不需要圖形介面）')
     parser.add_argument('--prompt-dir', required=True, help='包含提示圖像的目錄')
     parser.add_argument('--target-dir', required=True, help='需要標註的目標圖像目錄')
     parser.add_argument('--class-file', required=True, help='類別定義文件路徑')
+    parser.add_argument('--model', default='pretrain/yoloe-v8l-seg.pt', help='YOLOE 模型文件路徑')
+    parser.add_argument('--format', default='YOLO', choices=['YOLO', 'VOC'], help='輸出標註格式')
+    parser.add_argument('--batch-size', type=int, default=8, help='每次推理的圖像數')
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 4), help='解碼圖像的線程數')
+    parser.add_argument('--min-box-size', type=int, default=1, help='小於此尺寸（像素）的框會被丟棄')
+    parser.add_argument('--resume', action='store_true', help='跳過上次中斷前已處理的圖像')
     args = parser.parse_args()
 
-    # 初始化 Qt 應用
-    app = QApplication([])
-    
-    # 創建主窗口
-    main_window = MainWindow()
-    
     # 加載類別定義
-    if os.path.exists(args.class_file):
-        # main_window.load_classes(args.class_file)
-        main_window.loadClasses(args.class_file)
-    else:
+    if not os.path.exists(args.class_file):
         print(f"錯誤: 類別文件不存在: {args.class_file}")
-        return
-        
-    print("Loading classes done")
-    
-    # 獲取提示圖像
-    prompt_images = []
-    for filename in os.listdir(args.prompt_dir):
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-            image_path = os.path.join(args.prompt_dir, filename)
-            # 檢查是否有對應的標註文件
-            base_name = os.path.splitext(filename)[0]
-            for ext in ['.xml', '.txt', '.json']:
-                annot_path = os.path.join(args.prompt_dir, base_name + ext)
-                if os.path.exists(annot_path):
-                    prompt_images.append(image_path)
-                    break
-                    
+        return 1
+    classes = load_classes(args.class_file)
+    print(f"Loaded {len(classes)} classes")
+
+    # 獲取提示圖像（有標註文件的圖像）
+    prompt_images = [p for p in list_images(args.prompt_dir) if annotation_file(p) is not None]
+    prompt_images, visuals = build_visuals(prompt_images, classes)
     if not prompt_images:
         print("錯誤: 未找到帶有標註的提示圖像")
-        return
-        
-    # 創建控制器
-    controller = LabelController(main_window)
-    
-    print("Label controller created and going to handle")
-    # 執行批量自動標註
+        return 1
+    print(f"Using {len(prompt_images)} prompt images")
+
+    # 模型依賴 torch，只在真正需要時導入
+    from labelimg.inference.autolableing import YOLOEWrapper
+    labeler = BatchAutoLabeler(YOLOEWrapper(args.model, class_names=classes), classes, fmt=args.format,
+                               batch_size=args.batch_size, workers=args.workers, min_box_size=args.min_box_size,
+                               progress_path=os.path.join(args.target_dir, PROGRESS_FILENAME))
+
+    start = time.perf_counter()
+
+    def report(done, total, result):
+        status = "ok" if result.error is None else f"failed: {result.error}"
+        rate = done / max(time.perf_counter() - start, 1e-9)
+        print(f"[{done}/{total}] {os.path.basename(result.item)} {status} ({rate:.1f} img/s)")
+
     try:
-        controller.handle_batch_auto_label_with_vp(prompt_images, args.target_dir)
-    except Exception as e:
-        print(f"自動標註過程中出錯: {e}")
-        
+        stats = labeler.run(prompt_images, visuals, list_images(args.target_dir), resume=args.resume, progress=report)
+    except KeyboardInterrupt:
+        labeler.cancel()
+        print("已中斷，使用 --resume 可從中斷處繼續")
+        return 130
+    print(f"批量自動標註完成: 成功 {stats['succeeded']}, 失敗 {stats['failed']}, 跳過 {stats['skipped']}")
+    return 0 if stats['failed'] == 0 else 2
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    raise SystemExit(main())
@@ -279,18 +279,16 @@ class LabelController:
             total_boxes = 0
             skipped_images = 0
             
+            # 提示的VPE只計算一次，所有目標圖像共用
+            model.set_visual_prompts(prompt_image_paths[0], visuals, conf_threshold=0.25)
+            
             for i, image_path in enumerate(unlabeled_images, 1):
                 try:
                     self._show_status_message(f"正在處理第 {i}/{total_images} 張圖像: {os.path.basename(image_path)}")
                     print(f"[Debug] 处理第 {i}/{total_images} 张图片: {image_path}")
                     
                     # 執行預測
-                    predictions = model.auto_label_with_vp(
-                        prompt_image_paths[0],
-                        visuals,
-                        image_path,
-                        conf_threshold=0.25
-                    )
+                    predictions = model.predict_with_prompts(image_path, conf_threshold=0.25)
                     print(f"[Debug] 预测结果: {predictions}")
                     
                     # 添加預測結果
@@ -384,31 +382,5 @@ class LabelController:
         return unlabeled_images 
 
     def saveYOLOAnnotation(self):
-        img_path = self.image_list[self.current_index]
-        txt_path = os.path.splitext(img_path)[0] + '.txt'
-        print(f"[Debug] 尝试保存标注到: {txt_path}")
-        print(f"[Debug] 当前边界框数量: {len(self.bboxes)}")
-        try:
-            height, width = self.current_image.shape[:2]
-            valid_boxes = 0
-            with open(txt_path, 'w') as f:
-                for bbox in self.bboxes:
-                    print(f"[Debug] 处理边界框: x={bbox.x}, y={bbox.y}, w={bbox.w}, h={bbox.h}, label={bbox.label}")
-                    if (bbox.w < self.min_box_size or bbox.h < self.min_box_size or 
-                        bbox.x < 0 or bbox.y < 0 or 
-                        bbox.x + bbox.w > width or bbox.y + bbox.h > height):
-                        print(f"[Debug] 边界框被过滤: 尺寸或位置无效")
-                        continue
-                    try:
-                        class_idx = self.classes.index(bbox.label)
-                    except ValueError:
-                        print(f"[Debug] 边界框被过滤: 类别 {bbox.label} 不在类别列表中")
-                        continue
-                    x_center = (bbox.x + bbox.w/2) / width
-                    y_center = (bbox.y + bbox.h/2) / height
-                    w_norm = bbox.w / width
-                    h_norm = bbox.h / height
-                    f.write(f"{class_idx} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n")
-                    valid_boxes += 1
-        except Exception as e:
-            print(f"保存标注失败: {str(e)}") 
\ No newline at end of file
+        """保存主窗口当前图片的 YOLO 标注（与主窗口共用同一套编码和后台保存逻辑）"""
+        return self.main_window.saveYOLOAnnotation() 
\ No newline at end of file
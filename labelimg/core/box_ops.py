@@ -0,0 +1,42 @@
+import numpy as np
+
+# 批量操作：把选中的框转成 (N, 4) 的 [x, y, w, h] 整数数组，一次性完成移动/缩放/裁剪
+
+
+def boxes_to_array(boxes) -> np.ndarray:
+    """Stack BoundingBox-like objects into an (N, 4) int array of x, y, w, h."""
+    return np.array([(b.x, b.y, b.w, b.h) for b in boxes], dtype=np.int64).reshape(-1, 4)
+
+
+def write_back(boxes, arr: np.ndarray):
+    """Copy rows of ``arr`` back onto the matching box objects."""
+    for box, (x, y, w, h) in zip(boxes, arr.tolist()):
+        box.x, box.y, box.w, box.h = x, y, w, h
+
+
+def translate(arr: np.ndarray, dx: int, dy: int, img_w: int, img_h: int) -> np.ndarray:
+    """Move every box by (dx, dy); each box is clamped inside the image on its own."""
+    out = arr.copy()
+    out[:, 0] = np.clip(arr[:, 0] + dx, 0, np.maximum(img_w - arr[:, 2], 0))
+    out[:, 1] = np.clip(arr[:, 1] + dy, 0, np.maximum(img_h - arr[:, 3], 0))
+    return out
+
+
+def clip_to_image(arr: np.ndarray, img_w: int, img_h: int, min_size: int = 1) -> np.ndarray:
+    """Clip boxes to the image, keeping at least ``min_size`` pixels per side."""
+    x1 = np.clip(arr[:, 0], 0, max(img_w - min_size, 0))
+    y1 = np.clip(arr[:, 1], 0, max(img_h - min_size, 0))
+    x2 = np.clip(arr[:, 0] + arr[:, 2], x1 + min_size, img_w)
+    y2 = np.clip(arr[:, 1] + arr[:, 3], y1 + min_size, img_h)
+    return np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+
+
+def scale_about_centers(arr: np.ndarray, factor: float, img_w: int, img_h: int,
+                        min_size: int = 1) -> np.ndarray:
+    """Grow or shrink every box by ``factor`` around its own center."""
+    w = np.maximum(np.rint(arr[:, 2] * factor), min_size)
+    h = np.maximum(np.rint(arr[:, 3] * factor), min_size)
+    x = np.rint(arr[:, 0] + (arr[:, 2] - w) / 2)
+    y = np.rint(arr[:, 1] + (arr[:, 3] - h) / 2)
+    scaled = np.stack([x, y, w, h], axis=1).astype(np.int64)
+    return clip_to_image(scaled, img_w, img_h, min_size)
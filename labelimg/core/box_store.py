@@ -0,0 +1,177 @@
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .bounding_box import BoundingBox
+
+UNKNOWN_LABEL = "unknown"
+
+
+class BoxView:
+    """Row view into a BoxStore with the BoundingBox attribute interface.
+
+    Reads and writes go straight to the store's arrays. A view is only valid
+    until rows are removed from its store.
+    """
+    __slots__ = ('_store', '_i')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._i = index
+
+    x = property(lambda self: int(self._store.xywh[self._i, 0]),
+                 lambda self, v: self._store.xywh.__setitem__((self._i, 0), int(v)))
+    y = property(lambda self: int(self._store.xywh[self._i, 1]),
+                 lambda self, v: self._store.xywh.__setitem__((self._i, 1), int(v)))
+    w = property(lambda self: int(self._store.xywh[self._i, 2]),
+                 lambda self, v: self._store.xywh.__setitem__((self._i, 2), int(v)))
+    h = property(lambda self: int(self._store.xywh[self._i, 3]),
+                 lambda self, v: self._store.xywh.__setitem__((self._i, 3), int(v)))
+
+    @property
+    def label(self):
+        return self._store.names[self._store.class_id[self._i]]
+
+    @label.setter
+    def label(self, value):
+        self._store.class_id[self._i] = self._store.class_index(value)
+
+    @property
+    def confidence(self):
+        value = self._store.confidence[self._i]
+        return None if np.isnan(value) else float(value)
+
+    def to_box(self) -> BoundingBox:
+        return BoundingBox(self.x, self.y, self.w, self.h, self.label, self.confidence)
+
+
+class BoxStore:
+    """Columnar storage for the boxes of one image.
+
+    ``xywh`` is an (N, 4) int32 array; ``class_id`` indexes ``names`` and
+    ``confidence`` is float32 with NaN for hand-drawn boxes. Labels that are
+    not in ``names`` yet are appended, so every box keeps its label text.
+    Iterating yields BoxView rows, so read-only code written for lists of
+    BoundingBox works unchanged.
+    """
+
+    def __init__(self, names: Sequence[str] = (), xywh=None, class_id=None, confidence=None):
+        self.names: List[str] = list(names)
+        self._name_index = {name: i for i, name in enumerate(self.names)}
+        self.xywh = np.zeros((0, 4), np.int32) if xywh is None else np.asarray(xywh, np.int32).reshape(-1, 4)
+        n = len(self.xywh)
+        self.class_id = np.zeros(n, np.int32) if class_id is None else np.asarray(class_id, np.int32)
+        self.confidence = (np.full(n, np.nan, np.float32) if confidence is None
+                           else np.asarray(confidence, np.float32))
+
+    # --- construction -------------------------------------------------
+    @classmethod
+    def from_boxes(cls, boxes: Iterable, names: Sequence[str] = ()) -> 'BoxStore':
+        store = cls(names)
+        boxes = list(boxes)
+        store.xywh = np.array([(b.x, b.y, b.w, b.h) for b in boxes], np.int32).reshape(-1, 4)
+        store.class_id = np.array([store.class_index(b.label) for b in boxes], np.int32)
+        store.confidence = np.array(
+            [np.nan if getattr(b, 'confidence', None) is None else b.confidence for b in boxes], np.float32)
+        return store
+
+    @classmethod
+    def from_yolo(cls, rows, names: Sequence[str], width: int, height: int) -> 'BoxStore':
+        """Build from (N, 5) YOLO rows: class, x_center, y_center, w, h (normalized)."""
+        rows = np.asarray(rows, np.float64).reshape(-1, 5)
+        store = cls(names)
+        w = rows[:, 3] * width
+        h = rows[:, 4] * height
+        # 与逐行 int() 截断保持一致
+        store.xywh = np.stack([(rows[:, 1] - rows[:, 3] / 2) * width,
+                               (rows[:, 2] - rows[:, 4] / 2) * height, w, h], axis=1).astype(np.int32)
+        class_id = rows[:, 0].astype(np.int32)
+        known = (class_id >= 0) & (class_id < len(store.names))
+        if not known.all():
+            class_id[~known] = store.class_index(UNKNOWN_LABEL)
+        store.class_id = class_id
+        store.confidence = np.full(len(rows), np.nan, np.float32)
+        return store
+
+    @classmethod
+    def from_xyxy(cls, xyxy, class_id, confidence=None, names: Sequence[str] = ()) -> 'BoxStore':
+        """Build from detector output: (N, 4) float corners, class ids and scores."""
+        xyxy = np.asarray(xyxy, np.float64).reshape(-1, 4)
+        xywh = np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]]).astype(np.int32)
+        store = cls(names, xywh, class_id, confidence)
+        original = store.class_id.copy()
+        # 超出类别表的 id 用数字本身作为标签
+        for cid in np.unique(original[original >= len(store.names)]).tolist():
+            store.class_id[original == cid] = store.class_index(str(cid))
+        return store
+
+    def to_boxes(self) -> List[BoundingBox]:
+        names = self.names
+        return [BoundingBox(x, y, w, h, names[c], None if conf != conf else conf)
+                for (x, y, w, h), c, conf in zip(self.xywh.tolist(), self.class_id.tolist(),
+                                                 self.confidence.tolist())]
+
+    def to_yolo(self, names: Sequence[str], width: int, height: int):
+        """Return (class_idx, normalized xc/yc/w/h) for boxes whose label is in ``names``."""
+        lookup = {name: i for i, name in enumerate(names)}
+        remap = np.array([lookup.get(name, -1) for name in self.names], np.int32)
+        class_idx = remap[self.class_id] if len(self.names) else np.zeros(0, np.int32)
+        keep = class_idx >= 0
+        xywh = self.xywh[keep].astype(np.float64)
+        norm = np.column_stack([(xywh[:, 0] + xywh[:, 2] / 2) / width,
+                                (xywh[:, 1] + xywh[:, 3] / 2) / height,
+                                xywh[:, 2] / width, xywh[:, 3] / height])
+        return class_idx[keep], norm
+
+    # --- access -------------------------------------------------------
+    def class_index(self, label: str) -> int:
+        idx = self._name_index.get(label)
+        if idx is None:
+            idx = len(self.names)
+            self.names.append(label)
+            self._name_index[label] = idx
+        return idx
+
+    @property
+    def labels(self) -> List[str]:
+        names = self.names
+        return [names[c] for c in self.class_id.tolist()]
+
+    def __len__(self):
+        return len(self.xywh)
+
+    def __iter__(self):
+        return (BoxView(self, i) for i in range(len(self.xywh)))
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(index)
+            return BoxView(self, int(index))
+        return self.subset(index)
+
+    def subset(self, index) -> 'BoxStore':
+        """New store with the rows selected by a slice, index array or boolean mask."""
+        return BoxStore(self.names, self.xywh[index].copy(), self.class_id[index].copy(),
+                        self.confidence[index].copy())
+
+    def copy(self) -> 'BoxStore':
+        return self.subset(slice(None))
+
+    def append(self, x, y, w, h, label: str, confidence: Optional[float] = None):
+        self.xywh = np.vstack([self.xywh, np.array([[x, y, w, h]], np.int32)])
+        self.class_id = np.append(self.class_id, np.int32(self.class_index(label)))
+        self.confidence = np.append(self.confidence, np.float32(np.nan if confidence is None else confidence))
+
+    def valid_mask(self, width: int, height: int, min_size: int = 1) -> np.ndarray:
+        """Boxes at least ``min_size`` on each side and fully inside the image."""
+        x, y, w, h = self.xywh.T
+        return ((w >= min_size) & (h >= min_size) & (x >= 0) & (x < width) & (y >= 0) & (y < height) &
+                (x + w <= width) & (y + h <= height))
+
+    @property
+    def nbytes(self) -> int:
+        return self.xywh.nbytes + self.class_id.nbytes + self.confidence.nbytes
+
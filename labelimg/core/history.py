@@ -0,0 +1,248 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+from .bounding_box import BoundingBox
+
+# 撤销/重做只记录变化的框（增、删、改），不再对整张图的框列表做深拷贝
+
+
+def box_state(box) -> tuple:
+    """Immutable (x, y, w, h, label, confidence) snapshot of one box."""
+    return (box.x, box.y, box.w, box.h, box.label, getattr(box, 'confidence', None))
+
+
+def same_box(state, other, tolerance: int = 1) -> bool:
+    """Whether two states describe the same box.
+
+    Coordinates may differ by ``tolerance`` pixels and confidence is
+    ignored, since neither survives a round trip through a YOLO file.
+    """
+    return (state[4] == other[4] and abs(state[0] - other[0]) <= tolerance and
+            abs(state[1] - other[1]) <= tolerance and abs(state[2] - other[2]) <= tolerance and
+            abs(state[3] - other[3]) <= tolerance)
+
+
+def _restore(box, state):
+    box.x, box.y, box.w, box.h, box.label = state[:5]
+    box.confidence = state[5]
+
+
+class Edit:
+    """One undoable step on one image's box list.
+
+    Either an in-place change (``modified``: index, before, after) or a
+    structural one (``removed``/``added``: index, state). Removed indices
+    refer to the list before the edit, added indices to the list after it;
+    ``count`` is the list length before the edit. Both directions check the
+    affected rows first and refuse to touch a list that no longer matches.
+    """
+    __slots__ = ('modified', 'removed', 'added', 'count', 'coalesce', 'stamp')
+
+    def __init__(self, count: int, modified=(), removed=(), added=(), coalesce: Optional[Hashable] = None):
+        self.modified = list(modified)
+        self.removed = sorted(removed, key=lambda e: e[0])
+        self.added = sorted(added, key=lambda e: e[0])
+        if self.modified and (self.removed or self.added):
+            raise ValueError("an edit either modifies boxes in place or adds/removes them")
+        self.count = count
+        self.coalesce = coalesce
+        self.stamp = time.monotonic()
+
+    def __len__(self):
+        """Number of box states kept by this edit (its memory cost)."""
+        return 2 * len(self.modified) + len(self.removed) + len(self.added)
+
+    @staticmethod
+    def _matches(boxes, entries) -> bool:
+        count = len(boxes)
+        return all(0 <= i < count and same_box(box_state(boxes[i]), state) for i, state in entries)
+
+    def revert(self, boxes: list) -> bool:
+        """Undo this edit on ``boxes`` in place; False if the list no longer matches it."""
+        if self.modified:
+            if not self._matches(boxes, [(i, after) for i, _, after in self.modified]):
+                return False
+            for i, before, _ in self.modified:
+                _restore(boxes[i], before)
+            return True
+        if len(boxes) != self.count - len(self.removed) + len(self.added) or not self._matches(boxes, self.added):
+            return False
+        for i, _ in reversed(self.added):
+            del boxes[i]
+        for i, state in self.removed:
+            boxes.insert(i, BoundingBox(*state))
+        return True
+
+    def apply(self, boxes: list) -> bool:
+        """Redo this edit on ``boxes`` in place; False if the list no longer matches it."""
+        if self.modified:
+            if not self._matches(boxes, [(i, before) for i, before, _ in self.modified]):
+                return False
+            for i, _, after in self.modified:
+                _restore(boxes[i], after)
+            return True
+        if len(boxes) != self.count or not self._matches(boxes, self.removed):
+            return False
+        for i, _ in reversed(self.removed):
+            del boxes[i]
+        for i, state in self.added:
+            boxes.insert(i, BoundingBox(*state))
+        return True
+
+    def inverted(self) -> 'Edit':
+        """An edit that undoes this one when applied."""
+        if self.modified:
+            return Edit(self.count, modified=[(i, after, before) for i, before, after in self.modified])
+        return Edit(self.count - len(self.removed) + len(self.added), removed=self.added, added=self.removed)
+
+    def merge(self, newer: 'Edit') -> bool:
+        """Fold a later in-place edit of the same boxes into this one."""
+        if not (self.modified and newer.modified) or [e[0] for e in self.modified] != [e[0] for e in newer.modified]:
+            return False
+        self.modified = [(i, before, after) for (i, before, _), (_, _, after) in zip(self.modified, newer.modified)]
+        self.stamp = newer.stamp
+        return True
+
+
+class EditHistory:
+    """Per-image undo/redo stacks of Edit deltas under one global budget.
+
+    Memory is counted in stored box states, so a step costs as much as the
+    number of boxes it touched. When the total goes over ``max_states``
+    the histories of the least recently edited images are dropped first.
+    In-place edits recorded with the same ``coalesce`` key within
+    ``coalesce_window`` seconds merge into a single step (e.g. a run of
+    arrow-key nudges).
+
+    With a ``journal`` (an EditJournal, keys are image paths) every step is
+    also logged to disk, and an image's stacks are replayed from the
+    journal the first time it is touched, so undo works across sessions.
+    """
+
+    def __init__(self, max_steps: int = 100, max_states: int = 200_000, coalesce_window: float = 1.0,
+                 journal=None):
+        self.max_steps = max_steps
+        self.max_states = max_states
+        self.coalesce_window = coalesce_window
+        self.journal = journal
+        self._loaded = set()  # 已从日志回放过的图片
+        self._undo: Dict[Hashable, List[Edit]] = {}
+        self._redo: Dict[Hashable, List[Edit]] = {}
+        self._recent: 'OrderedDict[Hashable, None]' = OrderedDict()  # 最近编辑的图片排在最后
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _touch(self, key):
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+
+    def _ensure_loaded(self, key):
+        if self.journal is None or key in self._loaded:
+            return
+        self._loaded.add(key)
+        if self._undo.get(key) or self._redo.get(key):
+            return
+        undo, redo = self.journal.replay(key, self.max_steps)
+        if not undo and not redo:
+            return
+        self._undo[key], self._redo[key] = undo, redo
+        self._size += sum(len(e) for e in undo) + sum(len(e) for e in redo)
+        self._touch(key)
+        self._enforce_budget(key)
+
+    def record(self, key, edit: Edit, batch: Optional[str] = None):
+        """Push ``edit`` for image ``key`` and drop that image's redo stack."""
+        if not len(edit):
+            return
+        self._ensure_loaded(key)
+        self._size -= sum(len(e) for e in self._redo.pop(key, ()))
+        stack = self._undo.setdefault(key, [])
+        top = stack[-1] if stack else None
+        if (top is not None and edit.coalesce is not None and top.coalesce == edit.coalesce and
+                edit.stamp - top.stamp <= self.coalesce_window):
+            logged = Edit(edit.count, edit.modified)  # 合并前的原始记录写入日志
+            if top.merge(edit):
+                if self.journal is not None:
+                    self.journal.log_edit(key, logged, merged=True, batch=batch)
+                self._touch(key)
+                return
+        if self.journal is not None:
+            self.journal.log_edit(key, edit, batch=batch)
+        stack.append(edit)
+        self._size += len(edit)
+        if len(stack) > self.max_steps:
+            self._size -= len(stack.pop(0))
+        self._touch(key)
+        self._enforce_budget(key)
+
+    def _enforce_budget(self, current):
+        while self._size > self.max_states and self._recent:
+            oldest = next(iter(self._recent))
+            if oldest == current:
+                break
+            self._forget(oldest)
+        stack = self._undo.get(current, [])
+        while self._size > self.max_states and len(stack) > 1:
+            self._size -= len(stack.pop(0))
+
+    def undo(self, key, boxes: list) -> bool:
+        """Revert the latest edit of image ``key`` on ``boxes``; True if anything changed."""
+        return self._step(key, boxes, self._undo, self._redo, Edit.revert)
+
+    def redo(self, key, boxes: list) -> bool:
+        return self._step(key, boxes, self._redo, self._undo, Edit.apply)
+
+    def _step(self, key, boxes, source, target, action) -> bool:
+        self._ensure_loaded(key)
+        stack = source.get(key)
+        if not stack:
+            return False
+        edit = stack.pop()
+        if not action(edit, boxes):
+            # 框列表已被历史以外的操作改写（如重新加载标注文件），旧记录不再适用
+            print(f"[Debug] 撤销记录与当前标注不一致，清空图片 {key} 的历史")
+            self._size -= len(edit)
+            self.clear(key)
+            return False
+        edit.coalesce = None  # 撤销/重做后不再与新的操作合并
+        target.setdefault(key, []).append(edit)
+        if self.journal is not None:
+            self.journal.log(key, 'u' if source is self._undo else 'r')
+        self._touch(key)
+        return True
+
+    def can_undo(self, key) -> bool:
+        self._ensure_loaded(key)
+        return bool(self._undo.get(key))
+
+    def can_redo(self, key) -> bool:
+        self._ensure_loaded(key)
+        return bool(self._redo.get(key))
+
+    def _forget(self, key):
+        """Drop one image's stacks from memory; the journal (if any) can replay them later."""
+        for stacks in (self._undo, self._redo):
+            self._size -= sum(len(e) for e in stacks.pop(key, ()))
+        self._recent.pop(key, None)
+        self._loaded.discard(key)
+
+    def clear(self, key=None):
+        """Invalidate the history of one image (also in the journal).
+
+        Without ``key`` only the in-memory stacks of every image are dropped.
+        """
+        if key is None:
+            self._undo.clear()
+            self._redo.clear()
+            self._recent.clear()
+            self._loaded.clear()
+            self._size = 0
+            return
+        self._forget(key)
+        self._loaded.add(key)  # 日志中已标记失效，无需再回放
+        if self.journal is not None:
+            self.journal.log(key, 'x')
@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import cv2
+
+DEFAULT_CACHE_BYTES = 768 * 1024 * 1024
+
+
+class ImageCache:
+    """LRU cache of decoded images bounded by total array size in bytes.
+
+    Entries are keyed by (path, mtime_ns, variant), so an image that changes
+    on disk is decoded again instead of served stale. ``variant`` separates
+    derived images of the same file (e.g. thumbnails) from the full decode.
+    Safe to use from the prefetch threads and the GUI thread at once.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str, variant: str):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        return (path, mtime_ns, variant)
+
+    def get(self, path: str, variant: str = ''):
+        key = self._key(path, variant)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, path: str, image, variant: str = ''):
+        if image is None:
+            return
+        self._insert(self._key(path, variant), image)
+
+    def load(self, path: str, loader: Optional[Callable] = None, variant: str = ''):
+        """Return the cached image for ``path`` or decode it with ``loader`` (cv2.imread)."""
+        key = self._key(path, variant)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+        # 解码不持有锁，其他线程可以同时读取缓存
+        image = (loader or cv2.imread)(path)
+        if image is not None:
+            self._insert(key, image)
+        return image
+
+    def _insert(self, key, image):
+        size = image.nbytes
+        if size > self.max_bytes:
+            return  # never evict everything for one oversized image
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            # 同一文件的旧版本不再需要
+            for stale in [k for k in self._entries if k[0] == key[0] and k[2] == key[2]]:
+                self.current_bytes -= self._entries.pop(stale).nbytes
+            self._entries[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def set_max_bytes(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_shared_cache = None
+
+
+def get_image_cache() -> ImageCache:
+    """Process-wide cache shared by the viewer, prefetcher, exporters and auto-labeling."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ImageCache()
+    return _shared_cache
@@ -2,35 +2,55 @@ import os
 import cv2
 from typing import List, Optional
 
+from .image_cache import get_image_cache
+from .manifest import IMAGE_EXTENSIONS, ImageManifest
+from .prefetch import ImagePrefetcher
+
 class ImageManager:
     def __init__(self, image_dir: Optional[str] = None, valid_exts=None):
         self.image_dir = image_dir
-        self.valid_exts = valid_exts or ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff')
+        self.valid_exts = valid_exts or IMAGE_EXTENSIONS
+        self.manifest: Optional[ImageManifest] = None
         self.image_list: List[str] = []
         self.current_index: int = -1
         self.current_image = None
-        self.thumbnail_cache = {}
+        self.image_cache = get_image_cache()
+        self.thumbnail_size = (128, 128)
         self.preload_window = 2  # 預加載前後各2張
+        self.prefetcher = ImagePrefetcher(loader=self._prefetch_load, radius=self.preload_window)
         if image_dir:
             self.scan_images(image_dir)
 
     def scan_images(self, image_dir: str):
         self.image_dir = image_dir
-        self.image_list = []
-        for filename in sorted(os.listdir(image_dir)):
-            if filename.lower().endswith(self.valid_exts):
-                img_path = os.path.join(image_dir, filename)
-                # 輕量檢查
-                if cv2.imread(img_path, cv2.IMREAD_GRAYSCALE) is not None:
-                    self.image_list.append(img_path)
+        # 只讀文件頭做輕量檢查
+        self.manifest = ImageManifest(image_dir, self.valid_exts)
+        self.image_list = self.manifest.scan()
         self.current_index = 0 if self.image_list else -1
         self.current_image = None
-        self.thumbnail_cache = {}
+        self.prefetcher.invalidate()
+
+    def _prefetch_load(self, img_path: str):
+        """Runs on the prefetch pool: decode one image and cache its thumbnail alongside."""
+        img = self.image_cache.load(img_path)
+        if img is not None:
+            self._thumbnail_from(img_path, img, self.thumbnail_size)
+        return img
+
+    def _thumbnail_from(self, img_path: str, img, size):
+        variant = f"thumb{size[0]}x{size[1]}"
+        thumb = self.image_cache.get(img_path, variant)
+        if thumb is None:
+            thumb = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            self.image_cache.put(img_path, thumb, variant)
+        return thumb
 
     def get_image(self, idx: int):
         if 0 <= idx < len(self.image_list):
             img_path = self.image_list[idx]
-            img = cv2.imread(img_path)
+            img = self.prefetcher.get(img_path)
+            if img is None:
+                img = self.image_cache.load(img_path)
             return img
         return None
 
@@ -43,9 +63,11 @@ class ImageManager:
 
     def goto(self, idx: int):
         if 0 <= idx < len(self.image_list):
+            step = idx - self.current_index
+            self.prefetcher.record_step(step if abs(step) == 1 else 0)
             self.current_index = idx
+            self.prefetcher.update(self.image_list, idx)
             self.current_image = self.get_image(idx)
-            self.preload_images(idx)
             return True
         return False
 
@@ -55,24 +77,22 @@ class ImageManager:
     def prev_image(self):
         return self.goto(self.current_index - 1)
 
-    def get_thumbnail(self, idx: int, size=(128, 128)):
-        if idx in self.thumbnail_cache:
-            return self.thumbnail_cache[idx]
-        img = self.get_image(idx)
-        if img is not None:
-            thumb = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
-            self.thumbnail_cache[idx] = thumb
-            return thumb
-        return None
+    def get_thumbnail(self, idx: int, size=None):
+        size = tuple(size or self.thumbnail_size)
+        if not 0 <= idx < len(self.image_list):
+            return None
+        img_path = self.image_list[idx]
+        thumb = self.image_cache.get(img_path, f"thumb{size[0]}x{size[1]}")
+        if thumb is None:
+            img = self.get_image(idx)
+            if img is not None:
+                thumb = self._thumbnail_from(img_path, img, size)
+        return thumb
 
     def preload_images(self, center_idx: int):
-        # 預加載前後幾張圖片到cache
-        for i in range(center_idx - self.preload_window, center_idx + self.preload_window + 1):
-            if 0 <= i < len(self.image_list) and i not in self.thumbnail_cache:
-                img = self.get_image(i)
-                if img is not None:
-                    thumb = cv2.resize(img, (128, 128), interpolation=cv2.INTER_AREA)
-                    self.thumbnail_cache[i] = thumb
+        # 前後幾張圖片（及其縮略圖）交給預取線程池，不在調用線程上解碼
+        if 0 <= center_idx < len(self.image_list):
+            self.prefetcher.update(self.image_list, center_idx)
 
     def total(self):
         return len(self.image_list)
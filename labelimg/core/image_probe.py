@@ -0,0 +1,169 @@
+import os
+import struct
+from typing import NamedTuple
+
+# 只读取文件头来判断图片是否有效并获取尺寸，避免在打开目录时解码整张图片
+# Header sizes we need to look at; anything beyond this is pixel data.
+_HEAD_BYTES = 64
+_JPEG_SCAN_LIMIT = 1 << 20  # EXIF/ICC segments can push SOF far from the start
+
+
+class ImageInfo(NamedTuple):
+    valid: bool
+    width: int
+    height: int
+    channels: int
+
+
+INVALID_IMAGE = ImageInfo(False, 0, 0, 0)
+
+
+def probe_image(path: str) -> ImageInfo:
+    """Read only the file header to get validity, width, height and channels.
+
+    Supports JPEG (SOF), PNG (IHDR), WebP (VP8/VP8L/VP8X), BMP and TIFF.
+    Layouts we cannot parse from the header fall back to a full decode.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(_HEAD_BYTES)
+            if head.startswith(b'\xff\xd8'):
+                info = _probe_jpeg(f)
+            elif head.startswith(b'\x89PNG\r\n\x1a\n'):
+                info = _probe_png(head)
+            elif head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                info = _probe_webp(head)
+            elif head.startswith(b'BM'):
+                info = _probe_bmp(head)
+            elif head[:4] in (b'II*\x00', b'MM\x00*'):
+                info = _probe_tiff(f, head)
+            else:
+                info = None
+    except (OSError, struct.error, IndexError):
+        return INVALID_IMAGE
+
+    if info is None:
+        return _probe_by_decode(path)
+    if info.width <= 0 or info.height <= 0:
+        return INVALID_IMAGE
+    return info
+
+
+def _probe_jpeg(f):
+    f.seek(2)
+    while f.tell() < _JPEG_SCAN_LIMIT:
+        byte = f.read(1)
+        if not byte:
+            return INVALID_IMAGE
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return INVALID_IMAGE
+        code = marker[0]
+        # Standalone markers carry no length field
+        if code == 0x01 or 0xd0 <= code <= 0xd9:
+            if code == 0xd9:  # EOI before any SOF
+                return INVALID_IMAGE
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return INVALID_IMAGE
+        length = struct.unpack('>H', length_bytes)[0]
+        # SOF0..SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            data = f.read(6)
+            if len(data) < 6:
+                return INVALID_IMAGE
+            _, height, width, components = struct.unpack('>BHHB', data)
+            return ImageInfo(True, width, height, components)
+        f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+
+def _probe_png(head):
+    if head[12:16] != b'IHDR':
+        return INVALID_IMAGE
+    width, height, _, color_type = struct.unpack('>IIBB', head[16:26])
+    return ImageInfo(True, width, height, _PNG_CHANNELS.get(color_type, 3))
+
+
+def _probe_webp(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        # frame tag (3) + start code 9d 01 2a + 14-bit width/height
+        if head[23:26] != b'\x9d\x01\x2a':
+            return INVALID_IMAGE
+        width, height = struct.unpack('<HH', head[26:30])
+        return ImageInfo(True, width & 0x3fff, height & 0x3fff, 3)
+    if chunk == b'VP8L':
+        if head[20] != 0x2f:
+            return INVALID_IMAGE
+        bits = struct.unpack('<I', head[21:25])[0]
+        width = (bits & 0x3fff) + 1
+        height = ((bits >> 14) & 0x3fff) + 1
+        has_alpha = (bits >> 28) & 1
+        return ImageInfo(True, width, height, 4 if has_alpha else 3)
+    if chunk == b'VP8X':
+        flags = head[20]
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return ImageInfo(True, width, height, 4 if flags & 0x10 else 3)
+    return None
+
+
+def _probe_bmp(head):
+    dib_size = struct.unpack('<I', head[14:18])[0]
+    if dib_size == 12:  # BITMAPCOREHEADER
+        width, height, _, bpp = struct.unpack('<HHHH', head[18:26])
+    elif dib_size >= 40:
+        width, height, _, bpp = struct.unpack('<iiHH', head[18:30])
+    else:
+        return INVALID_IMAGE
+    return ImageInfo(True, abs(width), abs(height), 4 if bpp == 32 else 3)
+
+
+def _probe_tiff(f, head):
+    endian = '<' if head[:2] == b'II' else '>'
+    ifd_offset = struct.unpack(endian + 'I', head[4:8])[0]
+    f.seek(ifd_offset)
+    count_bytes = f.read(2)
+    if len(count_bytes) < 2:
+        return INVALID_IMAGE
+    count = struct.unpack(endian + 'H', count_bytes)[0]
+    entries = f.read(12 * count)
+    width = height = 0
+    channels = 1
+    for i in range(len(entries) // 12):
+        tag, typ, _ = struct.unpack(endian + 'HHI', entries[i * 12:i * 12 + 8])
+        raw = entries[i * 12 + 8:i * 12 + 12]
+        if typ == 3:  # SHORT
+            value = struct.unpack(endian + 'H', raw[:2])[0]
+        elif typ == 4:  # LONG
+            value = struct.unpack(endian + 'I', raw)[0]
+        else:
+            continue
+        if tag == 256:
+            width = value
+        elif tag == 257:
+            height = value
+        elif tag == 277:
+            channels = value
+    if not width or not height:
+        return None
+    return ImageInfo(True, width, height, channels)
+
+
+def _probe_by_decode(path):
+    """Fallback for headers we do not understand (e.g. BigTIFF)."""
+    import cv2
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return INVALID_IMAGE
+    channels = img.shape[2] if img.ndim > 2 else 1
+    return ImageInfo(True, img.shape[1], img.shape[0], channels)
@@ -0,0 +1,273 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .history import Edit
+
+# 保存在图片目录中，与 .bakuflow_manifest.db 并列；只追加，程序崩溃或重启后仍可撤销
+JOURNAL_FILENAME = '.bakuflow_journal.jsonl'
+
+# 记录类型：e = 编辑，u = 撤销，r = 重做，x = 该图片历史失效，batch = 自动标注批次开始，
+# compacted = 压缩后的文件大小（写在压缩后文件的第一行）
+EDIT, UNDO, REDO, RESET, BATCH, COMPACTED = 'e', 'u', 'r', 'x', 'batch', 'compacted'
+_PROJECT_KEY = '*'
+
+# 打开时日志超过此大小、且比上次压缩后大一倍以上，就重写为每张图片当前的撤销/重做栈
+COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def edit_to_record(edit: Edit) -> dict:
+    record = {'n': edit.count}
+    if edit.modified:
+        record['m'] = [[i, list(before), list(after)] for i, before, after in edit.modified]
+    if edit.removed:
+        record['r'] = [[i, list(state)] for i, state in edit.removed]
+    if edit.added:
+        record['a'] = [[i, list(state)] for i, state in edit.added]
+    return record
+
+
+def edit_from_record(record: dict) -> Edit:
+    return Edit(record['n'],
+                modified=[(i, tuple(before), tuple(after)) for i, before, after in record.get('m', ())],
+                removed=[(i, tuple(state)) for i, state in record.get('r', ())],
+                added=[(i, tuple(state)) for i, state in record.get('a', ())])
+
+
+class EditJournal:
+    """Append-only, line-oriented log of annotation edits for one image directory.
+
+    Each line is ``<filename>\\t<batch id>\\t<compact json>``. Opening the
+    journal only splits lines on the two tabs to index byte offsets by
+    image and by auto-label batch; JSON is decoded when an image's history
+    is actually replayed. A torn last line from a crash is cut off on open.
+
+    Appends go through one handle kept open until ``close``. Once the file
+    outgrows ``COMPACT_BYTES`` it is compacted on open: lines before an
+    image's last history reset are dropped and each image's remaining
+    lines are rewritten as its current undo/redo stacks.
+    """
+
+    def __init__(self, image_dir: str, persist: bool = True, keep_steps: int = 100):
+        self.image_dir = image_dir
+        self.path = os.path.join(image_dir, JOURNAL_FILENAME) if persist else None
+        self.keep_steps = keep_steps  # 压缩时每张图片保留的撤销步数，与 EditHistory.max_steps 一致
+        self._file = None
+        self._size = 0
+        self._offsets: Dict[str, List[int]] = {}  # filename -> line offsets
+        self._batch_offsets: Dict[str, List[int]] = {}  # batch id -> line offsets
+        self._batches: 'OrderedDict[str, dict]' = OrderedDict()
+        self._seq = 0
+        self._index()
+
+    @staticmethod
+    def _line(key: str, record: dict, batch: Optional[str] = None) -> bytes:
+        return (f"{key}\t{batch or ''}\t" +
+                json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+    def _index(self, compact: bool = True):
+        self._offsets, self._batch_offsets, self._batches = {}, {}, OrderedDict()
+        self._size = 0
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                end = data.rfind(b'\n') + 1
+                if end < len(data):
+                    print(f"[Debug] 截断撤销日志中不完整的最后一行: {self.path}")
+                    f.truncate(end)
+        except OSError as e:
+            print(f"Warning: Ignoring unreadable journal {self.path}: {e}")
+            self.path = None
+            return
+        offset = 0
+        compacted_size = 0
+        for line in data[:end].splitlines(keepends=True):
+            name, _, rest = line.partition(b'\t')
+            batch, _, payload = rest.partition(b'\t')
+            key = name.decode('utf-8', 'replace')
+            if key == _PROJECT_KEY:
+                try:
+                    record = json.loads(payload)
+                    if record.get('k') == BATCH:
+                        self._batches[record['b']] = record
+                    elif record.get('k') == COMPACTED:
+                        compacted_size = record['size']
+                except (ValueError, KeyError):
+                    pass
+            else:
+                self._offsets.setdefault(key, []).append(offset)
+                if batch:
+                    self._batch_offsets.setdefault(batch.decode('utf-8', 'replace'), []).append(offset)
+            offset += len(line)
+        self._size = end
+        if compact and end > max(COMPACT_BYTES, 2 * compacted_size):
+            self.compact()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _append(self, key: str, record: dict, batch: Optional[str] = None):
+        if not self.path:
+            return
+        line = self._line(key, record, batch)
+        offset = self._size
+        try:
+            f = self._open()
+            f.write(line)
+            f.flush()  # 只交给操作系统（不 fsync），程序崩溃后仍可回放
+        except OSError as e:
+            # 只读目录等情况下仅保留内存中的历史
+            print(f"Warning: Could not write journal {self.path}: {e}")
+            self.close()
+            self.path = None
+            return
+        self._size += len(line)
+        if key != _PROJECT_KEY:
+            self._offsets.setdefault(key, []).append(offset)
+            if batch:
+                self._batch_offsets.setdefault(batch, []).append(offset)
+
+    # --- writing ------------------------------------------------------
+    def log_edit(self, img_path: str, edit: Edit, merged: bool = False, batch: Optional[str] = None):
+        record = edit_to_record(edit)
+        record['k'] = EDIT
+        record['t'] = round(time.time(), 3)
+        if merged:
+            record['c'] = 1  # 回放时并入上一步
+        self._append(os.path.basename(img_path), record, batch)
+
+    def log(self, img_path: str, kind: str):
+        """Record an undo (u), redo (r) or history reset (x) for one image."""
+        self._append(os.path.basename(img_path), {'k': kind, 't': round(time.time(), 3)})
+
+    def start_batch(self, note: str = "") -> str:
+        """Open an auto-label batch; pass the returned id to log_edit for each image it writes."""
+        self._seq += 1
+        batch_id = f"{int(time.time() * 1000):x}-{self._seq}"
+        record = {'k': BATCH, 'b': batch_id, 't': round(time.time(), 3), 'note': note}
+        self._batches[batch_id] = record
+        self._append(_PROJECT_KEY, record)
+        return batch_id
+
+    # --- compaction ---------------------------------------------------
+    @staticmethod
+    def _stacks(records: List[Tuple[Optional[str], dict]], limit: int):
+        """Replay one image's lines into (undo, redo) stacks of (Edit, batch id) pairs."""
+        undo: List[Tuple[Edit, Optional[str]]] = []
+        redo: List[Tuple[Edit, Optional[str]]] = []
+        for batch, record in records:
+            kind = record.get('k')
+            if kind == EDIT:
+                edit = edit_from_record(record)
+                redo.clear()
+                if not (record.get('c') and undo and undo[-1][0].merge(edit)):
+                    undo.append((edit, batch or None))
+            elif kind == UNDO and undo:
+                redo.append(undo.pop())
+            elif kind == REDO and redo:
+                undo.append(redo.pop())
+            elif kind == RESET:
+                undo.clear()
+                redo.clear()
+        return undo[-limit:], redo[-limit:]
+
+    def compact(self):
+        """Rewrite the journal as each image's current undo/redo stacks.
+
+        Images whose history was reset disappear, merged drags become one
+        line, and auto-label batches keep the edits still on a stack. The
+        rewritten file replaces the old one atomically.
+        """
+        if not self.path:
+            return
+        self.close()
+        before = self._size
+        lines = []
+        kept_batches = set()
+        with open(self.path, 'rb') as f:
+            for name, offsets in self._offsets.items():
+                records = []
+                for offset in offsets:
+                    f.seek(offset)
+                    _, _, rest = f.readline().partition(b'\t')
+                    batch, _, payload = rest.partition(b'\t')
+                    try:
+                        records.append((batch.decode('utf-8', 'replace'), json.loads(payload)))
+                    except ValueError:
+                        continue
+                undo, redo = self._stacks(records, self.keep_steps)
+                # 撤销栈原样写出；重做栈逆序写成编辑再跟同样多的撤销，回放结果相同
+                for edit, batch in undo + redo[::-1]:
+                    lines.append(self._line(name, dict(edit_to_record(edit), k=EDIT), batch))
+                    if batch:
+                        kept_batches.add(batch)
+                lines.extend(self._line(name, {'k': UNDO}) for _ in redo)
+        header = [self._line(_PROJECT_KEY, record) for batch_id, record in self._batches.items()
+                  if batch_id in kept_batches]
+        body = b''.join(header + lines)
+        data = self._line(_PROJECT_KEY, {'k': COMPACTED, 'size': len(body)}) + body
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, os.stat(self.path).st_mode & 0o7777)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not compact journal {self.path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._index(compact=False)
+        print(f"[Debug] 撤销日志已压缩: {before} -> {self._size} 字节")
+
+    # --- reading ------------------------------------------------------
+    def _read(self, offsets: List[int]) -> List[Tuple[str, dict]]:
+        if not self.path or not offsets:
+            return []
+        if self._file is not None:
+            self._file.flush()
+        result = []
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                name, _, rest = f.readline().partition(b'\t')
+                try:
+                    result.append((name.decode('utf-8'), json.loads(rest.partition(b'\t')[2])))
+                except ValueError:
+                    continue
+        return result
+
+    def replay(self, img_path: str, max_steps: int = 100) -> Tuple[List[Edit], List[Edit]]:
+        """Rebuild (undo, redo) stacks for one image from its journal lines."""
+        undo, redo = self._stacks([(None, record) for _, record in
+                                   self._read(self._offsets.get(os.path.basename(img_path), []))], max_steps)
+        return [edit for edit, _ in undo], [edit for edit, _ in redo]
+
+    def batches(self) -> List[dict]:
+        """Auto-label batches, newest first, each with an ``images`` count."""
+        return [dict(record, images=len(self._batch_offsets.get(batch_id, [])))
+                for batch_id, record in reversed(self._batches.items())]
+
+    def batch_edits(self, batch_id: str) -> List[Tuple[str, Edit]]:
+        """(filename, Edit) for every image written by one auto-label batch."""
+        return [(name, edit_from_record(record))
+                for name, record in self._read(self._batch_offsets.get(batch_id, []))
+                if record.get('k') == EDIT]
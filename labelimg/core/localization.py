@@ -157,6 +157,30 @@ TRANSLATIONS = {
         "objects": "objects",
         "refresh_complete": "Refresh Complete",
         "refresh_complete_msg": "Found {0} labeled images in current project",
+        "scanning_directory": "Scanning images...",
+        "relabel_selected": "Relabel Selected",
+        "relabel_prompt": "New label for {} boxes:",
+        "boxes_selected": "{} boxes selected",
+        "revert_auto_label_batch": "Revert Auto-Label Batch...",
+        "revert_batch_prompt": "Select the auto-label batch to revert:",
+        "no_auto_label_batches": "No batch auto-label runs are recorded for this project.",
+        "revert_batch_done": "Reverted {} images; skipped {} that were edited afterwards or are missing.",
+        "legend_counts_tooltip": "Boxes in this image / in the whole project",
+        "project_stats": "Project Statistics",
+        "stats_summary": "Labeled: {0} / {1} | Unlabeled: {2} | Boxes: {3}",
+        "stats_box_sizes": "Box size: small {0} | medium {1} | large {2}",
+        "file_status_viewed": "Viewed",
+        "file_status_not_viewed": "Not viewed",
+        "file_status_labeled": "Labeled",
+        "file_status_auto_labeled": "Auto-labeled (mean confidence {:.2f})",
+        "auto_label_pause": "Pause",
+        "auto_label_resume": "Resume",
+        "auto_label_running": "Auto labeling is already running",
+        "select_all_hotkey": "Select all boxes",
+        "relabel_hotkey": "Change the label of the selected boxes",
+        "scale_boxes_hotkey": "Enlarge / shrink the selected boxes",
+        "move_boxes_hotkey": "Move the selected boxes by one pixel",
+        "rubber_band_hotkey": "Select the boxes inside a rectangle (Ctrl+Shift adds to the selection)",
     },
     "zh-tw": {
         "open": "開啟",
@@ -326,6 +350,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "正在掃描圖片...",
+        "relabel_selected": "批次修改標籤",
+        "relabel_prompt": "{} 個框的新標籤：",
+        "boxes_selected": "已選取 {} 個框",
+        "revert_auto_label_batch": "撤銷批次自動標註...",
+        "revert_batch_prompt": "選擇要撤銷的自動標註批次：",
+        "no_auto_label_batches": "此專案沒有批次自動標註紀錄。",
+        "revert_batch_done": "已還原 {} 張圖片；跳過 {} 張之後被修改或已不存在的圖片。",
+        "legend_counts_tooltip": "本圖片框數 / 整個專案框數",
+        "project_stats": "專案統計",
+        "stats_summary": "已標註: {0} / {1} | 未標註: {2} | 框: {3}",
+        "stats_box_sizes": "框大小: 小 {0} | 中 {1} | 大 {2}",
+        "file_status_viewed": "已瀏覽",
+        "file_status_not_viewed": "未瀏覽",
+        "file_status_labeled": "已標註",
+        "file_status_auto_labeled": "自動標註（平均置信度 {:.2f}）",
+        "auto_label_pause": "暫停",
+        "auto_label_resume": "繼續",
+        "auto_label_running": "自動標註正在執行中",
+        "select_all_hotkey": "全選標註框",
+        "relabel_hotkey": "修改選中標註框的類別",
+        "scale_boxes_hotkey": "放大 / 縮小選中的標註框",
+        "move_boxes_hotkey": "將選中的標註框移動一個像素",
+        "rubber_band_hotkey": "框選矩形內的標註框 (Ctrl+Shift 加入已選)",
     },
     "zh-cn": {
         "open": "打开",
@@ -495,6 +543,30 @@ TRANSLATIONS = {
         "objects": "个对象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在当前项目中找到 {0} 张已标注的图片",
+        "scanning_directory": "正在扫描图片...",
+        "relabel_selected": "批量修改标签",
+        "relabel_prompt": "{} 个框的新标签：",
+        "boxes_selected": "已选择 {} 个框",
+        "revert_auto_label_batch": "撤销批量自动标注...",
+        "revert_batch_prompt": "选择要撤销的自动标注批次：",
+        "no_auto_label_batches": "此项目没有批量自动标注记录。",
+        "revert_batch_done": "已还原 {} 张图片；跳过 {} 张之后被修改或已不存在的图片。",
+        "legend_counts_tooltip": "本图片框数 / 整个项目框数",
+        "project_stats": "项目统计",
+        "stats_summary": "已标注: {0} / {1} | 未标注: {2} | 框: {3}",
+        "stats_box_sizes": "框大小: 小 {0} | 中 {1} | 大 {2}",
+        "file_status_viewed": "已浏览",
+        "file_status_not_viewed": "未浏览",
+        "file_status_labeled": "已标注",
+        "file_status_auto_labeled": "自动标注（平均置信度 {:.2f}）",
+        "auto_label_pause": "暂停",
+        "auto_label_resume": "继续",
+        "auto_label_running": "自动标注正在运行中",
+        "select_all_hotkey": "全选标注框",
+        "relabel_hotkey": "修改选中标注框的类别",
+        "scale_boxes_hotkey": "放大 / 缩小选中的标注框",
+        "move_boxes_hotkey": "将选中的标注框移动一个像素",
+        "rubber_band_hotkey": "框选矩形内的标注框 (Ctrl+Shift 加入已选)",
     },
     "ja": {
         "open": "開く",
@@ -615,6 +687,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "画像をスキャンしています...",
+        "relabel_selected": "選択をまとめてラベル変更",
+        "relabel_prompt": "{} 個のボックスの新しいラベル：",
+        "boxes_selected": "{} 個のボックスを選択",
+        "revert_auto_label_batch": "一括自動ラベル付けを取り消す...",
+        "revert_batch_prompt": "取り消す自動ラベル付けのバッチを選択：",
+        "no_auto_label_batches": "このプロジェクトには一括自動ラベル付けの記録がありません。",
+        "revert_batch_done": "{} 枚の画像を元に戻しました。その後編集されたか見つからない {} 枚はスキップしました。",
+        "legend_counts_tooltip": "この画像のボックス数 / プロジェクト全体",
+        "project_stats": "プロジェクト統計",
+        "stats_summary": "ラベル済み: {0} / {1} | 未ラベル: {2} | ボックス: {3}",
+        "stats_box_sizes": "ボックスサイズ: 小 {0} | 中 {1} | 大 {2}",
+        "file_status_viewed": "閲覧済み",
+        "file_status_not_viewed": "未閲覧",
+        "file_status_labeled": "ラベル付け済み",
+        "file_status_auto_labeled": "自動ラベル付け（平均信頼度 {:.2f}）",
+        "auto_label_pause": "一時停止",
+        "auto_label_resume": "再開",
+        "auto_label_running": "自動ラベル付けは実行中です",
+        "select_all_hotkey": "すべてのボックスを選択",
+        "relabel_hotkey": "選択したボックスのラベルを変更",
+        "scale_boxes_hotkey": "選択したボックスを拡大 / 縮小",
+        "move_boxes_hotkey": "選択したボックスを1ピクセル移動",
+        "rubber_band_hotkey": "矩形内のボックスを選択 (Ctrl+Shift で選択に追加)",
     },
     "it": {
         "open": "Apri",
@@ -784,6 +880,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "Scansione immagini...",
+        "relabel_selected": "Rietichetta selezionati",
+        "relabel_prompt": "Nuova etichetta per {} riquadri:",
+        "boxes_selected": "{} riquadri selezionati",
+        "revert_auto_label_batch": "Annulla lotto di etichettatura automatica...",
+        "revert_batch_prompt": "Seleziona il lotto da annullare:",
+        "no_auto_label_batches": "Nessun lotto di etichettatura automatica registrato per questo progetto.",
+        "revert_batch_done": "Ripristinate {} immagini; saltate {} modificate in seguito o mancanti.",
+        "legend_counts_tooltip": "Riquadri in questa immagine / nell'intero progetto",
+        "project_stats": "Statistiche del progetto",
+        "stats_summary": "Etichettate: {0} / {1} | Non etichettate: {2} | Riquadri: {3}",
+        "stats_box_sizes": "Dimensione: piccoli {0} | medi {1} | grandi {2}",
+        "file_status_viewed": "Visualizzata",
+        "file_status_not_viewed": "Non visualizzata",
+        "file_status_labeled": "Annotata",
+        "file_status_auto_labeled": "Annotata automaticamente (confidenza media {:.2f})",
+        "auto_label_pause": "Pausa",
+        "auto_label_resume": "Riprendi",
+        "auto_label_running": "L'annotazione automatica è già in corso",
+        "select_all_hotkey": "Seleziona tutti i box",
+        "relabel_hotkey": "Cambia l'etichetta dei box selezionati",
+        "scale_boxes_hotkey": "Ingrandisci / riduci i box selezionati",
+        "move_boxes_hotkey": "Sposta di un pixel i box selezionati",
+        "rubber_band_hotkey": "Seleziona i box dentro un rettangolo (Ctrl+Shift aggiunge alla selezione)",
     },
     "de": {
         "open": "Öffnen",
@@ -953,6 +1073,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "Bilder werden gescannt...",
+        "relabel_selected": "Auswahl umbenennen",
+        "relabel_prompt": "Neue Beschriftung für {} Boxen:",
+        "boxes_selected": "{} Boxen ausgewählt",
+        "revert_auto_label_batch": "Auto-Beschriftungs-Stapel rückgängig machen...",
+        "revert_batch_prompt": "Stapel zum Rückgängigmachen auswählen:",
+        "no_auto_label_batches": "Für dieses Projekt sind keine Auto-Beschriftungs-Stapel aufgezeichnet.",
+        "revert_batch_done": "{} Bilder zurückgesetzt; {} später bearbeitete oder fehlende übersprungen.",
+        "legend_counts_tooltip": "Boxen in diesem Bild / im gesamten Projekt",
+        "project_stats": "Projektstatistik",
+        "stats_summary": "Beschriftet: {0} / {1} | Unbeschriftet: {2} | Boxen: {3}",
+        "stats_box_sizes": "Boxgröße: klein {0} | mittel {1} | groß {2}",
+        "file_status_viewed": "Angesehen",
+        "file_status_not_viewed": "Nicht angesehen",
+        "file_status_labeled": "Annotiert",
+        "file_status_auto_labeled": "Automatisch annotiert (mittlere Konfidenz {:.2f})",
+        "auto_label_pause": "Pause",
+        "auto_label_resume": "Fortsetzen",
+        "auto_label_running": "Die automatische Annotation läuft bereits",
+        "select_all_hotkey": "Alle Boxen auswählen",
+        "relabel_hotkey": "Label der ausgewählten Boxen ändern",
+        "scale_boxes_hotkey": "Ausgewählte Boxen vergrößern / verkleinern",
+        "move_boxes_hotkey": "Ausgewählte Boxen um ein Pixel verschieben",
+        "rubber_band_hotkey": "Boxen innerhalb eines Rechtecks auswählen (Ctrl+Shift erweitert die Auswahl)",
     },
     "no": {
         "open": "Åpne",
@@ -1122,6 +1266,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "Skanner bilder...",
+        "relabel_selected": "Endre etikett for valgte",
+        "relabel_prompt": "Ny etikett for {} bokser:",
+        "boxes_selected": "{} bokser valgt",
+        "revert_auto_label_batch": "Angre automerkingsparti...",
+        "revert_batch_prompt": "Velg partiet som skal angres:",
+        "no_auto_label_batches": "Ingen automerkingspartier er registrert for dette prosjektet.",
+        "revert_batch_done": "Tilbakestilte {} bilder; hoppet over {} som er endret senere eller mangler.",
+        "legend_counts_tooltip": "Bokser i dette bildet / i hele prosjektet",
+        "project_stats": "Prosjektstatistikk",
+        "stats_summary": "Merket: {0} / {1} | Umerket: {2} | Bokser: {3}",
+        "stats_box_sizes": "Boksstørrelse: små {0} | middels {1} | store {2}",
+        "file_status_viewed": "Sett",
+        "file_status_not_viewed": "Ikke sett",
+        "file_status_labeled": "Merket",
+        "file_status_auto_labeled": "Automatisk merket (gjennomsnittlig konfidens {:.2f})",
+        "auto_label_pause": "Pause",
+        "auto_label_resume": "Fortsett",
+        "auto_label_running": "Automatisk merking kjører allerede",
+        "select_all_hotkey": "Velg alle bokser",
+        "relabel_hotkey": "Endre etiketten til valgte bokser",
+        "scale_boxes_hotkey": "Forstørr / forminsk valgte bokser",
+        "move_boxes_hotkey": "Flytt valgte bokser én piksel",
+        "rubber_band_hotkey": "Velg boksene innenfor et rektangel (Ctrl+Shift legger til i utvalget)",
     },
     "es": {
         "open": "Abrir",
@@ -1291,6 +1459,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "Escaneando imágenes...",
+        "relabel_selected": "Reetiquetar seleccionados",
+        "relabel_prompt": "Nueva etiqueta para {} cajas:",
+        "boxes_selected": "{} cajas seleccionadas",
+        "revert_auto_label_batch": "Revertir lote de etiquetado automático...",
+        "revert_batch_prompt": "Seleccione el lote a revertir:",
+        "no_auto_label_batches": "No hay lotes de etiquetado automático registrados en este proyecto.",
+        "revert_batch_done": "Se revirtieron {} imágenes; se omitieron {} editadas después o ausentes.",
+        "legend_counts_tooltip": "Cuadros en esta imagen / en todo el proyecto",
+        "project_stats": "Estadísticas del proyecto",
+        "stats_summary": "Etiquetadas: {0} / {1} | Sin etiquetar: {2} | Cuadros: {3}",
+        "stats_box_sizes": "Tamaño: pequeños {0} | medianos {1} | grandes {2}",
+        "file_status_viewed": "Vista",
+        "file_status_not_viewed": "No vista",
+        "file_status_labeled": "Etiquetada",
+        "file_status_auto_labeled": "Etiquetada automáticamente (confianza media {:.2f})",
+        "auto_label_pause": "Pausar",
+        "auto_label_resume": "Reanudar",
+        "auto_label_running": "El etiquetado automático ya está en curso",
+        "select_all_hotkey": "Seleccionar todas las cajas",
+        "relabel_hotkey": "Cambiar la etiqueta de las cajas seleccionadas",
+        "scale_boxes_hotkey": "Agrandar / reducir las cajas seleccionadas",
+        "move_boxes_hotkey": "Mover un píxel las cajas seleccionadas",
+        "rubber_band_hotkey": "Seleccionar las cajas dentro de un rectángulo (Ctrl+Shift añade a la selección)",
     },
     "fr": {
         "open": "Ouvrir",
@@ -1460,6 +1652,30 @@ TRANSLATIONS = {
         "objects": "個對象",
         "refresh_complete": "刷新完成",
         "refresh_complete_msg": "在當前項目中找到 {0} 張已標註的圖片",
+        "scanning_directory": "Analyse des images...",
+        "relabel_selected": "Réétiqueter la sélection",
+        "relabel_prompt": "Nouvelle étiquette pour {} boîtes :",
+        "boxes_selected": "{} boîtes sélectionnées",
+        "revert_auto_label_batch": "Annuler un lot d'étiquetage automatique...",
+        "revert_batch_prompt": "Sélectionnez le lot à annuler :",
+        "no_auto_label_batches": "Aucun lot d'étiquetage automatique n'est enregistré pour ce projet.",
+        "revert_batch_done": "{} images rétablies ; {} modifiées ensuite ou manquantes ignorées.",
+        "legend_counts_tooltip": "Boîtes dans cette image / dans tout le projet",
+        "project_stats": "Statistiques du projet",
+        "stats_summary": "Annotées : {0} / {1} | Non annotées : {2} | Boîtes : {3}",
+        "stats_box_sizes": "Taille : petites {0} | moyennes {1} | grandes {2}",
+        "file_status_viewed": "Vue",
+        "file_status_not_viewed": "Non vue",
+        "file_status_labeled": "Annotée",
+        "file_status_auto_labeled": "Annotée automatiquement (confiance moyenne {:.2f})",
+        "auto_label_pause": "Pause",
+        "auto_label_resume": "Reprendre",
+        "auto_label_running": "L'annotation automatique est déjà en cours",
+        "select_all_hotkey": "Sélectionner toutes les boîtes",
+        "relabel_hotkey": "Changer l'étiquette des boîtes sélectionnées",
+        "scale_boxes_hotkey": "Agrandir / réduire les boîtes sélectionnées",
+        "move_boxes_hotkey": "Déplacer d'un pixel les boîtes sélectionnées",
+        "rubber_band_hotkey": "Sélectionner les boîtes dans un rectangle (Ctrl+Shift ajoute à la sélection)",
     },
 }
 
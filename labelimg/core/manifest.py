@@ -0,0 +1,176 @@
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .image_probe import ImageInfo, probe_image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff')
+ANNOTATION_EXTENSIONS = ('.txt', '.xml')
+# 保存在 classes.txt 旁边，重新打开项目时只需重新检查 stat 变化的文件
+MANIFEST_FILENAME = '.bakuflow_manifest.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    valid INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    labeled INTEGER NOT NULL
+)
+"""
+
+
+class ImageManifest:
+    """Per-directory image metadata (validity, size, channels) read from file headers.
+
+    The manifest is persisted to a SQLite file in the image directory. On
+    rescan only files whose size or mtime changed are probed again.
+    """
+
+    def __init__(self, image_dir: str, valid_exts=IMAGE_EXTENSIONS, persist: bool = True):
+        self.image_dir = image_dir
+        self.valid_exts = tuple(valid_exts)
+        self.db_path = os.path.join(image_dir, MANIFEST_FILENAME) if persist else None
+        self.entries: Dict[str, ImageInfo] = {}  # filename -> ImageInfo
+        self.stats: Dict[str, Tuple[int, int]] = {}  # filename -> (size, mtime_ns)
+        self.labeled: Set[str] = set()
+
+    def scan(self) -> List[str]:
+        """Probe every changed image in the directory and return the valid paths, sorted."""
+        image_paths = []
+        for batch, _, _ in self.iter_scan():
+            image_paths.extend(batch)
+        return image_paths
+
+    def iter_scan(self, batch_size: int = 256) -> Iterator[Tuple[List[str], int, int]]:
+        """Scan incrementally, yielding (valid_paths, processed, total) batches.
+
+        The first valid image is yielded on its own so callers can show it
+        before the rest of the directory has been checked.
+        """
+        cached = self._load()
+        self.entries = {}
+        self.stats = {}
+        self.labeled = set()
+        changed = []
+
+        dir_entries = sorted(os.scandir(self.image_dir), key=lambda e: e.name)
+        annotated_bases = {os.path.splitext(e.name)[0] for e in dir_entries
+                           if e.name.lower().endswith(ANNOTATION_EXTENSIONS)}
+        candidates = [e for e in dir_entries if e.name.lower().endswith(self.valid_exts)]
+        total = len(candidates)
+        batch = []
+        found_any = False
+
+        completed = False
+        try:
+            for processed, entry in enumerate(candidates, 1):
+                filename = entry.name
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                stat_key = (st.st_size, st.st_mtime_ns)
+                labeled = os.path.splitext(filename)[0] in annotated_bases
+
+                row = cached.get(filename)
+                if row is not None and row[0] == stat_key:
+                    info = row[1]
+                    if row[2] != labeled:
+                        changed.append(filename)
+                else:
+                    info = probe_image(entry.path)
+                    changed.append(filename)
+
+                self.entries[filename] = info
+                self.stats[filename] = stat_key
+                if labeled:
+                    self.labeled.add(filename)
+                if info.valid:
+                    batch.append(entry.path)
+                else:
+                    print(f"Warning: Skipping unreadable or invalid image file: {entry.path}")
+
+                if batch and (not found_any or len(batch) >= batch_size):
+                    found_any = True
+                    yield batch, processed, total
+                    batch = []
+            completed = True
+        finally:
+            # 中途取消时也保存已经检查过的文件
+            removed = [name for name in cached if name not in self.entries] if completed else []
+            self._save(changed, removed)
+        yield batch, total, total
+
+    def get(self, img_path: str) -> Optional[ImageInfo]:
+        return self.entries.get(os.path.basename(img_path))
+
+    def image_size(self, img_path: str) -> Optional[Tuple[int, int]]:
+        """Return (width, height) without decoding the image, or None if unknown."""
+        info = self.get(img_path)
+        if info is None or not info.valid:
+            return None
+        return info.width, info.height
+
+    def is_labeled(self, img_path: str) -> bool:
+        return os.path.basename(img_path) in self.labeled
+
+    def set_labeled(self, img_path: str, labeled: bool):
+        """Record annotation status after a save, and persist it."""
+        filename = os.path.basename(img_path)
+        if filename not in self.entries or (filename in self.labeled) == labeled:
+            return
+        if labeled:
+            self.labeled.add(filename)
+        else:
+            self.labeled.discard(filename)
+        self._save([filename], [])
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(_SCHEMA)
+        return conn
+
+    def _load(self):
+        """Return {filename: ((size, mtime_ns), ImageInfo, labeled)} from disk."""
+        if not self.db_path or not os.path.exists(self.db_path):
+            return {}
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT filename, size, mtime_ns, valid, width, height, channels, labeled FROM images"
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Warning: Ignoring unreadable manifest {self.db_path}: {e}")
+            return {}
+        return {
+            name: ((size, mtime_ns), ImageInfo(bool(valid), width, height, channels), bool(labeled))
+            for name, size, mtime_ns, valid, width, height, channels, labeled in rows
+        }
+
+    def _save(self, changed, removed):
+        if not self.db_path or (not changed and not removed):
+            return
+        rows = []
+        for filename in changed:
+            info = self.entries[filename]
+            size, mtime_ns = self.stats[filename]
+            rows.append((filename, size, mtime_ns, int(info.valid), info.width, info.height,
+                         info.channels, int(filename in self.labeled)))
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    conn.executemany("DELETE FROM images WHERE filename = ?", [(name,) for name in removed])
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # 只读目录等情况下仍可使用内存中的清单
+            print(f"Warning: Failed to write manifest {self.db_path}: {e}")
@@ -0,0 +1,97 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+
+class ImagePrefetcher:
+    """Decode the images around the current index ahead of time on a thread pool.
+
+    Results are kept in a ring buffer keyed by path that only covers the
+    current image plus ``radius`` images on each side. The side we expect the
+    user to move to next (from recent navigation steps) is scheduled first.
+    """
+
+    def __init__(self, loader: Optional[Callable] = None, radius: int = 3,
+                 max_workers: int = 2, history: int = 4):
+        self.loader = loader or cv2.imread
+        self.radius = radius
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._futures: Dict[str, Future] = {}
+        self._steps = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record_step(self, step: int):
+        """Remember a navigation step: +1 for next, -1 for previous, 0 for a jump."""
+        if step == 0:
+            self._steps.clear()
+        else:
+            self._steps.append(1 if step > 0 else -1)
+
+    def predicted_direction(self) -> int:
+        total = sum(self._steps)
+        return (total > 0) - (total < 0)
+
+    def window(self, current_index: int, count: int) -> List[int]:
+        """Indices to keep decoded, most likely next image first."""
+        direction = self.predicted_direction()
+        ahead = self.radius
+        # 连续朝一个方向翻页时，反方向只保留少量图片
+        behind = max(1, self.radius // 2) if direction else self.radius
+        step = direction or 1
+        order = [current_index]
+        order += [current_index + step * i for i in range(1, ahead + 1)]
+        order += [current_index - step * i for i in range(1, behind + 1)]
+        return [i for i in order if 0 <= i < count]
+
+    def update(self, image_list: List[str], current_index: int, loader: Optional[Callable] = None):
+        """Schedule the window around ``current_index`` and drop everything else."""
+        if loader is not None:
+            self.loader = loader
+        wanted = [image_list[i] for i in self.window(current_index, len(image_list))]
+        wanted_set = set(wanted)
+        with self._lock:
+            for path in list(self._futures):
+                if path not in wanted_set:
+                    self._futures.pop(path).cancel()
+            for path in wanted:
+                if path not in self._futures:
+                    self._futures[path] = self._pool.submit(self.loader, path)
+
+    def put(self, path: str, value):
+        """Store a result that was produced outside the pool (e.g. a direct load)."""
+        future = Future()
+        future.set_result(value)
+        with self._lock:
+            self._futures[path] = future
+
+    def get(self, path: str):
+        """Return the prefetched result for ``path``, waiting if it is still decoding.
+
+        Returns None if the path was never scheduled or its load failed.
+        """
+        with self._lock:
+            future = self._futures.get(path)
+        if future is None or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"[Debug] 预加载失败 {path}: {e}")
+            return None
+
+    def invalidate(self, path: Optional[str] = None):
+        """Forget one path, or everything when ``path`` is None."""
+        with self._lock:
+            if path is None:
+                futures, self._futures = list(self._futures.values()), {}
+            else:
+                futures = [self._futures.pop(path)] if path in self._futures else []
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        self.invalidate()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,45 @@
+import math
+
+import cv2
+
+
+class ImagePyramid:
+    """Reduced-resolution copies of an image for fast on-screen rendering.
+
+    Level 0 is the full-resolution image, each further level halves both
+    dimensions (cv2.pyrDown). Levels are built lazily and cached.
+    """
+
+    def __init__(self, image, min_size: int = 256):
+        self.image = image
+        self.min_size = min_size
+        self.levels = [image]
+
+    @property
+    def max_level(self) -> int:
+        h, w = self.image.shape[:2]
+        shortest = min(h, w)
+        if shortest <= self.min_size:
+            return 0
+        return int(math.log2(shortest / self.min_size))
+
+    def level_for_scale(self, scale: float) -> int:
+        """The smallest level whose resolution is still >= the displayed size."""
+        if scale <= 0 or scale >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / scale))), self.max_level)
+
+    def get(self, level: int):
+        level = max(0, min(level, self.max_level))
+        while len(self.levels) <= level:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+        return self.levels[level]
+
+    def build_all(self):
+        """Build every level up front, e.g. on a prefetch thread."""
+        self.get(self.max_level)
+        return self
+
+    def ratio(self, level: int) -> float:
+        """Width of ``level`` relative to the full-resolution image."""
+        return self.get(level).shape[1] / self.image.shape[1]
@@ -0,0 +1,138 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+HANDLE_NAMES = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+
+
+class BoxSpatialIndex:
+    """Uniform grid over the current image's boxes for hit-testing.
+
+    Boxes are bucketed by the grid cells their rectangle overlaps, so point
+    and rectangle queries only look at the boxes in the touched cells
+    instead of scanning the whole list. List order is kept as z-order: a
+    higher position means the box is drawn on top.
+
+    The index is rebuilt when the box list is replaced or its length
+    changes (see is_stale); boxes moved or resized in place must be passed
+    to update(), or the whole index invalidated.
+    """
+
+    def __init__(self, cell_size: int = 128, max_cells_per_box: int = 256):
+        self.cell_size = cell_size
+        self.max_cells_per_box = max_cells_per_box
+        self._source = None
+        self._count = 0
+        self._cells: Dict[Tuple[int, int], set] = {}
+        self._large = set()  # 覆盖格子过多的大框单独存放，查询时直接检查
+        self._box_cells: Dict[int, tuple] = {}  # id(box) -> cells it was inserted into
+        self._order: Dict[int, int] = {}  # id(box) -> position in the list
+        self._boxes: List = []
+
+    def is_stale(self, boxes: Sequence) -> bool:
+        return boxes is not self._source or len(boxes) != self._count
+
+    def invalidate(self):
+        self._source = None
+
+    def rebuild(self, boxes: Sequence):
+        self._source = boxes
+        self._count = len(boxes)
+        self._boxes = list(boxes)
+        self._cells = {}
+        self._large = set()
+        self._box_cells = {}
+        self._order = {id(box): i for i, box in enumerate(self._boxes)}
+        for box in self._boxes:
+            self._insert(box)
+
+    def update(self, box):
+        """Re-bucket a box after it was moved or resized in place."""
+        key = id(box)
+        if key not in self._order:
+            return
+        self._remove(key)
+        self._insert(box)
+
+    def _cell_range(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return int(x1 // size), int(y1 // size), int(x2 // size), int(y2 // size)
+
+    def _insert(self, box):
+        key = id(box)
+        cx1, cy1, cx2, cy2 = self._cell_range(box.x, box.y, box.x + box.w, box.y + box.h)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > self.max_cells_per_box:
+            self._large.add(key)
+            self._box_cells[key] = None
+            return
+        cells = tuple((cx, cy) for cx in range(cx1, cx2 + 1) for cy in range(cy1, cy2 + 1))
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(key)
+        self._box_cells[key] = cells
+
+    def _remove(self, key):
+        cells = self._box_cells.pop(key, None)
+        if cells is None:
+            self._large.discard(key)
+            return
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[cell]
+
+    def _candidates(self, x1, y1, x2, y2) -> List:
+        """Boxes whose cells overlap the query rectangle, in z-order."""
+        cx1, cy1, cx2, cy2 = self._cell_range(x1, y1, x2, y2)
+        keys = set(self._large)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            # 查询范围比已占用的格子还多时，直接遍历已占用的格子
+            for (cx, cy), bucket in self._cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    keys.update(bucket)
+        else:
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    bucket = self._cells.get((cx, cy))
+                    if bucket:
+                        keys.update(bucket)
+        order = self._order
+        return [self._boxes[i] for i in sorted(order[k] for k in keys)]
+
+    def box_at(self, x, y, buffer: int = 5):
+        """Topmost box containing (x, y), with the same buffer zone as BoundingBox.contains."""
+        for box in reversed(self._candidates(x - buffer, y - buffer, x + buffer, y + buffer)):
+            if (box.x - buffer <= x <= box.x + box.w + buffer and
+                    box.y - buffer <= y <= box.y + box.h + buffer):
+                return box
+        return None
+
+    def boxes_in_rect(self, x1, y1, x2, y2, contained: bool = True) -> List:
+        """Boxes fully inside (or, with contained=False, intersecting) the rectangle, in z-order."""
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        result = []
+        for box in self._candidates(x1, y1, x2, y2):
+            bx2, by2 = box.x + box.w, box.y + box.h
+            if contained:
+                if x1 <= box.x and y1 <= box.y and bx2 <= x2 and by2 <= y2:
+                    result.append(box)
+            elif box.x <= x2 and bx2 >= x1 and box.y <= y2 and by2 >= y1:
+                result.append(box)
+        return result
+
+
+def handle_at(box, x, y, threshold: int = 8) -> Optional[str]:
+    """Name of the corner handle of ``box`` within ``threshold`` of (x, y), if any."""
+    left, top = box.x, box.y
+    right, bottom = left + box.w, top + box.h
+    near_left, near_right = abs(x - left) < threshold, abs(x - right) < threshold
+    near_top, near_bottom = abs(y - top) < threshold, abs(y - bottom) < threshold
+    if near_left and near_top:
+        return HANDLE_NAMES[0]
+    if near_right and near_top:
+        return HANDLE_NAMES[1]
+    if near_left and near_bottom:
+        return HANDLE_NAMES[2]
+    if near_right and near_bottom:
+        return HANDLE_NAMES[3]
+    return None
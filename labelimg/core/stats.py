@@ -0,0 +1,109 @@
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 框大小按边长 sqrt(w*h)（像素）分组，各组下限；32 / 96 与 COCO 的 small / medium / large 分界一致
+SIZE_EDGES = (0, 16, 32, 64, 96, 128, 256, 512)
+_MEDIUM_BIN = SIZE_EDGES.index(32)
+_LARGE_BIN = SIZE_EDGES.index(96)
+
+
+def size_histogram(xywh) -> np.ndarray:
+    """Box counts per SIZE_EDGES bin for an (N, 4) xywh array."""
+    xywh = np.asarray(xywh, np.float64).reshape(-1, 4)
+    side = np.sqrt(np.clip(xywh[:, 2] * xywh[:, 3], 0, None))
+    bins = np.searchsorted(SIZE_EDGES, side, side='right') - 1
+    return np.bincount(bins, minlength=len(SIZE_EDGES)).astype(np.int64)
+
+
+class _ImageStats:
+    __slots__ = ('counts', 'hist', 'boxes')
+
+    def __init__(self, store):
+        per_class = np.bincount(store.class_id, minlength=len(store.names)) if len(store) else ()
+        self.counts: Dict[str, int] = {store.names[i]: int(n) for i, n in enumerate(per_class) if n}
+        self.hist = size_histogram(store.xywh)
+        self.boxes = len(store)
+
+
+class AnnotationStats:
+    """Project-wide annotation statistics: per-class box counts, box size
+    histogram and labeled image count.
+
+    ``load_table`` seeds the totals from an AnnotationTable in one
+    vectorized pass; ``set_image`` then swaps a single image's contribution
+    when it is saved, so updates cost O(boxes in that image) and reads cost
+    O(classes). Images set since the project was opened stay authoritative
+    when a newer table is loaded.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.class_counts: Dict[str, int] = {}
+        self.size_hist = np.zeros(len(SIZE_EDGES), np.int64)
+        self.labeled_images = 0
+        self.box_count = 0
+        self._images: Dict[Hashable, _ImageStats] = {}  # 本次打开项目后保存过的图片
+        self._table = None
+        self._table_rows: Dict[Hashable, int] = {}
+
+    # --- updates ------------------------------------------------------
+    def _apply(self, entry: Optional[_ImageStats], sign: int):
+        if entry is None or not entry.boxes:
+            return
+        for label, n in entry.counts.items():
+            total = self.class_counts.get(label, 0) + sign * n
+            if total:
+                self.class_counts[label] = total
+            else:
+                self.class_counts.pop(label, None)
+        self.size_hist += sign * entry.hist
+        self.box_count += sign * entry.boxes
+        self.labeled_images += sign
+
+    def _from_table(self, key) -> Optional[_ImageStats]:
+        row = self._table_rows.get(key)
+        return _ImageStats(self._table.store(row)) if row is not None else None
+
+    def load_table(self, table, keys: Sequence[Hashable]):
+        """Reset the totals from an AnnotationTable whose image ``i`` is ``keys[i]``."""
+        self._table = table
+        self._table_rows = {key: i for i, key in enumerate(keys)}
+        self.class_counts = {name: int(n) for name, n in zip(table.names, table.class_counts().tolist()) if n}
+        self.size_hist = size_histogram(table.xywh)
+        self.labeled_images = int((table.box_counts > 0).sum())
+        self.box_count = len(table.class_id)
+        for key, entry in self._images.items():
+            # 表格可能早于这些保存读取，以保存时的内容为准
+            self._apply(self._from_table(key), -1)
+            self._apply(entry, 1)
+
+    def set_image(self, key, store):
+        """Replace the contribution of image ``key`` with the boxes of ``store`` (a BoxStore)."""
+        old = self._images[key] if key in self._images else self._from_table(key)
+        self._apply(old, -1)
+        entry = _ImageStats(store)
+        self._apply(entry, 1)
+        self._images[key] = entry
+
+    # --- reads --------------------------------------------------------
+    def count(self, label: str) -> int:
+        return self.class_counts.get(label, 0)
+
+    def size_groups(self) -> Tuple[int, int, int]:
+        """(small, medium, large) box counts with the COCO 32 / 96 px thresholds."""
+        hist = self.size_hist
+        return (int(hist[:_MEDIUM_BIN].sum()), int(hist[_MEDIUM_BIN:_LARGE_BIN].sum()),
+                int(hist[_LARGE_BIN:].sum()))
+
+    def summary(self, total_images: int) -> dict:
+        return {
+            'total_images': total_images,
+            'labeled_images': self.labeled_images,
+            'unlabeled_images': max(0, total_images - self.labeled_images),
+            'boxes': self.box_count,
+            'class_counts': dict(self.class_counts),
+            'size_histogram': dict(zip(SIZE_EDGES, self.size_hist.tolist())),
+        }
@@ -1,36 +1,56 @@
 import sys
 import os
+import functools
+import time
 import cv2
 import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QHBoxLayout, QPushButton, QLabel, QFileDialog,
                             QListWidget, QCheckBox, QComboBox, QMenu, QInputDialog,
                             QSplitter, QFrame, QDialog, QSlider, QAction,
-                            QGroupBox, QSpinBox, QDoubleSpinBox, QLineEdit, QProgressDialog)
-from PyQt5.QtCore import Qt, QPoint, QTimer
+                            QGroupBox, QSpinBox, QDoubleSpinBox, QLineEdit, QProgressDialog,
+                            QProgressBar, QListView)
+from PyQt5.QtCore import Qt, QPoint, QTimer, pyqtSignal
 from PyQt5.QtGui import QImage, QPixmap, QKeySequence, QCursor, QPainter, QPen, QColor
 from PyQt5.QtWidgets import QShortcut
 from PyQt5.QtWidgets import QMessageBox
 import random
+from collections import Counter
 from PyQt5.QtWidgets import QListWidgetItem
 from PyQt5.QtGui import QFont
 
 # Corrected relative imports after moving files
 from ..core.localization import tr
 from ..core.bounding_box import BoundingBox
-from ..core.utils import draw_dashed_rect
-from .widgets import MagnifierWindow, DataAugmentationDialog, AutoLabelDialog, AutoLabelProgressDialog
+from ..core.manifest import ImageManifest
+from ..core.prefetch import ImagePrefetcher
+from ..core.image_cache import get_image_cache
+from ..core.pyramid import ImagePyramid
+from ..core.spatial_index import BoxSpatialIndex, handle_at
+from ..core.box_ops import boxes_to_array, write_back, translate, scale_about_centers, clip_to_image
+from ..core.box_store import BoxStore
+from ..core.history import Edit, EditHistory, box_state
+from ..core.journal import EditJournal
+from ..core.stats import AnnotationStats, SIZE_EDGES
+from ..io.save_queue import SaveQueue, atomic_write, remove_file
+from ..io.coco import COCO_FILENAME, IncrementalCocoWriter
+from ..io.formats import annotation_path, codec_for_path, format_names, get_codec, read_annotations
+from ..io.yolo import format_yolo
+from .widgets import MagnifierWindow, ImageCanvas, FileListModel, DirectoryScanWorker, AnnotationTableWorker, DataAugmentationDialog, AutoLabelDialog, AutoLabelProgressDialog, AutoLabelWorker
 from ..controller.label_controller import LabelController
 from labelimg.inference.autolableing import YOLOEWrapper
 
 
 class LabelingTool(QMainWindow):
+    save_failed = pyqtSignal(str)  # emitted from the save thread
+
     def __init__(self):
         super().__init__()
         self.magnifier_enabled = True
         self.magnifier = None
         self.magnifier_active = False
         self.min_box_size = 15
+        self.auto_label_batch_size = 8  # 批量自动标注时每次前向推理的图片数
         self.handle_visual_size = 6
         self.handle_detection_threshold = 8
         self.label_font_scale = 0.4
@@ -44,6 +64,10 @@ class LabelingTool(QMainWindow):
         self.selected_bbox = None
         self.drawing = False
         self.dragging = False
+        self.selecting = False  # Shift+拖动：框选
+        self.drag_boxes = []  # 正在拖动的框及其起始坐标 (N, 4)
+        self.drag_origin = None
+        self.drag_states = []
         self.resize_handle = None
         self.bbox_start = None
         self.bbox_end = None
@@ -56,8 +80,26 @@ class LabelingTool(QMainWindow):
         self.has_dragged = False
         self.original_bbox = None
         self.selected_bboxes = set()
-        self.undo_stack = {}
-        self.redo_stack = {}
+        self.history = EditHistory()  # 按图片记录增量撤销/重做，全局内存上限
+        self.manifest = None
+        self.scan_worker = None
+        self.stats = AnnotationStats()  # 整个项目的标注统计，保存时增量更新
+        self.stats_worker = None
+        self.auto_label_worker = None  # 正在运行的 AutoLabelWorker
+        self._auto_label_job = None
+        self._legend_classes = None  # 图例当前条目对应的类别
+        self.image_cache = get_image_cache()  # 按字节上限淘汰的解码图片缓存
+        self.image_pyramid = None  # 当前图片的降采样金字塔，用于快速显示
+        self._display_base_key = None  # 当前底图 pixmap 对应的 (图片, 尺寸)
+        self.box_index = BoxSpatialIndex()  # 当前图片标注框的网格索引，用于点击/悬停检测
+        self.prefetch_radius = 3  # 前后各预解码几张图片
+        self.prefetcher = ImagePrefetcher(radius=self.prefetch_radius)
+        # 标注文件在后台线程写入（同一文件的多次保存会合并），界面线程不等待磁盘
+        self.save_queue = SaveQueue(on_error=lambda key, e: self.save_failed.emit(str(e)))
+        self.save_failed.connect(self._on_save_failed)
+        # COCO 文件按图片增量更新（写入器只在保存线程中使用），读取时按图片查索引
+        self.coco_index = get_codec("COCO").index
+        self.coco_writer = IncrementalCocoWriter(self._image_size, self.min_box_size, self.coco_index)
         # YOLOEWrapper将在类别加载后延迟初始化
         self.yoloe_wrapper = None
         
@@ -117,7 +159,7 @@ class LabelingTool(QMainWindow):
         self.magnifier = MagnifierWindow(self)
         self.magnifier.hide()
         
-        self.image_label = QLabel()
+        self.image_label = ImageCanvas(self)
         self.image_label.setAlignment(Qt.AlignCenter)
         self.image_label.setContextMenuPolicy(Qt.CustomContextMenu)
         self.image_label.customContextMenuRequested.connect(self.showContextMenu)
@@ -148,12 +190,16 @@ class LabelingTool(QMainWindow):
         format_label.setStyleSheet("font-weight: bold; font-size: 13px; margin-bottom: 2px;")
         control_layout.addWidget(format_label)
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["YOLO", "VOC", "COCO"])
+        self.format_combo.addItems(format_names())
         self.format_combo.setCurrentText("YOLO")
         control_layout.addWidget(self.format_combo)
 
-        self.file_list = QListWidget()
-        self.file_list.itemClicked.connect(self.onFileSelected)
+        # 虚拟列表：只为可见行取数据，状态保存在模型的数组中
+        self.file_model = FileListModel(self)
+        self.file_list = QListView()
+        self.file_list.setUniformItemSizes(True)
+        self.file_list.setModel(self.file_model)
+        self.file_list.clicked.connect(self.onFileSelected)
         control_layout.addWidget(self.file_list)
 
         btn_layout = QHBoxLayout()
@@ -217,11 +263,25 @@ class LabelingTool(QMainWindow):
         self.legend_list.setMaximumHeight(200)
         # self.legend_list.status_level = 1 # This attribute is not standard for QListWidget
         self.legend_list.setStyleSheet("QListWidget::item { height: 18px; }")
+        self.legend_list.setToolTip(tr("legend_counts_tooltip"))
+        self.legend_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.legend_list.customContextMenuRequested.connect(self.showLegendContextMenu)
         legend_layout.addWidget(self.legend_list)
+        stats_title = QLabel(tr("project_stats"))
+        stats_title.setMaximumHeight(20)
+        legend_layout.addWidget(stats_title)
+        self.stats_label = QLabel()
+        self.stats_label.setWordWrap(True)
+        legend_layout.addWidget(self.stats_label)
         control_layout.addWidget(legend_frame)
 
         self.statusBar = self.statusBar() # This line should be self.statusBar() not self.statusBar
         self.statusBar.showMessage(tr("ready")) # Use tr() for "Ready"
+        self.scan_progress = QProgressBar()
+        self.scan_progress.setMaximumWidth(200)
+        self.scan_progress.setFormat("%v / %m")
+        self.scan_progress.hide()
+        self.statusBar.addPermanentWidget(self.scan_progress)
 
         button_layout = QHBoxLayout()
         button_layout.addStretch(1)
@@ -255,7 +315,15 @@ class LabelingTool(QMainWindow):
             (QKeySequence(Qt.Key_Down), self.nextImage),
             (QKeySequence("C"), self.toggle_label_propagation),
             (QKeySequence("Ctrl+Z"), self.undo),
-            (QKeySequence("Ctrl+Y"), self.redo)
+            (QKeySequence("Ctrl+Y"), self.redo),
+            (QKeySequence("Ctrl+A"), self.selectAllBoxes),
+            (QKeySequence("R"), self.relabelSelectedBoxes),
+            (QKeySequence("Ctrl+="), lambda: self.scaleSelectedBoxes(1.1)),
+            (QKeySequence("Ctrl+-"), lambda: self.scaleSelectedBoxes(1 / 1.1)),
+            (QKeySequence("Shift+Left"), lambda: self.moveSelectedBoxes(-1, 0)),
+            (QKeySequence("Shift+Right"), lambda: self.moveSelectedBoxes(1, 0)),
+            (QKeySequence("Shift+Up"), lambda: self.moveSelectedBoxes(0, -1)),
+            (QKeySequence("Shift+Down"), lambda: self.moveSelectedBoxes(0, 1))
         ]
         for seq, func in shortcuts:
             QShortcut(seq, self, activated=func)
@@ -292,6 +360,11 @@ class LabelingTool(QMainWindow):
         auto_label_current_action = QAction(tr("auto_label_current_image"), self)
         auto_label_current_action.triggered.connect(self.show_auto_label_current_dialog)
         auto_label_menu.addAction(auto_label_current_action)
+
+        # 撤销整批自动标注（记录在项目的撤销日志中）
+        revert_batch_action = QAction(tr("revert_auto_label_batch"), self)
+        revert_batch_action.triggered.connect(self.revertAutoLabelBatch)
+        auto_label_menu.addAction(revert_batch_action)
         
         help_menu = main_menu.addMenu(tr("help_menu"))
         shortcut_action = help_menu.addAction(tr("hotkeys_menu"))
@@ -317,7 +390,12 @@ class LabelingTool(QMainWindow):
             ("C", tr("label_propagation_hotkey")),
             ("Ctrl+Click", tr("multi_select_hotkey")),
             ("Ctrl+Z", tr("undo_hotkey")),
-            ("Ctrl+Y", tr("redo_hotkey"))
+            ("Ctrl+Y", tr("redo_hotkey")),
+            ("Ctrl+A", tr("select_all_hotkey")),
+            ("Shift+Drag", tr("rubber_band_hotkey")),
+            ("R", tr("relabel_hotkey")),
+            ("Ctrl+= / Ctrl+-", tr("scale_boxes_hotkey")),
+            ("Shift+←↑→↓", tr("move_boxes_hotkey"))
         ]
         # QShortcut(QKeySequence("Ctrl+H"), self, activated=self.showShortcutHelp) # Recursive shortcut
         # QShortcut(QKeySequence("Ctrl+A"), self, activated=self.showAboutDialog) # Usually for Select All
@@ -409,11 +487,19 @@ class LabelingTool(QMainWindow):
         else:
             self.status_label.setText(tr("label_propagation_disabled"))
 
-    def update_class_stats(self): # Marked for removal by user
-        pass
+    def update_class_stats(self):
+        self.updateColorLegend()
 
-    def updateAnnotationStats(self): # Marked for removal by user
-        pass
+    def updateAnnotationStats(self):
+        """Refresh the project statistics panel from self.stats."""
+        stats = self.stats
+        total = len(self.image_list)
+        lines = [tr("stats_summary").format(stats.labeled_images, total, max(0, total - stats.labeled_images),
+                                            stats.box_count),
+                 tr("stats_box_sizes").format(*stats.size_groups())]
+        self.stats_label.setText("\n".join(lines))
+        bounds = [f"{lo}-{hi}px" for lo, hi in zip(SIZE_EDGES, SIZE_EDGES[1:])] + [f"≥{SIZE_EDGES[-1]}px"]
+        self.stats_label.setToolTip("\n".join(f"{bound}: {n}" for bound, n in zip(bounds, stats.size_hist.tolist())))
 
     def update_stats_display(self):
         nav_stats = [
@@ -423,52 +509,30 @@ class LabelingTool(QMainWindow):
         ]
         self.status_label.setText(" | ".join(nav_stats))
 
-    def calculate_annotation_stats(self): # Marked for removal by user
-        pass
+    def calculate_annotation_stats(self):
+        return self.stats.summary(len(self.image_list))
 
-    def onFileSelected(self, item):
-        if not item or not self.image_list:
+    def onFileSelected(self, index):
+        if not index.isValid() or not self.image_list:
             return
-            
-        filename = item.text()
-        # Assuming self.current_dir is set correctly when a directory is opened
-        if not hasattr(self, 'current_dir') or not self.current_dir:
-             print("Error: current_dir not set.") # Or handle more gracefully
-             return
 
-        dir_path = self.current_dir # Use self.current_dir
-        full_path = os.path.join(dir_path, filename)
-        
-        try:
-            # Find index based on full_path if image_list contains full paths
-            # Or find index based on filename if image_list contains just basenames
-            # Assuming image_list stores full paths as per openDirectory logic
-            idx = self.image_list.index(full_path)
-        except ValueError:
-            # Fallback: try finding by basename if full_path fails (e.g. if image_list was populated differently)
-            try:
-                idx = [os.path.basename(p) for p in self.image_list].index(filename)
-            except ValueError:
-                print(f"Error: {filename} not found in image_list.")
-                return
-            
+        idx = index.row()
         if idx != self.current_index:
             if self.autosave:
                 self.saveAnnotations()
+            self.prefetcher.record_step(idx - self.current_index if abs(idx - self.current_index) == 1 else 0)
             self.current_index = idx
-            self.viewed_indices.add(idx)
             self.loadImage(self.image_list[idx]) # loadImage expects full path
-            self.file_list.setCurrentRow(idx)
-            self.updateStatusDisplay()
             self.updateFileListColors()
+            self.updateStatusDisplay()
 
     def updateFileListColors(self):
-        for i in range(self.file_list.count()):
-            item = self.file_list.item(i)
-            if i in self.viewed_indices:
-                item.setForeground(QColor(0, 128, 0))
-            else:
-                item.setForeground(QColor(0, 0, 0))
+        """Mark the current image as viewed and select it in the file list; only that row is repainted."""
+        if self.current_index < 0:
+            return
+        self.viewed_indices.add(self.current_index)
+        self.file_model.set_viewed(self.current_index)
+        self.file_list.setCurrentIndex(self.file_model.index(self.current_index))
 
     def loadClasses(self, class_path=None):
         """Load classes from specified file or default location"""
@@ -548,32 +612,29 @@ class LabelingTool(QMainWindow):
             return
             
         scaled_pos = self.getScaledPoint(position)
-        clicked_bbox = None
-        for bbox_item in reversed(self.bboxes): # Iterate reversed to get topmost box
-            if bbox_item.contains(scaled_pos):
-                clicked_bbox = bbox_item
-                break # Found the box under cursor
+        clicked_bbox = self._box_index().box_at(scaled_pos.x(), scaled_pos.y()) # Topmost box under cursor
 
         if clicked_bbox:
             menu = QMenu()
             edit_action = menu.addAction(tr("edit_label"))
             delete_action = menu.addAction(tr("delete")) # This should be "Delete Selected Box(es)" or similar for consistency
+            relabel_action = None
+            if clicked_bbox in self.selected_bboxes and len(self.selected_bboxes) > 1:
+                relabel_action = menu.addAction(tr("relabel_selected"))
             
             action = menu.exec_(self.image_label.mapToGlobal(position))
             
-            if action == delete_action:
-                self.push_undo() # Save state before deleting
-                self.bboxes.remove(clicked_bbox)
-                if clicked_bbox == self.selected_bbox: # if the deleted box was the single selected
-                    self.selected_bbox = None
-                if clicked_bbox in self.selected_bboxes: # if part of multi-selection
-                    self.selected_bboxes.remove(clicked_bbox)
+            if action is not None and action == relabel_action:
+                self.relabelSelectedBoxes()
+
+            elif action == delete_action:
+                self._remove_boxes([clicked_bbox])
                 self.updateColorLegend()
                 self.updateDisplay()
                 if self.autosave: self.saveAnnotations()
 
             elif action == edit_action:
-                self.push_undo() # Save state before editing
+                before = box_state(clicked_bbox)
                 text, ok = QInputDialog.getText(self, tr("edit_label"), 
                                               tr("enter_new_label"), 
                                               text=clicked_bbox.label)
@@ -588,6 +649,7 @@ class LabelingTool(QMainWindow):
                         except Exception as e:
                             QMessageBox.warning(self, tr("class_save_failed"), tr("failed_to_write_classes").format(str(e)))
                     clicked_bbox.label = text
+                    self._record_modified([clicked_bbox], [before])
                     self.updateColorLegend()
                     self.updateDisplay()
                     if self.autosave: self.saveAnnotations()
@@ -608,6 +670,7 @@ class LabelingTool(QMainWindow):
         # 保存当前状态
         if hasattr(self, 'current_dir') and self.current_dir and self.autosave:
             self.saveAnnotations()
+        self.save_queue.flush()  # 切换项目前写完所有待保存的标注
         
         dir_path = QFileDialog.getExistingDirectory(self, tr("open_directory_title"))
         if dir_path:
@@ -617,56 +680,127 @@ class LabelingTool(QMainWindow):
             self.current_dir = dir_path
             self.image_list = []
             self.viewed_indices = set()
-            valid_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff')
             
             # 更新窗口标题显示当前项目路径
             project_name = os.path.basename(dir_path)
             self.setWindowTitle(f'BakuFlow - {project_name}')
             
-            # Scan for images
-            found_images = []
-            for filename in sorted(os.listdir(dir_path)):
-                if filename.lower().endswith(valid_extensions):
-                    img_path = os.path.join(dir_path, filename)
-                    test_img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                    if test_img is not None:
-                        found_images.append(img_path)
-                    else:
-                        print(f"Warning: Skipping unreadable or invalid image file: {img_path}")
-
-            self.image_list = found_images
-            self.total_images = len(self.image_list)
-            
-            self.file_list.clear()
-            self.file_list.addItems([os.path.basename(f) for f in self.image_list])
-            
-            if self.image_list:
-                self.current_index = 0
-                self.viewed_indices.add(0)
-                self.loadClasses() # Load classes.txt from the new directory
-                self.loadImage(self.image_list[0])
-                self.file_list.setCurrentRow(0)
-                self.updateStatusDisplay()
-                self.updateFileListColors()
-                
-                # 显示项目加载成功信息
-                self.status_label.setText(tr("project_loaded").format(project_name, len(self.image_list)))
-            else:
-                self.current_index = -1
-                self.current_image = None
-                self.image_label.clear()
-                self.updateDisplay()
-                self.updateColorLegend()
-                self.status_label.setText(tr("no_images_found"))
-                QMessageBox.information(self, tr("no_images_title"), tr("no_images_message"))
+            # Scan for images in the background (header-only probe, no pixel decoding).
+            # The first image is shown as soon as it is found.
+            self.total_images = 0
+            self.file_model.clear()
+            self.manifest = ImageManifest(dir_path)
+            self.history = EditHistory(journal=EditJournal(dir_path))  # 撤销记录持久化到项目目录
+            self._start_directory_scan()
+
+    def _start_directory_scan(self):
+        self._stop_directory_scan()
+        self.scan_progress.setRange(0, 0)  # busy indicator until the total is known
+        self.scan_progress.show()
+        self.statusBar.showMessage(tr("scanning_directory"))
+        self.scan_worker = DirectoryScanWorker(self.manifest)
+        self.scan_worker.batch_found.connect(self._on_scan_batch)
+        self.scan_worker.progress.connect(self._on_scan_progress)
+        self.scan_worker.finished.connect(self._on_scan_finished)
+        self.scan_worker.error.connect(self._on_scan_error)
+        self.scan_worker.start()
+
+    def _stop_directory_scan(self):
+        if self.scan_worker is None:
+            return
+        worker, self.scan_worker = self.scan_worker, None
+        worker.cancel()
+        worker.wait()
+        self.scan_progress.hide()
+
+    def _on_scan_batch(self, paths):
+        if self.sender() is not self.scan_worker:
+            return  # stale batch from a scan that was cancelled
+        self.image_list.extend(paths)
+        self.total_images = len(self.image_list)
+        self.file_model.append(paths, [self.manifest.is_labeled(p) for p in paths])
+
+        if self.current_index < 0 and self.image_list:
+            self.current_index = 0
+            self.loadClasses() # Load classes.txt from the new directory
+            self.loadImage(self.image_list[0])
+            self.updateFileListColors()
+        elif self.current_index >= 0:
+            self._schedule_prefetch()  # the window may now reach into the new batch
+        self.updateStatusDisplay()
+
+    def _on_scan_progress(self, processed, total):
+        if self.sender() is not self.scan_worker:
+            return
+        self.scan_progress.setRange(0, total)
+        self.scan_progress.setValue(processed)
+
+    def _on_scan_finished(self, count):
+        if self.sender() is not self.scan_worker:
+            return
+        self.scan_worker = None
+        self.scan_progress.hide()
+        self.statusBar.clearMessage()
+        project_name = os.path.basename(self.current_dir)
+        if self.image_list:
+            self._start_stats_scan()
+            # 显示项目加载成功信息
+            self.status_label.setText(tr("project_loaded").format(project_name, len(self.image_list)))
+        else:
+            self.current_index = -1
+            self.current_image = None
+            self.image_label.clear()
+            self.updateDisplay()
+            self.updateColorLegend()
+            self.status_label.setText(tr("no_images_found"))
+            QMessageBox.information(self, tr("no_images_title"), tr("no_images_message"))
+
+    def _on_scan_error(self, msg):
+        if self.sender() is not self.scan_worker:
+            return
+        self.scan_worker = None
+        self.scan_progress.hide()
+        QMessageBox.warning(self, tr("load_error"), msg)
+
+    def _start_stats_scan(self):
+        """Read every annotation file in the background to seed the project statistics."""
+        self._stop_stats_scan()
+        size_lookup = self.manifest.image_size if self.manifest is not None else None
+        self.stats_worker = AnnotationTableWorker(self.image_list, self.classes, size_lookup)
+        self.stats_worker.loaded.connect(self._on_stats_loaded)
+        self.stats_worker.error.connect(lambda msg: print(f"[Debug] 统计标注失败: {msg}"))
+        self.stats_worker.start()
+
+    def _stop_stats_scan(self):
+        if self.stats_worker is None:
+            return
+        worker, self.stats_worker = self.stats_worker, None
+        worker.cancel()
+        worker.wait()  # 各读取线程在下一个文件前退出
+
+    def _on_stats_loaded(self, table, image_paths):
+        if self.sender() is not self.stats_worker:
+            return
+        self.stats_worker = None
+        self.stats.load_table(table, image_paths)
+        self.updateColorLegend()
 
     def reset_project_state(self):
         """完整重置项目状态"""
+        self._stop_directory_scan()
+        self._stop_stats_scan()
+        self._stop_auto_label_worker()
+        self._close_journal()
+        self.stats = AnnotationStats()
+        self._legend_classes = None
         # 清空所有相关状态
         self.label_cache = {}
         self.label_colors = {}
-        self.undo_stack = {}
-        self.redo_stack = {}
+        self.history = EditHistory()
+        self.manifest = None
+        self.coco_index = get_codec("COCO").index
+        self.coco_writer = IncrementalCocoWriter(self._image_size, self.min_box_size, self.coco_index)
+        self.prefetcher.invalidate()
         self.bboxes = []
         self.selected_bbox = None
         self.selected_bboxes = set()
@@ -678,6 +812,7 @@ class LabelingTool(QMainWindow):
         self.legend_list.clear()
         self.current_index = -1
         self.current_image = None
+        self.image_pyramid = None
         
         # 重置选项状态
         self.copy_checkbox.setChecked(False)
@@ -700,7 +835,12 @@ class LabelingTool(QMainWindow):
             self.selected_bboxes = set()
             # QApplication.processEvents() # Usually not needed here, can cause issues
 
-            new_image = cv2.imread(image_path)
+            # Take the decoded image (and its annotations) from the prefetch buffer if available
+            self._wait_for_saves(image_path)  # a prefetched parse is only trusted against the final file
+            new_image, pyramid, prefetched_bboxes = self._take_prefetched(image_path)
+            if new_image is None:
+                new_image = self.image_cache.load(image_path)
+                pyramid = None
             if new_image is None:
                 QMessageBox.critical(self, tr("load_error"), tr("cannot_read_image").format(image_path)) # Corrected
                 # Potentially remove this image from list or mark as bad
@@ -710,10 +850,15 @@ class LabelingTool(QMainWindow):
                 return
 
             self.current_image = new_image
+            self.image_pyramid = pyramid if pyramid is not None else ImagePyramid(new_image)
             current_height, current_width = self.current_image.shape[:2]
             
             # Load annotations based on the selected format
-            self.loadAnnotationsForCurrentImage()
+            if prefetched_bboxes is not None:
+                self.bboxes = prefetched_bboxes
+                self.updateColorLegend()
+            else:
+                self.loadAnnotationsForCurrentImage()
 
 
             # Label propagation logic
@@ -721,7 +866,7 @@ class LabelingTool(QMainWindow):
                 prev_img_idx = self.current_index -1 # Check if current_index is valid before this
                 # Ensure prev_img_idx is valid and in label_cache
                 if prev_img_idx >= 0 and prev_img_idx < len(self.image_list) and prev_img_idx in self.label_cache :
-                    prev_bboxes_data = self.label_cache[prev_img_idx] # This is a list of BoundingBox objects
+                    prev_bboxes_data = self.label_cache[prev_img_idx] # BoxStore of the previous image
                     
                     # Need dimensions of previous image for scaling
                     # This could be slow if we re-read. Consider storing dims or not scaling if dims unknown.
@@ -737,20 +882,11 @@ class LabelingTool(QMainWindow):
                     # The intent is likely to propagate bboxes *from* previous image *to* current.
                     
                     # If we are propagating *all* labels from previous:
-                    propagated_bboxes_list = []
-                    for b_data in prev_bboxes_data: # b_data is BoundingBox object
-                        # Potentially scale b_data based on prev_image and current_image dimensions
-                        # For simplicity, let's assume direct propagation first, scaling can be added
-                        new_bbox = BoundingBox(b_data.x, b_data.y, b_data.w, b_data.h, b_data.label)
-                        
-                        # Boundary check for the new image
-                        new_bbox.x = max(0, min(new_bbox.x, current_width - self.min_box_size))
-                        new_bbox.y = max(0, min(new_bbox.y, current_height - self.min_box_size))
-                        new_bbox.w = max(self.min_box_size, min(new_bbox.w, current_width - new_bbox.x))
-                        new_bbox.h = max(self.min_box_size, min(new_bbox.h, current_height - new_bbox.y))
-
-                        if new_bbox.w >= self.min_box_size and new_bbox.h >= self.min_box_size:
-                           propagated_bboxes_list.append(new_bbox)
+                    # prev_bboxes_data is a BoxStore; clip every box to the new image in one go
+                    propagated = prev_bboxes_data.copy()
+                    propagated.xywh = clip_to_image(propagated.xywh, current_width, current_height,
+                                                    self.min_box_size).astype(np.int32)
+                    propagated_bboxes_list = propagated.to_boxes()
 
                     if self.copy_checkbox.isChecked(): # Check again, in case it was toggled
                         if not self.selected_bboxes: # If no specific boxes were selected on prev (difficult to track), propagate all
@@ -777,10 +913,10 @@ class LabelingTool(QMainWindow):
             self.bboxes = [b for b in self.bboxes if b.w >= self.min_box_size and b.h >= self.min_box_size]
 
 
-            self.push_undo() # Save initial state of this image
             self.updateDisplay()
             self.updateColorLegend()
             if self.autosave: self.saveAnnotations() # Save after loading and potentially propagating
+            self._schedule_prefetch()
 
         except Exception as e:
             QMessageBox.critical(self, tr("load_error"), tr("image_load_failed_detailed").format(image_path, str(e))) # Corrected
@@ -791,39 +927,66 @@ class LabelingTool(QMainWindow):
             return
 
         image_path = self.image_list[self.current_index]
-        fmt = self.format_combo.currentText()
-        annotation_path = ""
+        path = annotation_path(image_path, self.format_combo.currentText())
 
-        if fmt == "YOLO":
-            annotation_path = os.path.splitext(image_path)[0] + '.txt'
-        elif fmt == "VOC":
-            annotation_path = os.path.splitext(image_path)[0] + '.xml'
-        elif fmt == "COCO":
-            # COCO is usually one file for a dataset.
-            # The logic needs to find annotations for the current image within that JSON.
-            folder = os.path.dirname(image_path)
-            # Allow user to specify COCO file or look for a default name
-            # For now, assume a fixed name or that it's handled by loadAnnotations
-            annotation_path = os.path.join(folder, 'coco_annotations.json')
-
-
-        if os.path.exists(annotation_path):
-            self.loadAnnotations(annotation_path) # This method populates self.bboxes
+        if os.path.exists(path) or self.coco_index.has_pending(path, os.path.basename(image_path)):
+            self.loadAnnotations(path) # This method populates self.bboxes
         else:
             self.bboxes = [] # No annotation file found
 
 
+    def _annotation_key(self, annotation_path, fmt, classes):
+        """Identifies the annotation file state a prefetched result was parsed from."""
+        try:
+            st = os.stat(annotation_path)
+            stamp = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+        return (fmt, annotation_path, stamp, tuple(classes))
+
+    def _prefetch_load(self, fmt, classes, image_path):
+        """Runs on the prefetch thread pool: decode image, build its display pyramid and parse its annotations."""
+        image = self.image_cache.load(image_path)
+        pyramid = ImagePyramid(image).build_all() if image is not None else None
+        if image is None or get_codec(fmt).dataset_wide:
+            # COCO annotations live in one dataset-wide file, loaded on the GUI thread
+            return image, pyramid, None, None
+        path = annotation_path(image_path, fmt)
+        key = self._annotation_key(path, fmt, classes)
+        height, width = image.shape[:2]
+        bboxes = read_annotations(path, width, height, classes) if key[2] else BoxStore(classes)
+        return image, pyramid, key, bboxes
+
+    def _schedule_prefetch(self):
+        if self.current_index < 0 or not self.image_list:
+            return
+        fmt = self.format_combo.currentText()
+        loader = functools.partial(self._prefetch_load, fmt, tuple(self.classes))
+        self.prefetcher.update(self.image_list, self.current_index, loader=loader)
+
+    def _take_prefetched(self, image_path):
+        """Return (image, pyramid, bboxes) from the prefetch buffer; bboxes is None if stale."""
+        result = self.prefetcher.get(image_path)
+        if result is None or result[0] is None:
+            return None, None, None
+        image, pyramid, key, bboxes = result
+        fmt = self.format_combo.currentText()
+        if key is None or bboxes is None:
+            return image, pyramid, None
+        if key != self._annotation_key(annotation_path(image_path, fmt), fmt, self.classes):
+            return image, pyramid, None
+        return image, pyramid, bboxes.to_boxes()
+
     def nextImage(self):
         if self.current_index < len(self.image_list) - 1:
             if self.autosave:
                 self.saveAnnotations() 
             
             self.current_index += 1
-            self.viewed_indices.add(self.current_index)
+            self.prefetcher.record_step(1)
             self.loadImage(self.image_list[self.current_index])
-            self.file_list.setCurrentRow(self.current_index) # Sync file list selection
+            self.updateFileListColors() # Sync file list selection
             self.updateStatusDisplay()
-            self.updateFileListColors()
 
 
     def prevImage(self):
@@ -832,18 +995,19 @@ class LabelingTool(QMainWindow):
                 self.saveAnnotations()
 
             self.current_index -= 1
-            self.viewed_indices.add(self.current_index) # Should always add, even if going back
+            self.prefetcher.record_step(-1)
             self.loadImage(self.image_list[self.current_index])
-            self.file_list.setCurrentRow(self.current_index) # Sync file list selection
+            self.updateFileListColors() # Sync file list selection
             self.updateStatusDisplay()
-            self.updateFileListColors()
     
     def saveAnnotations(self):
+        """Queue the current image's annotations for writing on the save thread."""
         if self.current_image is None or self.current_index < 0:
             return False
         
         # Always save YOLO, as it's the primary internal format for caching too.
         yolo_saved_successfully = self.saveYOLOAnnotation()
+        self.updateColorLegend()  # 项目统计已随保存更新
 
         fmt = self.format_combo.currentText()
         if fmt == "YOLO":
@@ -854,240 +1018,137 @@ class LabelingTool(QMainWindow):
             return self.saveCOCOAnnotation()
         return False # Should not happen if combo box is constrained
 
+    def _on_save_failed(self, message):
+        QMessageBox.critical(self, tr("save_error"), message)
+
+    def _wait_for_saves(self, image_path):
+        """Let queued writes of this image's annotation files land before they are read back.
+
+        Only the per-image files are waited on; a queued COCO rewrite is
+        served from CocoIndex's pending entry instead.
+        """
+        stem = os.path.splitext(image_path)[0]
+        self.save_queue.wait_for([stem + '.txt', stem + '.xml'])
+
     def saveYOLOAnnotation(self):
         if self.current_index < 0 or self.current_index >= len(self.image_list): 
             print("[Debug] 保存失败: 无效的图片索引")
             return False
-            
-        img_path = self.image_list[self.current_index]
-        txt_path = os.path.splitext(img_path)[0] + '.txt'
+        
+        if self.current_image is None: 
+            print("[Debug] 保存失败: 当前没有加载图片")
+            return False
+        
+        height, width = self.current_image.shape[:2]
+        return self._write_yolo_boxes(self.current_index, self.bboxes, width, height)
+
+    def _write_yolo_boxes(self, idx, boxes, width, height):
+        """Queue ``boxes`` (a list or BoxStore) as the YOLO .txt of image ``idx`` and refresh its cache entry."""
+        img_path = self.image_list[idx]
+        txt_path = get_codec("YOLO").path_for(img_path)
         ## Ensure txt_path uses the correct path separator
         # Added this to avoid error in Windows
         txt_path = txt_path.replace('/', os.sep)
          
         print(f"[Debug] 准备保存标注到: {txt_path}")
         
-        if self.current_image is None: 
-            print("[Debug] 保存失败: 当前没有加载图片")
+        if width == 0 or height == 0: 
+            print("[Debug] 保存失败: 图片尺寸无效")
             return False
-        
-        try:
-            height, width = self.current_image.shape[:2]
-            if width == 0 or height == 0: 
-                print("[Debug] 保存失败: 图片尺寸无效")
-                return False
-
 
-            valid_boxes_for_saving = []
-            for bbox in self.bboxes:
-
-                if not (bbox.w >= self.min_box_size and bbox.h >= self.min_box_size and \
-                        0 <= bbox.x < width and 0 <= bbox.y < height and \
-                        bbox.x + bbox.w <= width and bbox.y + bbox.h <= height):
-                    print(f"[Debug] 边界框无效，跳过")
-                    continue
-
-                try:
-                    if bbox.label not in self.classes:
-                        print(f"[Debug] 跳过未知标签: {bbox.label}")
-                        continue
-                    class_idx = self.classes.index(bbox.label)
-                except ValueError:
-                    print(f"[Debug] 标签索引错误: {bbox.label}")
-                    continue
-
-                x_center = (bbox.x + bbox.w / 2) / width
-                y_center = (bbox.y + bbox.h / 2) / height
-                w_norm = bbox.w / width
-                h_norm = bbox.h / height
-                valid_boxes_for_saving.append(f"{class_idx} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}")
-                print(f"[Debug] 添加有效边界框: class={class_idx}, label={bbox.label}, x_center={x_center:.3f}, y_center={y_center:.3f}")
-
-            if valid_boxes_for_saving:
-                print(f"[Debug] 写入 {len(valid_boxes_for_saving)} 个边界框到文件")
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    for line in valid_boxes_for_saving:
-                        f.write(line + "\n")
-                self.label_cache[self.current_index] = [BoundingBox(b.x, b.y, b.w, b.h, b.label) for b in self.bboxes if b.w >= self.min_box_size and b.h >= self.min_box_size]
+        # 一次性校验所有框；缓存立即更新，文件由保存线程写入
+        store = boxes.copy() if isinstance(boxes, BoxStore) else BoxStore.from_boxes(boxes, self.classes)
+        valid = store.valid_mask(width, height, self.min_box_size)
+        if not valid.all():
+            print(f"[Debug] 跳过 {int((~valid).sum())} 个无效边界框")
+        class_idx, norm = store.subset(valid).to_yolo(self.classes, width, height)
+        if len(class_idx) < int(valid.sum()):
+            print(f"[Debug] 跳过 {int(valid.sum()) - len(class_idx)} 个未知标签的边界框")
+
+        saved = store.subset(valid)
+        class_set = set(self.classes)
+        known = np.array([name in class_set for name in saved.names] + [False])[saved.class_id]
+        self.stats.set_image(img_path, saved.subset(known))
+        self.file_model.set_labels(idx, saved.subset(known))
+        if len(class_idx):
+            self.label_cache[idx] = store.subset((store.xywh[:, 2] >= self.min_box_size) & (store.xywh[:, 3] >= self.min_box_size))
+        elif idx in self.label_cache:
+            del self.label_cache[idx]
+            print(f"[Debug] 清除缓存中的标注")
+        self.save_queue.submit(txt_path, functools.partial(self._yolo_save_job, img_path, txt_path, class_idx, norm))
+        return True
+
+    def _yolo_save_job(self, img_path, txt_path, class_idx, norm):
+        """Runs on the save thread."""
+        try:
+            if len(class_idx):
+                print(f"[Debug] 写入 {len(class_idx)} 个边界框到文件")
+                atomic_write(txt_path, format_yolo(class_idx, norm))
                 print(f"[Debug] 标注保存成功: {txt_path}")
             else:
-                print(f"[Debug] 没有有效的边界框需要保存")
-                if os.path.exists(txt_path):
-                    os.remove(txt_path)
-                    print(f"[Debug] 删除空的标注文件: {txt_path}")
-                if self.current_index in self.label_cache:
-                    del self.label_cache[self.current_index]
-                    print(f"[Debug] 清除缓存中的标注")
-            
-            return True
+                print(f"[Debug] 没有有效的边界框需要保存，删除标注文件: {txt_path}")
+                remove_file(txt_path)
         except Exception as e:
-            print(f"[Debug] 保存标注时出错: {str(e)}")
-            QMessageBox.critical(self, tr("save_error"), tr("failed_to_save_yolo").format(str(e)))
-            return False
+            raise RuntimeError(tr("failed_to_save_yolo").format(str(e))) from e
+        if self.manifest is not None:
+            self.manifest.set_labeled(img_path, bool(len(class_idx)))
 
     def saveVOCAnnotation(self):
-        import xml.etree.ElementTree as ET # Local import
         if self.current_index < 0 or self.current_index >= len(self.image_list): return False
         img_path = self.image_list[self.current_index]
-        xml_path = os.path.splitext(img_path)[0] + '.xml'
+        xml_path = get_codec("VOC").path_for(img_path)
 
         if self.current_image is None: return False
         
+        height, width = self.current_image.shape[:2]
+        depth = self.current_image.shape[2] if len(self.current_image.shape) > 2 else 1 # Handle grayscale
+        store = BoxStore.from_boxes(self.bboxes, self.classes)  # 快照，XML 在保存线程中生成
+        self.save_queue.submit(xml_path, functools.partial(self._voc_save_job, img_path, xml_path, store, width, height, depth))
+        return True
+
+    def _voc_save_job(self, img_path, xml_path, store, width, height, depth):
+        """Runs on the save thread: build the VOC XML and write it atomically."""
         try:
-            height, width = self.current_image.shape[:2]
-            annotation = ET.Element('annotation')
-            ET.SubElement(annotation, 'folder').text = os.path.basename(os.path.dirname(img_path))
-            ET.SubElement(annotation, 'filename').text = os.path.basename(img_path)
-            # Add path for VOC, often useful
-            ET.SubElement(annotation, 'path').text = img_path 
-
-
-            source = ET.SubElement(annotation, 'source')
-            ET.SubElement(source, 'database').text = 'Unknown' # Or a project name
-
-            size = ET.SubElement(annotation, 'size')
-            ET.SubElement(size, 'width').text = str(width)
-            ET.SubElement(size, 'height').text = str(height)
-            ET.SubElement(size, 'depth').text = str(self.current_image.shape[2] if len(self.current_image.shape) > 2 else 1) # Handle grayscale
-
-            ET.SubElement(annotation, 'segmented').text = '0' # Standard for object detection
-
-            for bbox in self.bboxes:
-                if not (bbox.w >= self.min_box_size and bbox.h >= self.min_box_size): continue
-
-                obj = ET.SubElement(annotation, 'object')
-                ET.SubElement(obj, 'name').text = bbox.label
-                ET.SubElement(obj, 'pose').text = 'Unspecified'
-                ET.SubElement(obj, 'truncated').text = '0' # Heuristic: if box touches image edge, it might be truncated
-                ET.SubElement(obj, 'difficult').text = '0'
-                bndbox = ET.SubElement(obj, 'bndbox')
-                ET.SubElement(bndbox, 'xmin').text = str(bbox.x)
-                ET.SubElement(bndbox, 'ymin').text = str(bbox.y)
-                ET.SubElement(bndbox, 'xmax').text = str(bbox.x + bbox.w)
-                ET.SubElement(bndbox, 'ymax').text = str(bbox.y + bbox.h)
-            
-            tree = ET.ElementTree(annotation)
-            # Prettify XML output if possible (optional)
-            try:
-                from xml.dom import minidom
-                xml_str = ET.tostring(annotation, 'utf-8')
-                pretty_xml_str = minidom.parseString(xml_str).toprettyxml(indent="  ")
-                with open(xml_path, 'w', encoding='utf-8') as f:
-                    f.write(pretty_xml_str)
-            except ImportError:
-                tree.write(xml_path, encoding='utf-8', xml_declaration=True)
-            
-            return True
+            get_codec("VOC").write(xml_path, store, self.classes, width, height, self.min_box_size,
+                                   image_path=img_path, depth=depth)
         except Exception as e:
-            QMessageBox.critical(self, tr("voc_save_error_title"), tr("voc_save_error_msg").format(str(e))) # Corrected
-            return False
+            raise RuntimeError(tr("voc_save_error_msg").format(str(e))) from e
 
     def saveCOCOAnnotation(self):
         # COCO format is dataset-wide. This implies saving all annotations for all images in self.image_list.
         # This is a larger operation than per-image save.
         # The current self.bboxes is only for the current image.
         # We need to iterate all images, load/retrieve their bboxes (from cache or YOLO files), and compile.
-        import json # Local import
         if not self.image_list or not hasattr(self, 'current_dir') or not self.current_dir:
             QMessageBox.warning(self, tr("coco_save_warn_title"), tr("coco_save_warn_msg_no_data")) # Corrected
             return False
 
-        json_path = os.path.join(self.current_dir, 'coco_annotations.json')
-        
-        coco_output = {
-            "info": {"description": "BakuLabel COCO export", "version": "1.0", "year": 2024, "contributor": "BakuLabel User", "date_created": ""}, # Add date
-            "licenses": [{"url": "http://creativecommons.org/licenses/by-nc-sa/2.0/", "id": 1, "name": "Attribution-NonCommercial-ShareAlike License"}], # Example license
-            "images": [],
-            "annotations": [],
-            "categories": []
-        }
-
-        # Populate categories
-        for i, class_name in enumerate(self.classes):
-            coco_output["categories"].append({"id": i, "name": class_name, "supercategory": "object"}) # supercategory can be more specific
-
-        annotation_id_counter = 1
-        
-        # Iterate through all images in the current directory/list
-        for img_idx, img_path_iter in enumerate(self.image_list):
-            # Get image dimensions
-            # temp_img = cv2.imread(img_path_iter) # Reading each image again can be slow
-            # A better way: store dimensions when first loaded, or get from cache if possible
-            # For now, let's try to get it from current_image if it's the one, else read.
-            h_img, w_img = (0,0)
-            if img_idx == self.current_index and self.current_image is not None:
-                 h_img, w_img = self.current_image.shape[:2]
-            else: # Need to read the image for dimensions
-                temp_img_for_dim = cv2.imread(img_path_iter)
-                if temp_img_for_dim is None:
-                    print(f"Warning: Skipping {img_path_iter} for COCO export, cannot read for dimensions.")
-                    continue
-                h_img, w_img = temp_img_for_dim.shape[:2]
-
-            if h_img == 0 or w_img == 0: continue # Skip if dimensions are invalid
-
-            coco_output["images"].append({
-                "id": img_idx, # Use current list index as image ID
-                "file_name": os.path.basename(img_path_iter),
-                "height": h_img,
-                "width": w_img,
-                "license": 1, # Example license id
-                 # "flickr_url": "", "coco_url": "", "date_captured": "" # Optional fields
-            })
-
-            # Get bboxes for this image_path_iter
-            # Priority: 1. self.bboxes if current image, 2. self.label_cache, 3. load from YOLO .txt
-            bboxes_for_this_image = []
-            if img_idx == self.current_index:
-                bboxes_for_this_image = self.bboxes # Use current in-memory bboxes
-            elif img_idx in self.label_cache:
-                bboxes_for_this_image = self.label_cache[img_idx]
-            else: # Try to load from its YOLO .txt file
-                yolo_txt_path = os.path.splitext(img_path_iter)[0] + '.txt'
-                if os.path.exists(yolo_txt_path):
-                    # This is simplified load logic, assumes self.classes is populated
-                    # Ideally, a dedicated YOLO load function for this context.
-                    with open(yolo_txt_path, 'r', encoding='utf-8') as f_yolo:
-                        for line in f_yolo:
-                            parts = line.strip().split()
-                            if len(parts) == 5:
-                                try:
-                                    cls_idx, xc, yc, nw, nh = int(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])
-                                    if 0 <= cls_idx < len(self.classes):
-                                        label = self.classes[cls_idx]
-                                        x_abs = int((xc - nw / 2) * w_img)
-                                        y_abs = int((yc - nh / 2) * h_img)
-                                        w_abs = int(nw * w_img)
-                                        h_abs = int(nh * h_img)
-                                        bboxes_for_this_image.append(BoundingBox(x_abs, y_abs, w_abs, h_abs, label))
-                                except ValueError:
-                                    continue # Skip malformed lines
-            
-            for bbox_item in bboxes_for_this_image:
-                if not (bbox_item.w >= self.min_box_size and bbox_item.h >= self.min_box_size): continue
-                try:
-                    category_id = self.classes.index(bbox_item.label) # Use index in self.classes as category_id
-                except ValueError:
-                    continue # Skip if label not in master list
-
-                coco_output["annotations"].append({
-                    "id": annotation_id_counter,
-                    "image_id": img_idx, # Matches image id above
-                    "category_id": category_id,
-                    "bbox": [float(bbox_item.x), float(bbox_item.y), float(bbox_item.w), float(bbox_item.h)],
-                    "area": float(bbox_item.w * bbox_item.h),
-                    "iscrowd": 0,
-                    "segmentation": [] # Required by COCO, empty for bbox format
-                })
-                annotation_id_counter += 1
-        
+        json_path = os.path.join(self.current_dir, COCO_FILENAME)
+
+        # 界面线程只对当前图片做快照；其余图片沿用写入器中已序列化的片段，只重建 .txt 有变化的图片
+        generation = self.coco_index.generation
+        if 0 <= self.current_index < len(self.image_list) and self.current_image is not None:
+            img_path = self.image_list[self.current_index]
+            store = BoxStore.from_boxes(self.bboxes, self.classes)
+            # 快照交给写入器保管（被后续保存取代也不丢）；写入完成前回到这张图时直接读内存中的条目，
+            # 界面线程不等待整个 JSON 重写
+            self.coco_writer.stage(img_path, store, self.current_image.shape[1], self.current_image.shape[0])
+            generation = self.coco_index.note_pending(json_path, os.path.basename(img_path),
+                                                      self.coco_writer.entry_for(store, self.classes))
+        self.save_queue.submit(json_path, functools.partial(
+            self._coco_save_job, self.coco_writer, json_path, list(self.image_list), list(self.classes), generation))
+        return True
+
+    def _coco_save_job(self, writer, json_path, image_list, classes, generation=None):
+        """Runs on the save thread: refresh changed images and stream the COCO JSON."""
         try:
-            with open(json_path, 'w', encoding='utf-8') as f_json:
-                json.dump(coco_output, f_json, indent=2) # Use indent for readability
-            return True
+            writer.write(json_path, image_list, classes)
         except Exception as e:
-            QMessageBox.critical(self, tr("coco_save_error_title"), tr("coco_save_error_msg").format(str(e))) # Corrected
-            return False
+            raise RuntimeError(tr("coco_save_error_msg").format(str(e))) from e
+        finally:
+            if generation is not None:
+                # 被这次保存取代的排队保存的条目也一并清除
+                writer.index.drop_pending(json_path, generation)
 
 
     def toggleAutosave(self, state):
@@ -1099,79 +1160,27 @@ class LabelingTool(QMainWindow):
         """Load annotations from YOLO, VOC, or COCO format for the current image."""
         # This method is called by loadImage, self.bboxes should be cleared before calling this
         # self.bboxes = [] # Ensure bboxes are for the current file
-        
-        if not os.path.exists(annotation_path) or self.current_image is None:
+        dataset_wide = codec_for_path(annotation_path).dataset_wide
+        if not dataset_wide:
+            self.save_queue.wait_for([annotation_path])  # COCO 的排队保存由 CocoIndex 的待写条目提供
+        image_name = os.path.basename(self.image_list[self.current_index])
+        if self.current_image is None or not (os.path.exists(annotation_path) or
+                                              (dataset_wide and self.coco_index.has_pending(annotation_path, image_name))):
             self.bboxes = [] # Ensure clean state if no file or image
             return
 
         height, width = self.current_image.shape[:2]
-        ext = os.path.splitext(annotation_path)[1].lower()
-        loaded_bboxes = []
 
         try:
-            if ext == '.txt':  # YOLO
-                with open(annotation_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) != 5: continue
-                        try:
-                            class_idx, x_center, y_center, w_norm, h_norm = int(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])
-                            x = int((x_center - w_norm / 2) * width)
-                            y = int((y_center - h_norm / 2) * height)
-                            w_pixels = int(w_norm * width)
-                            h_pixels = int(h_norm * height)
-                            label = self.classes[class_idx] if 0 <= class_idx < len(self.classes) else "unknown"
-                            loaded_bboxes.append(BoundingBox(x, y, w_pixels, h_pixels, label))
-                        except (ValueError, IndexError) as e:
-                            print(f"Error parsing YOLO line: {line} - {str(e)}")
-            
-            elif ext == '.xml':  # VOC
-                import xml.etree.ElementTree as ET
-                tree = ET.parse(annotation_path)
-                root = tree.getroot()
-                for obj in root.findall('object'):
-                    label = obj.find('name').text
-                    bndbox = obj.find('bndbox')
-                    xmin = int(float(bndbox.find('xmin').text))
-                    ymin = int(float(bndbox.find('ymin').text))
-                    xmax = int(float(bndbox.find('xmax').text))
-                    ymax = int(float(bndbox.find('ymax').text))
-                    loaded_bboxes.append(BoundingBox(xmin, ymin, xmax - xmin, ymax - ymin, label))
-            
-            elif ext == '.json':  # COCO (specific to current image)
-                import json
-                with open(annotation_path, 'r', encoding='utf-8') as f:
-                    coco_data = json.load(f)
-                
-                current_image_filename = os.path.basename(self.image_list[self.current_index])
-                current_image_id = -1
-
-                # Find image_id for current_image_filename
-                for img_info in coco_data.get("images", []):
-                    if img_info.get("file_name", "").lower() == current_image_filename.lower():
-                        current_image_id = img_info["id"]
-                        break
-                
-                if current_image_id != -1:
-                    category_map = {cat['id']: cat['name'] for cat in coco_data.get("categories", [])}
-                    for ann in coco_data.get("annotations", []):
-                        if ann.get("image_id") == current_image_id:
-                            coco_bbox = ann['bbox'] # [x, y, width, height]
-                            category_id = ann['category_id']
-                            label = category_map.get(category_id, "unknown")
-                            
-                            # Ensure label is in self.classes, add if not (important for COCO)
-                            if label != "unknown" and label not in self.classes:
-                                self.classes.append(label)
-                                self.class_combo.addItem(label) # Keep UI in sync
-
-                            x, y, w, h = [int(c) for c in coco_bbox]
-                            loaded_bboxes.append(BoundingBox(x, y, w, h, label))
-                else:
-                    print(f"Warning: Image {current_image_filename} not found in COCO json file {annotation_path}")
-
-
-            self.bboxes = loaded_bboxes # Assign loaded bboxes
+            store = read_annotations(annotation_path, width, height, self.classes,
+                                     self.image_list[self.current_index])
+            if dataset_wide:
+                # Ensure label is in self.classes, add if not (important for COCO)
+                for label in store.names[len(self.classes):]:
+                    if label != "unknown" and label not in self.classes:
+                        self.classes.append(label)
+                        self.class_combo.addItem(label) # Keep UI in sync
+            self.bboxes = store.to_boxes() # Assign loaded bboxes
             self.updateColorLegend() # Update legend after loading
 
         except Exception as e:
@@ -1180,6 +1189,16 @@ class LabelingTool(QMainWindow):
             self.updateColorLegend()
 
 
+    def _image_size(self, img_path):
+        """(width, height) from the manifest header probe, falling back to a cached decode."""
+        size = self.manifest.image_size(img_path) if self.manifest is not None else None
+        if size is not None:
+            return size
+        image = self.image_cache.load(img_path)
+        if image is None:
+            return None
+        return image.shape[1], image.shape[0]
+
     def toggleMagnifier(self, state):
         self.magnifier_enabled = state == Qt.Checked
         if self.magnifier:
@@ -1207,18 +1226,11 @@ class LabelingTool(QMainWindow):
     def deleteSelectedBox(self):
         deleted_something = False
         if self.selected_bboxes: # Multi-select delete
-            self.push_undo()
-            for bbox_to_delete in list(self.selected_bboxes): # Iterate over a copy
-                if bbox_to_delete in self.bboxes:
-                    self.bboxes.remove(bbox_to_delete)
-                    deleted_something = True
-            self.selected_bboxes.clear()
+            deleted_something = self._remove_boxes(self.selected_bboxes)
+            self.selected_bboxes = set()
             self.selected_bbox = None # Clear single selection as well
         elif self.selected_bbox: # Single-select delete
-            self.push_undo()
-            if self.selected_bbox in self.bboxes:
-                self.bboxes.remove(self.selected_bbox)
-                deleted_something = True
+            deleted_something = self._remove_boxes([self.selected_bbox])
             self.selected_bbox = None
         
         if deleted_something:
@@ -1230,6 +1242,72 @@ class LabelingTool(QMainWindow):
             # QMessageBox.information(self, tr("no_selection_title", "No Selection"), tr("no_selection_msg_delete", "Please select a bounding box to delete."))
 
 
+    def _selected_boxes_in_order(self):
+        """Selected boxes in z-order (the primary selection when nothing is multi-selected)."""
+        if self.selected_bboxes:
+            return [b for b in self.bboxes if b in self.selected_bboxes]
+        return [self.selected_bbox] if self.selected_bbox in self.bboxes else []
+
+    def _finish_bulk_edit(self, boxes):
+        self._reindex_boxes(boxes)
+        self.updateDisplay()
+        if self.autosave:
+            self.saveAnnotations()
+
+    def selectAllBoxes(self):
+        if self.current_image is None or not self.bboxes:
+            return
+        self.selected_bboxes = set(self.bboxes)
+        self.selected_bbox = self.bboxes[0] if len(self.bboxes) == 1 else None
+        self.statusBar.showMessage(tr("boxes_selected").format(len(self.selected_bboxes)), 3000)
+        self.updateDisplay()
+
+    def moveSelectedBoxes(self, dx, dy):
+        boxes = self._selected_boxes_in_order()
+        if self.current_image is None or not boxes:
+            return
+        before = [box_state(b) for b in boxes]
+        img_h, img_w = self.current_image.shape[:2]
+        write_back(boxes, translate(boxes_to_array(boxes), dx, dy, img_w, img_h))
+        self._record_modified(boxes, before, coalesce='nudge')  # 连续方向键移动合并为一步
+        self._finish_bulk_edit(boxes)
+
+    def scaleSelectedBoxes(self, factor):
+        """Grow or shrink every selected box around its own center."""
+        boxes = self._selected_boxes_in_order()
+        if self.current_image is None or not boxes:
+            return
+        before = [box_state(b) for b in boxes]
+        img_h, img_w = self.current_image.shape[:2]
+        write_back(boxes, scale_about_centers(boxes_to_array(boxes), factor, img_w, img_h, self.min_box_size))
+        self._record_modified(boxes, before, coalesce='scale')
+        self._finish_bulk_edit(boxes)
+
+    def relabelSelectedBoxes(self, label=None):
+        boxes = self._selected_boxes_in_order()
+        if self.current_image is None or not boxes:
+            return
+        if label is None:
+            items = list(self.classes) or [boxes[0].label]
+            current = items.index(boxes[0].label) if boxes[0].label in items else 0
+            label, ok = QInputDialog.getItem(self, tr("relabel_selected"),
+                                             tr("relabel_prompt").format(len(boxes)),
+                                             items, current, True)
+            if not ok or not label:
+                return
+        before = [box_state(b) for b in boxes]
+        if label not in self.classes:
+            self.classes.append(label)
+            self.class_combo.addItem(label)
+            self.syncClassComboToClasses(force_save=True)
+        for bbox_item in boxes:
+            bbox_item.label = label
+        self._record_modified(boxes, before)
+        self.updateColorLegend()
+        self.updateDisplay()
+        if self.autosave:
+            self.saveAnnotations()
+
     def keyPressEvent(self, event):
         # This keyPressEvent is for the main window. Specific widgets might handle their own.
         # Standard keys like Delete for selected items are often handled by QAction or QShortcut.
@@ -1251,103 +1329,80 @@ class LabelingTool(QMainWindow):
     def updateDisplay(self):
         if self.current_image is None:
             self.image_label.clear() # Clear if no image
+            self._display_base_key = None
             return
 
-        # Make a mutable copy for drawing
-        display_image_bgr = self.current_image.copy()
-        # Convert to RGB for QImage display
-        display_image_rgb = cv2.cvtColor(display_image_bgr, cv2.COLOR_BGR2RGB)
-        
-        height, width, _ = display_image_rgb.shape # Get dimensions from RGB image
+        full_height, full_width = self.current_image.shape[:2]
 
         # Scale factor calculation needs to be robust
-        if self.image_label.size().isEmpty() or width == 0 or height == 0 :
+        if self.image_label.size().isEmpty() or full_width == 0 or full_height == 0 :
              self.scale_factor = 1.0 # Default if label size not ready
         else:
             label_size = self.image_label.size()
-            width_ratio = label_size.width() / width
-            height_ratio = label_size.height() / height
+            width_ratio = label_size.width() / full_width
+            height_ratio = label_size.height() / full_height
             self.scale_factor = min(width_ratio, height_ratio)
             if self.scale_factor <=0 : self.scale_factor = 1.0 # Safety for invalid scale
 
-        font_scale = self.label_font_scale # Use class attribute
-        thickness = 1
-
-        # Draw existing bboxes
-        for bbox_item in self.bboxes:
-            color = self.get_label_color(bbox_item.label)
-            # Determine if the box is selected (either single or multi-select)
-            is_selected = (bbox_item == self.selected_bbox) or (bbox_item in self.selected_bboxes)
-
-            if is_selected:
-                # Draw a thicker, dashed rectangle for selected items
-                # For multi-selected, use a common highlight color or slightly different from single-selected
-                highlight_color = (255, 0, 0) if bbox_item in self.selected_bboxes and bbox_item != self.selected_bbox else color # Red for multi, box color for single
-                
-                # Create a filled overlay for selection emphasis (subtle)
-                overlay = display_image_rgb.copy()
-                cv2.rectangle(overlay, (bbox_item.x, bbox_item.y), (bbox_item.x + bbox_item.w, bbox_item.y + bbox_item.h), highlight_color, -1)
-                alpha = 0.15 # Transparency of the fill
-                cv2.addWeighted(overlay, alpha, display_image_rgb, 1 - alpha, 0, display_image_rgb)
-
-                draw_dashed_rect(display_image_rgb, (bbox_item.x, bbox_item.y), 
-                                 (bbox_item.x + bbox_item.w, bbox_item.y + bbox_item.h), 
-                                 highlight_color, thickness +1, 8) # Thicker and dashed
-                
-                # Draw resize handles for the primary selected_bbox
-                if bbox_item == self.selected_bbox:
-                    handle_sz = self.handle_visual_size
-                    # Top-left, top-right, bottom-left, bottom-right
-                    handles_coords = [
-                        (bbox_item.x, bbox_item.y), (bbox_item.x + bbox_item.w, bbox_item.y),
-                        (bbox_item.x, bbox_item.y + bbox_item.h), (bbox_item.x + bbox_item.w, bbox_item.y + bbox_item.h)
-                    ]
-                    for hx, hy in handles_coords:
-                        cv2.rectangle(display_image_rgb, (hx - handle_sz//2, hy - handle_sz//2), 
-                                      (hx + handle_sz//2, hy + handle_sz//2), (0, 255, 255), -1) # Cyan handles
-            else:
-                # Normal box for non-selected items
-                cv2.rectangle(display_image_rgb, (bbox_item.x, bbox_item.y), 
-                              (bbox_item.x + bbox_item.w, bbox_item.y + bbox_item.h), color, thickness)
-
-            # Draw label text (semi-transparent)
-            text = bbox_item.label
-            (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-            
-            # Text background for better readability (optional)
-            # cv2.rectangle(display_image_rgb, (bbox_item.x, bbox_item.y - text_height - baseline -2), 
-            #               (bbox_item.x + text_width + 2, bbox_item.y - baseline), (color[0]//2, color[1]//2, color[2]//2), -1) # Darker bg
-
-            # Put text with slight offset from top-left corner of the box
-            # Create a temporary layer for semi-transparent text to avoid issues with direct drawing
-            text_layer_temp = np.zeros_like(display_image_rgb, dtype=np.uint8)
-            cv2.putText(text_layer_temp, text, (bbox_item.x + 2, bbox_item.y - 5), # Adjusted position
-                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness, cv2.LINE_AA)
-            
-            text_alpha = 0.7 # Transparency of text
-            text_mask = cv2.cvtColor(text_layer_temp, cv2.COLOR_RGB2GRAY) > 0
-            display_image_rgb[text_mask] = (display_image_rgb[text_mask] * (1 - text_alpha) + text_layer_temp[text_mask] * text_alpha).astype(np.uint8)
+        # Pixmap size stays relative to the full-resolution image so getScaledPoint keeps working
+        scaled_width = int(full_width * self.scale_factor)
+        scaled_height = int(full_height * self.scale_factor)
+
+        # The base pixmap is only rebuilt when the image or the zoom changes;
+        # boxes, labels and handles are painted on top by ImageCanvas
+        base_key = (id(self.current_image), scaled_width, scaled_height)
+        current_pixmap = self.image_label.pixmap()
+        if base_key != self._display_base_key or current_pixmap is None or current_pixmap.isNull():
+            self.image_label.setPixmap(self._build_base_pixmap(scaled_width, scaled_height))
+            self._display_base_key = base_key
+        self.image_label.update()
+
+    def _build_base_pixmap(self, scaled_width, scaled_height):
+        # Render from the pyramid level closest to the display size; full resolution only when zoomed in
+        pyramid = self._display_pyramid()
+        level = pyramid.level_for_scale(self.scale_factor)
+        display_image_rgb = cv2.cvtColor(pyramid.get(level), cv2.COLOR_BGR2RGB)
+        height, width, _ = display_image_rgb.shape
 
+        bytes_per_line = display_image_rgb.strides[0]
+        q_image = QImage(display_image_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
+        if scaled_width > 0 and scaled_height > 0 :
+            return QPixmap.fromImage(q_image).scaled(scaled_width, scaled_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return QPixmap.fromImage(q_image) # Fallback if scaling results in zero size
+
+    def _box_index(self):
+        """Spatial index over self.bboxes, rebuilt when the list was replaced or resized."""
+        if self.box_index.is_stale(self.bboxes):
+            self.box_index.rebuild(self.bboxes)
+        return self.box_index
+
+    def _reindex_boxes(self, boxes):
+        """Re-bucket boxes edited in place; large edits just rebuild the index on next use."""
+        if len(boxes) > 32:
+            self.box_index.invalidate()
+        else:
+            for bbox_item in boxes:
+                self.box_index.update(bbox_item)
 
-        # Draw current drawing box (if any)
-        if self.drawing and self.bbox_start and self.bbox_end:
+    def _interaction_rects(self):
+        """Image-space rects touched by the current draw, selection, resize or drag."""
+        if (self.drawing or self.selecting) and self.bbox_start is not None and self.bbox_end is not None:
             x1, y1 = self.bbox_start.x(), self.bbox_start.y()
             x2, y2 = self.bbox_end.x(), self.bbox_end.y()
-            draw_dashed_rect(display_image_rgb, (min(x1,x2), min(y1,y2)), (max(x1,x2), max(y1,y2)), 
-                             (0, 255, 255), 2) # Cyan dashed line for drawing
+            return [(min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))]
+        if self.resize_handle and self.selected_bbox:
+            boxes = [self.selected_bbox]
+        elif self.dragging:
+            boxes = self.drag_boxes
+        else:
+            return []
+        return [(b.x, b.y, b.w, b.h) for b in boxes]
 
-        # Convert to QPixmap for display
-        bytes_per_line = display_image_rgb.strides[0]
-        q_image = QImage(display_image_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        
-        scaled_width = int(width * self.scale_factor)
-        scaled_height = int(height * self.scale_factor)
-        
-        if scaled_width > 0 and scaled_height > 0 :
-            pixmap = QPixmap.fromImage(q_image).scaled(scaled_width, scaled_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.image_label.setPixmap(pixmap)
-        else: # Fallback if scaling results in zero size
-            self.image_label.setPixmap(QPixmap.fromImage(q_image))
+    def _display_pyramid(self):
+        """Pyramid for current_image, rebuilt if the image was replaced."""
+        if self.image_pyramid is None or self.image_pyramid.image is not self.current_image:
+            self.image_pyramid = ImagePyramid(self.current_image)
+        return self.image_pyramid
 
 
     def handleSplitterMoved(self, pos, index):
@@ -1393,28 +1448,33 @@ class LabelingTool(QMainWindow):
             box_interaction_found = False
             ctrl_pressed = bool(event.modifiers() & Qt.ControlModifier) # Simpler boolean
 
+            # Shift+drag starts a rubber-band selection (Ctrl+Shift adds to the current selection)
+            if event.modifiers() & Qt.ShiftModifier:
+                self.selecting = True
+                self.bbox_start = scaled_pos
+                self.bbox_end = scaled_pos
+                if not ctrl_pressed:
+                    self.selected_bbox = None
+                    self.selected_bboxes = set()
+                box_interaction_found = True
+
             # Check for resize handle first (higher priority than dragging whole box)
-            if self.selected_bbox: # Only check handles if a box is already selected
-                handle = self.selected_bbox.get_resize_handle(scaled_pos, self.handle_detection_threshold)
+            if self.selected_bbox and not box_interaction_found: # Only check handles if a box is already selected
+                handle = handle_at(self.selected_bbox, scaled_pos.x(), scaled_pos.y(), self.handle_detection_threshold)
                 if handle:
                     self.resize_handle = handle
                     self.drag_start_pos = scaled_pos # For calculating delta during resize
                     self.original_bbox_state = BoundingBox(self.selected_bbox.x, self.selected_bbox.y, 
                                                          self.selected_bbox.w, self.selected_bbox.h, 
-                                                         self.selected_bbox.label)
+                                                         self.selected_bbox.label, self.selected_bbox.confidence)
                     box_interaction_found = True
             
             if not box_interaction_found: # If not resizing, check for click on a box
-                clicked_on_existing_box = None
-                # Iterate reversed: topmost boxes get priority
-                for bbox_item in reversed(self.bboxes): 
-                    if bbox_item.contains(scaled_pos):
-                        clicked_on_existing_box = bbox_item
-                        break 
+                # Topmost box under the cursor, from the spatial index
+                clicked_on_existing_box = self._box_index().box_at(scaled_pos.x(), scaled_pos.y())
                 
                 if clicked_on_existing_box:
                     box_interaction_found = True
-                    self.push_undo() # Save state before potential modification (drag/selection change)
                     if ctrl_pressed: # Multi-selection toggle
                         if clicked_on_existing_box in self.selected_bboxes:
                             self.selected_bboxes.remove(clicked_on_existing_box)
@@ -1424,6 +1484,8 @@ class LabelingTool(QMainWindow):
                         else:
                             self.selected_bboxes.add(clicked_on_existing_box)
                             self.selected_bbox = clicked_on_existing_box # Make it the primary for potential drag
+                    elif clicked_on_existing_box in self.selected_bboxes: # Keep the multi-selection so it can be dragged together
+                        self.selected_bbox = clicked_on_existing_box
                     else: # Single selection
                         self.selected_bboxes = {clicked_on_existing_box} # Set of one
                         self.selected_bbox = clicked_on_existing_box
@@ -1431,16 +1493,15 @@ class LabelingTool(QMainWindow):
                     # Prepare for dragging the selected_bbox (even if part of multi-select, primary moves)
                     self.dragging = True 
                     self.drag_start_pos = scaled_pos
-                    # Save original state of all selected boxes for consistent multi-drag
-                    self.original_selected_bboxes_states = {
-                        b: BoundingBox(b.x,b.y,b.w,b.h,b.label) for b in self.selected_bboxes
-                    }
+                    # Save original coordinates of all selected boxes for consistent multi-drag
+                    self.drag_boxes = list(self.selected_bboxes)
+                    self.drag_origin = boxes_to_array(self.drag_boxes)
+                    self.drag_states = [box_state(b) for b in self.drag_boxes]  # 松开鼠标时整段拖动记为一步撤销
                     self.original_primary_bbox_drag_ref = BoundingBox( # Ref for primary selected box
                         self.selected_bbox.x, self.selected_bbox.y, self.selected_bbox.w, self.selected_bbox.h, self.selected_bbox.label
                     ) if self.selected_bbox else None
 
             if not box_interaction_found: # Start drawing a new box
-                self.push_undo() # Save state before drawing new box
                 self.drawing = True
                 self.bbox_start = scaled_pos
                 self.bbox_end = scaled_pos # Initialize end to start
@@ -1460,11 +1521,12 @@ class LabelingTool(QMainWindow):
 
         pos_on_label = event.pos()
         scaled_pos = self.getScaledPoint(pos_on_label)
+        dirty_before = self._interaction_rects()
 
         # Update cursor shape based on context (resize, drag, draw)
         current_cursor_shape = Qt.ArrowCursor # Default
         if self.selected_bbox and not self.drawing and not self.dragging and not self.resize_handle:
-            handle_under_mouse = self.selected_bbox.get_resize_handle(scaled_pos, self.handle_detection_threshold)
+            handle_under_mouse = handle_at(self.selected_bbox, scaled_pos.x(), scaled_pos.y(), self.handle_detection_threshold)
             if handle_under_mouse:
                 if handle_under_mouse in ('top-left', 'bottom-right'): current_cursor_shape = Qt.SizeFDiagCursor
                 elif handle_under_mouse in ('top-right', 'bottom-left'): current_cursor_shape = Qt.SizeBDiagCursor
@@ -1475,7 +1537,7 @@ class LabelingTool(QMainWindow):
         self.image_label.setCursor(QCursor(current_cursor_shape))
 
 
-        if self.drawing and self.bbox_start:
+        if (self.drawing or self.selecting) and self.bbox_start is not None:
             self.bbox_end = scaled_pos
             self.has_dragged = True #Counts as drag for min_box_size check
         
@@ -1524,25 +1586,12 @@ class LabelingTool(QMainWindow):
             dy = scaled_pos.y() - self.drag_start_pos.y()
 
             img_h, img_w = self.current_image.shape[:2]
-
-            for bbox_item in self.selected_bboxes:
-                original_state = self.original_selected_bboxes_states.get(bbox_item)
-                if not original_state: continue
-
-                # Calculate new top-left for this box based on common delta
-                new_x = original_state.x + dx
-                new_y = original_state.y + dy
-
-                # Boundary checks for each box being dragged
-                new_x = max(0, min(new_x, img_w - bbox_item.w))
-                new_y = max(0, min(new_y, img_h - bbox_item.h))
-                
-                bbox_item.x = new_x
-                bbox_item.y = new_y
+            # Same delta for every selected box, each clamped to the image bounds
+            write_back(self.drag_boxes, translate(self.drag_origin, dx, dy, img_w, img_h))
             self.has_dragged = True
             
-        if self.has_dragged: # Only update display if something changed
-            self.updateDisplay()
+        if self.has_dragged: # Only repaint the regions that changed
+            self.image_label.update_image_rects(dirty_before + self._interaction_rects())
         
         if self.magnifier_enabled and self.magnifier_active and self.magnifier:
             self.magnifier.update() # Tell magnifier to repaint
@@ -1582,39 +1631,51 @@ class LabelingTool(QMainWindow):
                                                                 items, 0, True) # editable=True
 
                     if ok and label_text:
-                        # self.push_undo() was called at mousePress for drawing
                         if label_text not in self.classes:
                             self.classes.append(label_text)
                             self.class_combo.addItem(label_text)
                             self.syncClassComboToClasses(force_save=True) # Save new class to classes.txt
                         
                         new_bbox = BoundingBox(x1, y1, w, h, label_text)
-                        self.bboxes.append(new_bbox)
+                        self._add_boxes([new_bbox])
                         self.selected_bbox = new_bbox # Select the new box
                         self.selected_bboxes = {new_bbox}
                         self.updateColorLegend()
-                else: # Box too small, pop the undo state pushed at mousePress
-                    idx = self.current_index
-                    if idx >= 0 and idx in self.undo_stack and self.undo_stack[idx]:
-                        self.undo_stack[idx].pop()
 
 
+            was_selecting = self.selecting
+            if self.selecting and self.bbox_start is not None and self.bbox_end is not None:
+                # Select every box fully inside the rubber band
+                inside = self._box_index().boxes_in_rect(self.bbox_start.x(), self.bbox_start.y(),
+                                                         self.bbox_end.x(), self.bbox_end.y())
+                self.selected_bboxes.update(inside)
+                self.selected_bbox = next(iter(self.selected_bboxes)) if len(self.selected_bboxes) == 1 else None
+                self.statusBar.showMessage(tr("boxes_selected").format(len(self.selected_bboxes)), 3000)
+
+            # Moved or resized boxes need to be re-bucketed in the spatial index
+            if self.has_dragged and (self.dragging or self.resize_handle):
+                if self.dragging:
+                    self._record_modified(self.drag_boxes, self.drag_states)
+                elif self.original_bbox_state is not None:
+                    self._record_modified([self.selected_bbox], [box_state(self.original_bbox_state)])
+                self._reindex_boxes(self.drag_boxes if self.dragging else [self.selected_bbox])
+
             # Reset states
             self.drawing = False
             self.dragging = False
+            self.selecting = False
             self.resize_handle = None
             self.bbox_start = None
             self.bbox_end = None
             self.original_bbox_state = None
-            self.original_selected_bboxes_states = {}
+            self.drag_boxes = []
+            self.drag_origin = None
+            self.drag_states = []
             self.original_primary_bbox_drag_ref = None
             self.drag_start_pos = None
 
-            if self.has_dragged: # If a drag/resize/draw happened
-                # The undo state was already pushed at the start of the operation (mousePress)
-                # So, no need to call self.push_undo() here again unless it's a new box creation fully completed.
-                # For new box, it was pushed in mousePress, confirmed here.
-                # For drag/resize, it was pushed in mousePress.
+            if self.has_dragged and not was_selecting: # If a drag/resize/draw happened
+                # The edit was recorded above (drag/resize) or when the new box was added
                 if self.autosave:
                     self.saveAnnotations()
             
@@ -1648,6 +1709,8 @@ class LabelingTool(QMainWindow):
                 else: # No current directory, just loaded in memory
                      QMessageBox.information(self, tr("load_success_title"), tr("load_success_msg").format(os.path.basename(file_path))) # Corrected
                 self.updateColorLegend() # Update legend with new classes
+                if self.image_list:
+                    self._start_stats_scan()  # 类别编号对应的名称变了，重新统计
 
             except Exception as e:
                 QMessageBox.critical(self, tr("load_failed_title"), str(e)) # Corrected
@@ -1676,27 +1739,23 @@ class LabelingTool(QMainWindow):
 
 
     def updateColorLegend(self):
-        self.legend_list.clear()
-        current_image_counts = {}
-        if self.current_image is not None: # Only count for current image
-            for bbox_item in self.bboxes:
-                current_image_counts[bbox_item.label] = current_image_counts.get(bbox_item.label, 0) + 1
-        
-        # Display all known classes, even if count is 0 for current image
-        for label_text in self.classes: 
-            color = self.get_label_color(label_text)
-            count = current_image_counts.get(label_text, 0)
-            
-            item = QListWidgetItem(f"■ {label_text} ({count})")
-            item.setForeground(QColor(*color)) # Use QColor correctly
-            item.setFont(QFont("Arial", 10)) # Removed Bold for cleaner look, can be preference
-            # 存储类别名称到item数据中，方便删除时使用
-            item.setData(Qt.UserRole, label_text)
-            self.legend_list.addItem(item)
-        
-        # 设置右键菜单
-        self.legend_list.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.legend_list.customContextMenuRequested.connect(self.showLegendContextMenu)
+        """Per-class counts as "current image / project"; rows are rebuilt only when the classes change."""
+        current_image_counts = Counter(b.label for b in self.bboxes) if self.current_image is not None else {}
+        if self._legend_classes != self.classes:
+            self.legend_list.clear()
+            # Display all known classes, even if count is 0 for current image
+            for label_text in self.classes:
+                item = QListWidgetItem()
+                item.setForeground(QColor(*self.get_label_color(label_text))) # Use QColor correctly
+                item.setFont(QFont("Arial", 10)) # Removed Bold for cleaner look, can be preference
+                # 存储类别名称到item数据中，方便删除时使用
+                item.setData(Qt.UserRole, label_text)
+                self.legend_list.addItem(item)
+            self._legend_classes = list(self.classes)
+        for row, label_text in enumerate(self.classes):
+            self.legend_list.item(row).setText(
+                f"■ {label_text} ({current_image_counts.get(label_text, 0)} / {self.stats.count(label_text)})")
+        self.updateAnnotationStats()
 
     def showLegendContextMenu(self, position):
         """显示图例右键菜单"""
@@ -1742,13 +1801,7 @@ class LabelingTool(QMainWindow):
                 
                 if bbox_reply == QMessageBox.Yes:
                     # 删除相关标注
-                    self.push_undo()  # 保存撤销状态
-                    self.bboxes = [bbox for bbox in self.bboxes if bbox.label != class_name]
-                    
-                    # 清除选择
-                    if self.selected_bbox and self.selected_bbox.label == class_name:
-                        self.selected_bbox = None
-                    self.selected_bboxes = {bbox for bbox in self.selected_bboxes if bbox.label != class_name}
+                    self._remove_boxes(affected_bboxes)  # 作为一步撤销记录
                 else:
                     # 用户选择不删除标注，取消删除类别
                     return
@@ -1800,58 +1853,71 @@ class LabelingTool(QMainWindow):
                 print(f"[Error] 保存类别文件失败: {e}")
                 QMessageBox.warning(self, tr("save_error"), f"保存类别文件失败: {str(e)}")
 
-    def push_undo(self):
-        idx = self.current_index
-        if idx < 0: return
-
-        if idx not in self.undo_stack:
-            self.undo_stack[idx] = []
-        
-        import copy # Keep local as it's specific here
-        # Create a deep copy of the list of BoundingBox objects
-        current_bboxes_copy = [copy.deepcopy(b) for b in self.bboxes]
-        self.undo_stack[idx].append(current_bboxes_copy)
-        
-        if len(self.undo_stack[idx]) > 30: # Limit undo stack size
-            self.undo_stack[idx] = self.undo_stack[idx][-30:]
-        
-        self.redo_stack[idx] = [] # Clear redo stack for this image on new action
+    def _history_key(self):
+        """History and journal key of the current image (its path), or None."""
+        if 0 <= self.current_index < len(self.image_list):
+            return self.image_list[self.current_index]
+        return None
+
+    def _record_edit(self, edit):
+        key = self._history_key()
+        if key is not None:
+            self.history.record(key, edit)
+
+    def _box_positions(self, boxes):
+        """id(box) -> position in self.bboxes for the given boxes."""
+        wanted = {id(b) for b in boxes}
+        return {id(b): i for i, b in enumerate(self.bboxes) if id(b) in wanted}
+
+    def _record_modified(self, boxes, before_states, coalesce=None):
+        """Record in-place changes of ``boxes`` relative to ``before_states``."""
+        positions = self._box_positions(boxes)
+        entries = []
+        for bbox_item, before in zip(boxes, before_states):
+            after = box_state(bbox_item)
+            if after != before and id(bbox_item) in positions:
+                entries.append((positions[id(bbox_item)], before, after))
+        if entries:
+            self._record_edit(Edit(len(self.bboxes), modified=entries, coalesce=coalesce))
+
+    def _add_boxes(self, new_boxes, removed=()):
+        """Append ``new_boxes`` as one undoable step (optionally after ``removed`` entries were dropped)."""
+        start = len(self.bboxes)
+        self.bboxes.extend(new_boxes)
+        added = [(start + i, box_state(b)) for i, b in enumerate(new_boxes)]
+        self._record_edit(Edit(start + len(removed), removed=removed, added=added))
+        self.box_index.invalidate()
+
+    def _remove_boxes(self, doomed):
+        """Drop ``doomed`` from self.bboxes as one undoable step; False if none were present."""
+        doomed = set(doomed)
+        count = len(self.bboxes)
+        removed = [(i, box_state(b)) for i, b in enumerate(self.bboxes) if b in doomed]
+        if not removed:
+            return False
+        self.bboxes = [b for b in self.bboxes if b not in doomed] # One pass, not one remove() per box
+        self._record_edit(Edit(count, removed=removed))
+        self.selected_bboxes = self.selected_bboxes - doomed
+        if self.selected_bbox in doomed:
+            self.selected_bbox = None
+        return True
 
     def undo(self):
-        idx = self.current_index
-        if idx < 0 or idx not in self.undo_stack or not self.undo_stack[idx]:
+        key = self._history_key()
+        if key is None or not self.history.undo(key, self.bboxes):
             return
-        
-        import copy
-        if idx not in self.redo_stack: self.redo_stack[idx] = []
-        
-        current_bboxes_for_redo = [copy.deepcopy(b) for b in self.bboxes]
-        self.redo_stack[idx].append(current_bboxes_for_redo)
-        
-        self.bboxes = [copy.deepcopy(b) for b in self.undo_stack[idx].pop()] # Restore with deep copies
-        
-        self.selected_bboxes = set() # Clear selections after undo
-        self.selected_bbox = None
-        self.updateDisplay()
-        self.updateColorLegend()
-        if self.autosave: self.saveAnnotations()
-
+        self._after_history_step()
 
     def redo(self):
-        idx = self.current_index
-        if idx < 0 or idx not in self.redo_stack or not self.redo_stack[idx]:
+        key = self._history_key()
+        if key is None or not self.history.redo(key, self.bboxes):
             return
+        self._after_history_step()
 
-        import copy
-        if idx not in self.undo_stack: self.undo_stack[idx] = []
-
-        current_bboxes_for_undo = [copy.deepcopy(b) for b in self.bboxes]
-        self.undo_stack[idx].append(current_bboxes_for_undo)
-
-        self.bboxes = [copy.deepcopy(b) for b in self.redo_stack[idx].pop()]
-
-        self.selected_bboxes = set()
+    def _after_history_step(self):
+        self.selected_bboxes = set() # Clear selections after undo/redo
         self.selected_bbox = None
+        self.box_index.invalidate() # The list was edited in place
         self.updateDisplay()
         self.updateColorLegend()
         if self.autosave: self.saveAnnotations()
@@ -1874,6 +1940,58 @@ class LabelingTool(QMainWindow):
         dialog = AutoLabelDialog(self)
         dialog.exec_()
 
+    def _stored_boxes(self, idx):
+        """Boxes of image ``idx`` as they are now: in memory for the current image, else cache or YOLO file."""
+        if idx == self.current_index:
+            return BoxStore.from_boxes(self.bboxes, self.classes)
+        if idx in self.label_cache:
+            return self.label_cache[idx]
+        txt_path = os.path.splitext(self.image_list[idx])[0] + '.txt'
+        self.save_queue.wait_for([txt_path])
+        size = self._image_size(self.image_list[idx]) if os.path.exists(txt_path) else None
+        if size is None:
+            return BoxStore(self.classes)
+        return read_annotations(txt_path, size[0], size[1], self.classes)
+
+    def revertAutoLabelBatch(self):
+        """Undo every image written by one batch auto-label run, picked from the project journal."""
+        journal = self.history.journal
+        batches = journal.batches() if journal is not None else []
+        if not batches:
+            QMessageBox.information(self, tr("revert_auto_label_batch"), tr("no_auto_label_batches"))
+            return
+        items = [f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(b['t']))}  {b.get('note', '')}  ({b['images']})"
+                 for b in batches]
+        item, ok = QInputDialog.getItem(self, tr("revert_auto_label_batch"), tr("revert_batch_prompt"), items, 0, False)
+        if not ok:
+            return
+        batch = batches[items.index(item)]
+
+        index_by_name = {os.path.basename(p): i for i, p in enumerate(self.image_list)}
+        reverted = skipped = 0
+        for name, edit in journal.batch_edits(batch['b']):
+            idx = index_by_name.get(name)
+            size = self._image_size(self.image_list[idx]) if idx is not None else None
+            if size is None:
+                skipped += 1
+                continue
+            # 以反向编辑的形式写回，撤销本身也可以再撤销；之后又被修改过的图片会被跳过
+            revert_edit = edit.inverted()
+            boxes = self.bboxes if idx == self.current_index else self._stored_boxes(idx).to_boxes()
+            if not revert_edit.apply(boxes) or not self._write_yolo_boxes(idx, boxes, size[0], size[1]):
+                skipped += 1
+                continue
+            self.history.record(self.image_list[idx], revert_edit)
+            reverted += 1
+        print(f"[Debug] 撤销自动标注批次 {batch['b']}: 恢复 {reverted} 张, 跳过 {skipped} 张")
+
+        self.selected_bbox = None
+        self.selected_bboxes = set()
+        self.box_index.invalidate()
+        self.updateDisplay()
+        self.updateColorLegend()
+        QMessageBox.information(self, tr("revert_auto_label_batch"), tr("revert_batch_done").format(reverted, skipped))
+
     def show_auto_label_current_dialog(self):
         """显示当前图像自动标注对话框"""
         if not hasattr(self, 'current_dir') or not self.current_dir:
@@ -1923,102 +2041,113 @@ class LabelingTool(QMainWindow):
             
             print(f"[Debug] 构建的视觉提示: {visuals}")
             
+            if self.auto_label_worker is not None:
+                QMessageBox.warning(self, tr("warning"), tr("auto_label_running"))
+                return
+            
             # 创建并显示进度对话框
             progress_dialog = AutoLabelProgressDialog(self)
             progress_dialog.setup_batch_progress(1)  # 只有一张图片
             progress_dialog.show()
             
-            # 更新进度：当前处理的图片
-            progress_dialog.update_image_progress(0, os.path.basename(current_image_path))
-            
-            try:
-                # 定义进度回调函数
-                def progress_callback(step, total_steps, message):
-                    progress_dialog.update_step_progress(step, total_steps, message)
-                    # 处理Qt事件，保持界面响应
-                    from PyQt5.QtWidgets import QApplication
-                    QApplication.processEvents()
-                
-                # 调用自动标注，使用当前图像作为源图像和目标图像
-                predictions = self.yoloe_wrapper.auto_label_with_vp(
-                    current_image_path,  # 源图像（提示图像）
-                    visuals,             # 视觉提示
-                    current_image_path,  # 目标图像（同一张图像）
-                    progress_callback=progress_callback
-                )
-                
-                print(f"[Debug] 获得 {len(predictions)} 个预测结果")
-                
-                # 保存当前状态用于撤销
-                self.push_undo()
-                
-                # 清除现有标注（可选，或者可以添加到现有标注中）
-                reply = QMessageBox.question(
-                    self,
-                    tr("replace_annotations_title"),
-                    tr("replace_annotations_msg"),
-                    QMessageBox.Yes | QMessageBox.No
-                )
-                
-                if reply == QMessageBox.Yes:
-                    self.bboxes.clear()  # 清除现有标注
-                
-                # 添加新的预测结果
-                added_count = 0
-                for pred in predictions:
-                    x, y, w, h = pred['bbox']  # bbox 格式是 [x, y, width, height]
-                    label_idx = pred['class_id']
-                    confidence = pred.get('confidence', 0.0)
-                    
-                    # 获取标签名称
-                    if label_idx < len(self.classes):
-                        label = self.classes[label_idx]
-                    else:
-                        label = f"class_{label_idx}"
-                        # 如果类别不存在，添加到类别列表
-                        if label not in self.classes:
-                            self.classes.append(label)
-                            self.class_combo.addItem(label)
-                    
-                    # 创建新的边界框
-                    success = self.add_new_bounding_box(label, x, y, x + w, y + h, confidence)
-                    if success:
-                        added_count += 1
-                
-                # 显示完成状态
-                progress_dialog.set_completed(1, 1)
-                print(f"[Debug] 当前图像自动标注完成，添加了 {added_count} 个标注")
-                
-                # 更新显示
-                self.updateDisplay()
-                self.updateColorLegend()
+            # 使用当前图像作为源图像和目标图像，在后台线程中推理
+            worker = self._start_auto_label_worker(current_image_path, visuals, [current_image_path], progress_dialog)
+            self._auto_label_job = {'dialog': progress_dialog}
+            worker.result_ready.connect(self._on_current_auto_label_result)
+            worker.finished.connect(self._on_current_auto_label_finished)
+            worker.start()
                 
-                # 自动保存
-                if self.autosave:
-                    self.saveAnnotations()
+        except Exception as e:
+            error_msg = f"处理当前图像自动标注时出错: {str(e)}"
+            print(f"[Error] {error_msg}")
+            QMessageBox.critical(self, tr("error"), error_msg)
+
+    def _on_current_auto_label_result(self, img_path, predictions, error):
+        if self.sender() is not self.auto_label_worker:
+            return
+        progress_dialog = self._auto_label_job['dialog']
+        try:
+            if predictions is None:
+                raise RuntimeError(error)
+            if self.current_index < 0 or self.image_list[self.current_index] != img_path:
+                raise RuntimeError(f"Image changed while auto labeling: {img_path}")
+            
+            print(f"[Debug] 获得 {len(predictions)} 个预测结果")
+            
+            # 清除现有标注（可选，或者可以添加到现有标注中）
+            reply = QMessageBox.question(
+                self,
+                tr("replace_annotations_title"),
+                tr("replace_annotations_msg"),
+                QMessageBox.Yes | QMessageBox.No
+            )
+            
+            removed = []
+            if reply == QMessageBox.Yes:
+                removed = [(i, box_state(b)) for i, b in enumerate(self.bboxes)]
+                self.bboxes = []  # 清除现有标注
+                self.selected_bbox = None
+                self.selected_bboxes = set()
+            new_boxes = []
+            
+            # 添加新的预测结果
+            added_count = 0
+            for pred in predictions:
+                x, y, w, h = pred['bbox']  # bbox 格式是 [x, y, width, height]
+                label_idx = pred['class_id']
+                confidence = pred.get('confidence', 0.0)
                 
-                # 显示结果消息
-                QMessageBox.information(
-                    self,
-                    tr("auto_label_current_title"),
-                    tr("auto_label_current_success").format(added_count)
-                )
+                # 获取标签名称
+                if label_idx < len(self.classes):
+                    label = self.classes[label_idx]
+                else:
+                    label = f"class_{label_idx}"
+                    # 如果类别不存在，添加到类别列表
+                    if label not in self.classes:
+                        self.classes.append(label)
+                        self.class_combo.addItem(label)
                 
-            except Exception as e:
-                error_msg = f"当前图像自动标注失败: {str(e)}"
-                print(f"[Error] {error_msg}")
-                progress_dialog.set_error(str(e))
-                QMessageBox.critical(self, tr("error"), error_msg)
+                # 创建新的边界框
+                new_bbox = self._clipped_box(label, x, y, x + w, y + h, confidence)
+                if new_bbox is not None:
+                    new_boxes.append(new_bbox)
+                    added_count += 1
+            
+            # 替换与新增作为一步撤销记录
+            self._add_boxes(new_boxes, removed)
+            
+            # 显示完成状态
+            progress_dialog.set_completed(1, 1)
+            print(f"[Debug] 当前图像自动标注完成，添加了 {added_count} 个标注")
+            
+            # 更新显示
+            self.updateDisplay()
+            self.updateColorLegend()
+            
+            # 自动保存
+            if self.autosave:
+                self.saveAnnotations()
+            
+            # 显示结果消息
+            QMessageBox.information(
+                self,
+                tr("auto_label_current_title"),
+                tr("auto_label_current_success").format(added_count)
+            )
             
-            finally:
-                # 延迟关闭进度对话框
-                QTimer.singleShot(3000, progress_dialog.close)  # 3秒后自动关闭
-                
         except Exception as e:
-            error_msg = f"处理当前图像自动标注时出错: {str(e)}"
+            error_msg = f"当前图像自动标注失败: {str(e)}"
             print(f"[Error] {error_msg}")
+            progress_dialog.set_error(str(e))
             QMessageBox.critical(self, tr("error"), error_msg)
 
+    def _on_current_auto_label_finished(self, cancelled):
+        if self.sender() is not self.auto_label_worker:
+            return
+        self.auto_label_worker = None
+        # 延迟关闭进度对话框
+        QTimer.singleShot(3000, self._auto_label_job['dialog'].close)  # 3秒后自动关闭
+
     def _build_current_image_visuals(self):
         """构建当前图像的视觉提示数据"""
         bboxes_list = []
@@ -2080,9 +2209,28 @@ class LabelingTool(QMainWindow):
             score: Confidence score (optional)
             difficult: Whether it's a difficult sample (optional)
         """
+        new_bbox = self._clipped_box(label, xmin, ymin, xmax, ymax, score)
+        if new_bbox is None:
+            return False
+
+        # 添加到边界框列表（作为一步撤销记录）
+        self._add_boxes([new_bbox])
+        
+        # 更新显示
+        self.updateColorLegend()
+        self.updateDisplay()
+        
+        # 如果启用了自动保存，保存标注
+        if self.autosave:
+            self.saveAnnotations()
+            
+        return True
+
+    def _clipped_box(self, label, xmin, ymin, xmax, ymax, score=None):
+        """BoundingBox clamped to the current image, or None if it is too small; registers new labels."""
         if self.current_image is None:
             print("错误: 当前没有加载图像")
-            return False
+            return None
             
         try:
             # 确保坐标在图像范围内
@@ -2099,7 +2247,7 @@ class LabelingTool(QMainWindow):
             # 检查最小尺寸
             if w < self.min_box_size or h < self.min_box_size:
                 print(f"警告: 边界框尺寸过小 ({w}x{h})，最小要求为 {self.min_box_size}x{self.min_box_size}")
-                return False
+                return None
             
             # 确保标签在类别列表中
             if label not in self.classes:
@@ -2115,27 +2263,11 @@ class LabelingTool(QMainWindow):
                         print(f"警告: 无法保存类别列表: {e}")
             
             # 创建新的边界框
-            new_bbox = BoundingBox(xmin, ymin, w, h, label)
-            
-            # 保存当前状态用于撤销
-            self.push_undo()
-            
-            # 添加到边界框列表
-            self.bboxes.append(new_bbox)
-            
-            # 更新显示
-            self.updateColorLegend()
-            self.updateDisplay()
-            
-            # 如果启用了自动保存，保存标注
-            if self.autosave:
-                self.saveAnnotations()
-                
-            return True
+            return BoundingBox(xmin, ymin, w, h, label, score)
             
         except Exception as e:
             print(f"添加边界框时出错: {e}")
-            return False
+            return None
 
     def handle_batch_auto_label_with_vp(self, prompt_image_paths, visuals, target_image_paths, target_indices):
         print(f"[Debug] {tr('batch_auto_label_start')}")
@@ -2147,89 +2279,117 @@ class LabelingTool(QMainWindow):
             print(f"[Error] {tr('yoloe_wrapper_not_initialized')}")
             QMessageBox.warning(self, tr("error"), tr("yoloe_wrapper_not_initialized"))
             return
+        if self.auto_label_worker is not None:
+            QMessageBox.warning(self, tr("warning"), tr("auto_label_running"))
+            return
         
         # 创建并显示进度对话框
         progress_dialog = AutoLabelProgressDialog(self)
         progress_dialog.setup_batch_progress(len(target_image_paths))
+        progress_dialog.enable_pause()
         progress_dialog.show()
         
-        # 处理结果统计
-        success_count = 0
-        error_count = 0
+        # 整批写入记录在撤销日志中，之后可以一次撤销
+        journal = self.history.journal
+        batch_id = journal.start_batch(", ".join(os.path.basename(p) for p in prompt_image_paths)[:80]) if journal is not None else None
         
+        # 推理在后台线程中进行，结果逐张回到界面线程写入
+        worker = self._start_auto_label_worker(prompt_image_paths, visuals, target_image_paths, progress_dialog)
+        self._auto_label_job = {'dialog': progress_dialog, 'batch_id': batch_id, 'success': 0, 'error': 0,
+                                'total': len(target_image_paths),
+                                'index_of': dict(zip(target_image_paths, target_indices))}
+        worker.result_ready.connect(self._on_batch_auto_label_result)
+        worker.finished.connect(self._on_batch_auto_label_finished)
+        worker.start()
+
+    def _start_auto_label_worker(self, prompt_image_paths, visuals, target_image_paths, progress_dialog):
+        """Create the AutoLabelWorker wired to ``progress_dialog``; the caller connects the results and starts it."""
+        worker = AutoLabelWorker(self.yoloe_wrapper, prompt_image_paths, visuals, target_image_paths,
+                                 max(1, self.auto_label_batch_size))
+        worker.progress.connect(lambda done, total, message: progress_dialog.update_done_progress(done, message))
+        worker.error.connect(self._on_auto_label_error)
+        progress_dialog.canceled.connect(worker.cancel)
+        progress_dialog.paused_changed.connect(worker.set_paused)
+        self.auto_label_worker = worker
+        return worker
+
+    def _stop_auto_label_worker(self):
+        if self.auto_label_worker is None:
+            return
+        worker, self.auto_label_worker = self.auto_label_worker, None
+        worker.cancel()
+        worker.wait()  # 正在进行的一批推理结束后退出
+
+    def _on_batch_auto_label_result(self, img_path, predictions, error):
+        if self.sender() is not self.auto_label_worker:
+            return
+        job = self._auto_label_job
+        idx = job['index_of'][img_path]
         try:
-            for i, (idx, img_path) in enumerate(zip(target_indices, target_image_paths)):
-                # 检查用户是否取消
-                if progress_dialog.wasCanceled():
-                    print("[Debug] 用户取消了自动标注")
-                    break
-                
-                # 更新进度：当前处理的图片
-                image_name = os.path.basename(img_path)
-                progress_dialog.update_image_progress(i, image_name)
-                
-                print(f"\n[Debug] 正在处理图片 {i+1}/{len(target_image_paths)}: {img_path}")
-                
-                try:
-                    # 定义进度回调函数
-                    def progress_callback(step, total_steps, message):
-                        progress_dialog.update_step_progress(step, total_steps, message)
-                        # 处理Qt事件，保持界面响应
-                        from PyQt5.QtWidgets import QApplication
-                        QApplication.processEvents()
-                    
-                    # 调用自动标注，传入进度回调
-                    bboxes = self.yoloe_wrapper.auto_label_with_vp(
-                        prompt_image_paths, 
-                        visuals, 
-                        img_path,
-                        progress_callback=progress_callback
-                    )
-                    
-                    # 处理预测结果
-                    bbox_objs = []
-                    for pred in bboxes:
-                        x, y, w, h = pred['bbox']  # bbox 格式是 [x, y, width, height]
-                        label_idx = pred['class_id']
-                        label = self.classes[label_idx] if label_idx < len(self.classes) else str(label_idx)
-                        bbox_objs.append(BoundingBox(x, y, w, h, label))
-           
-                    print(f"[Debug] 更新缓存和当前索引: idx={idx}")
-                    self.label_cache[idx] = bbox_objs
-                    self.current_index = idx
-                    self.bboxes = bbox_objs
-                    
-                    print(f"[Debug] 开始保存标注...")
-                    save_result = self.saveYOLOAnnotation()
-                    print(f"[Debug] 保存结果: {'成功' if save_result else '失败'}")
-                    
-                    if save_result:
-                        success_count += 1
-                    else:
-                        error_count += 1
-                    
-                except Exception as e:
-                    print(f"[Debug] 处理图片时出错: {str(e)}")
-                    error_count += 1
-                    continue
-            
-            # 显示完成状态
-            if not progress_dialog.wasCanceled():
-                progress_dialog.set_completed(success_count, len(target_image_paths))
-                print(f"[Debug] 批量自动标注完成: 成功 {success_count}, 失败 {error_count}")
-            
+            if predictions is None:
+                raise RuntimeError(error)
+            save_result = self._apply_auto_label_predictions(idx, img_path, predictions, job['batch_id'])
         except Exception as e:
-            error_msg = f"批量自动标注失败: {str(e)}"
-            print(error_msg)
-            progress_dialog.set_error(str(e))
-            
-        finally:
-            # 更新显示
+            print(f"[Debug] 处理图片时出错: {str(e)}")
+            save_result = False
+        job['success' if save_result else 'error'] += 1
+        if save_result and idx == self.current_index:
+            # 正在显示的图片立即刷新
+            self.box_index.invalidate()
             self.updateDisplay()
-            self.updateColorLegend()
-            
-            # 延迟关闭进度对话框，让用户看到结果
-            QTimer.singleShot(3000, progress_dialog.close)  # 3秒后自动关闭
+
+    def _on_batch_auto_label_finished(self, cancelled):
+        if self.sender() is not self.auto_label_worker:
+            return
+        self.auto_label_worker = None
+        job = self._auto_label_job
+        if cancelled:
+            print("[Debug] 用户取消了自动标注")
+        else:
+            job['dialog'].set_completed(job['success'], job['total'])
+        print(f"[Debug] 批量自动标注完成: 成功 {job['success']}, 失败 {job['error']}")
+        self.updateDisplay()
+        self.updateColorLegend()
+        # 延迟关闭进度对话框，让用户看到结果
+        QTimer.singleShot(3000, job['dialog'].close)  # 3秒后自动关闭
+
+    def _on_auto_label_error(self, msg):
+        if self.sender() is not self.auto_label_worker:
+            return
+        self.auto_label_worker = None
+        print(f"自动标注失败: {msg}")
+        self._auto_label_job['dialog'].set_error(msg)
+        self.updateDisplay()
+        self.updateColorLegend()
+        QTimer.singleShot(3000, self._auto_label_job['dialog'].close)
+
+    def _apply_auto_label_predictions(self, idx, img_path, predictions, batch_id=None):
+        """Write auto-label predictions (dicts with bbox/class_id/confidence) as the annotations of image ``idx``."""
+        xywh = np.array([pred['bbox'] for pred in predictions], dtype=np.float64).reshape(-1, 4)  # bbox 格式是 [x, y, width, height]
+        store = BoxStore.from_xyxy(np.column_stack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]]),
+                                   [pred['class_id'] for pred in predictions],
+                                   [pred['confidence'] for pred in predictions], self.classes)
+
+        # 按目标图片自己的尺寸保存，不切换当前显示的图片
+        size = self._image_size(img_path)
+        if size is None:
+            raise ValueError(f"Cannot read image size: {img_path}")
+        old = self._stored_boxes(idx)
+        known = np.isin(np.array(store.labels, dtype=object), self.classes) if len(store) else np.zeros(0, bool)
+        written = store.subset(store.valid_mask(size[0], size[1], self.min_box_size) & known)
+
+        print(f"[Debug] 开始保存标注: idx={idx}")
+        save_result = self._write_yolo_boxes(idx, written, size[0], size[1])
+        print(f"[Debug] 保存结果: {'成功' if save_result else '失败'}")
+        if save_result:
+            self.history.record(img_path, Edit(len(old), removed=list(enumerate(map(box_state, old))),
+                                               added=list(enumerate(map(box_state, written)))),
+                                batch=batch_id)
+            if idx == self.current_index:
+                self.bboxes = written.to_boxes()
+                self.selected_bbox = None
+                self.selected_bboxes = set()
+        return save_result
 
     def on_zoom_slider_changed(self, value):
         # 将滑动条的值2-8转换为实际的放大倍率2.0x-4.0x
@@ -2239,6 +2399,19 @@ class LabelingTool(QMainWindow):
         if self.magnifier:
             self.magnifier.set_zoom_factor(zoom_factor)
 
+    def _close_journal(self):
+        if self.history.journal is not None:
+            self.history.journal.close()
+
+    def closeEvent(self, event):
+        self._stop_directory_scan()
+        self._stop_stats_scan()
+        self._stop_auto_label_worker()
+        self.prefetcher.shutdown()
+        self.save_queue.shutdown()  # 退出前写完所有待保存的标注
+        self._close_journal()
+        super().closeEvent(event)
+
     def resizeEvent(self, event):
         super().resizeEvent(event)
         # 保持右下角
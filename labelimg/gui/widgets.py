@@ -1,18 +1,24 @@
 from PyQt5.QtWidgets import QWidget, QDialog, QVBoxLayout, QGroupBox, QHBoxLayout, QLabel, QSpinBox, QCheckBox, QLineEdit, QPushButton, QDoubleSpinBox, QProgressDialog, QMessageBox, QListWidget, QListWidgetItem, QSlider, QGridLayout
-from PyQt5.QtCore import Qt, QTimer, QPoint, QThread, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap, QCursor, QPainter, QPen, QColor
+from PyQt5.QtCore import Qt, QTimer, QPoint, QRect, QThread, pyqtSignal, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QImage, QPixmap, QCursor, QPainter, QPen, QColor, QFont, QFontMetrics
 import cv2
+import functools
 import numpy as np
 import os
+import threading
 import random # For DataAugmentationDialog
 from PyQt5.QtWidgets import QFileDialog
 
-from labelimg.core.bounding_box import BoundingBox # For DataAugmentationDialog
+from ..core.box_store import BoxStore
+from ..io.bulk import load_annotation_table
+from ..io.formats import get_codec
+from ..io.yolo import read_yolo_rows
+from ..inference.pipeline import AutoLabelPipeline
 from ..core.localization import tr
 import shutil
 
 # 导出的类列表
-__all__ = ['MagnifierWindow', 'DataAugmentationDialog', 'AutoLabelDialog', 'AutoLabelProgressDialog']
+__all__ = ['MagnifierWindow', 'ImageCanvas', 'FileListModel', 'DirectoryScanWorker', 'AnnotationTableWorker', 'AutoLabelWorker', 'DataAugmentationDialog', 'AutoLabelDialog', 'AutoLabelProgressDialog']
 
 class MagnifierWindow(QWidget):
     # 添加信号
@@ -128,6 +134,358 @@ class MagnifierWindow(QWidget):
                                     QColor(0, 255, 255)
                                 )
 
+class ImageCanvas(QLabel):
+    """Image view that paints boxes, labels, handles and the rubber band as vector overlays.
+
+    The base image is only converted to a pixmap when the image or the zoom
+    changes (see LabelingTool.updateDisplay). Interactive edits call
+    update_image_rects() so Qt repaints just the affected regions.
+    """
+    MAX_LABEL_SPRITES = 512
+
+    def __init__(self, owner, parent=None):
+        super().__init__(parent)
+        self.owner = owner  # LabelingTool: bboxes, selection and scale_factor live there
+        self._label_sprites = {}  # (label, rgb, font px) -> pre-rendered semi-transparent QPixmap
+
+    def label_font(self):
+        font = QFont()
+        # cv2 的 HERSHEY_SIMPLEX 在 scale=1 时约 30px 高
+        font.setPixelSize(max(8, int(round(30 * self.owner.label_font_scale))))
+        return font
+
+    def label_sprite(self, label, rgb, font):
+        """Label text pre-rendered once at 70% opacity, reused for every box with that label."""
+        key = (label, rgb, font.pixelSize())
+        sprite = self._label_sprites.get(key)
+        if sprite is None:
+            if len(self._label_sprites) >= self.MAX_LABEL_SPRITES:
+                self._label_sprites.clear()
+            metrics = QFontMetrics(font)
+            sprite = QPixmap(max(1, metrics.horizontalAdvance(label) + 2), metrics.height())
+            sprite.fill(Qt.transparent)
+            text_color = QColor(*rgb)
+            text_color.setAlphaF(0.7)
+            painter = QPainter(sprite)
+            painter.setFont(font)
+            painter.setPen(text_color)
+            painter.drawText(0, metrics.ascent(), label)
+            painter.end()
+            self._label_sprites[key] = sprite
+        return sprite
+
+    def image_offset(self):
+        """Top-left of the centered pixmap in widget coordinates."""
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return 0, 0
+        return (max(0, (self.width() - pixmap.width()) // 2),
+                max(0, (self.height() - pixmap.height()) // 2))
+
+    def widget_rect(self, x, y, w, h):
+        """Map an image-space rectangle to widget coordinates."""
+        ox, oy = self.image_offset()
+        return self._map_rect(x, y, w, h, ox, oy, self.owner.scale_factor)
+
+    @staticmethod
+    def _map_rect(x, y, w, h, ox, oy, scale):
+        left, top = ox + int(x * scale + 0.5), oy + int(y * scale + 0.5)
+        right, bottom = ox + int((x + w) * scale + 0.5), oy + int((y + h) * scale + 0.5)
+        return QRect(left, top, max(0, right - left), max(0, bottom - top))
+
+    def overlay_margin(self):
+        """Extra pixels around a box touched by its outline, handles and label."""
+        text_height = QFontMetrics(self.label_font()).height()
+        pad = self.owner.handle_visual_size + 2
+        return pad, pad + text_height + 5
+
+    def update_image_rects(self, rects):
+        """Schedule a repaint of the given image-space (x, y, w, h) rectangles only."""
+        pad, top_pad = self.overlay_margin()
+        for x, y, w, h in rects:
+            self.update(self.widget_rect(x, y, w, h).adjusted(-pad, -top_pad, pad, pad))
+
+    def paintEvent(self, event):
+        super().paintEvent(event)  # base pixmap
+        owner = self.owner
+        if owner.current_image is None or self.pixmap() is None or self.pixmap().isNull():
+            return
+
+        dirty = event.rect()
+        ox, oy = self.image_offset()
+        scale = owner.scale_factor
+        font = self.label_font()
+        metrics = QFontMetrics(font)
+        text_dy = 5 + metrics.descent()
+        pad, top_pad = self.overlay_margin()
+        handle_sz = owner.handle_visual_size
+
+        # 按标签分组，同色的框一次 drawRects 画完
+        plain = {}
+        labels = {}
+        selected = []
+        for bbox_item in owner.bboxes:
+            rect = self._map_rect(bbox_item.x, bbox_item.y, bbox_item.w, bbox_item.h, ox, oy, scale)
+            if not rect.adjusted(-pad, -top_pad, pad, pad).intersects(dirty):
+                continue  # 只重绘脏区域内的框
+            label = bbox_item.label
+            if bbox_item == owner.selected_bbox or bbox_item in owner.selected_bboxes:
+                selected.append((bbox_item, rect))
+            else:
+                plain.setdefault(label, []).append(rect)
+            labels.setdefault(label, []).append(rect)
+
+        painter = QPainter(self)
+        pixmap = self.pixmap()
+        painter.setClipRect(dirty.intersected(QRect(ox, oy, pixmap.width(), pixmap.height())))
+        painter.setBrush(Qt.NoBrush)
+        colors = {label: QColor(*owner.get_label_color(label)) for label in labels}
+
+        for label, rects in plain.items():
+            painter.setPen(QPen(colors[label], 1))
+            painter.drawRects(rects)
+
+        for bbox_item, rect in selected:
+            # Red for multi-selected boxes, box color for the primary selection
+            highlight = colors[bbox_item.label] if bbox_item == owner.selected_bbox else QColor(255, 0, 0)
+            fill = QColor(highlight)
+            fill.setAlphaF(0.15)
+            painter.fillRect(rect, fill)
+            painter.setPen(QPen(highlight, 2, Qt.DashLine))
+            painter.drawRect(rect)
+            if bbox_item == owner.selected_bbox:
+                right, bottom = rect.left() + rect.width(), rect.top() + rect.height()
+                for hx, hy in ((rect.left(), rect.top()), (right, rect.top()), (rect.left(), bottom), (right, bottom)):
+                    painter.fillRect(hx - handle_sz // 2, hy - handle_sz // 2, handle_sz, handle_sz, QColor(0, 255, 255))
+
+        # Semi-transparent label text just above the top-left corner, blitted from cached sprites
+        text_dy += metrics.ascent()
+        for label, rects in labels.items():
+            sprite = self.label_sprite(label, owner.get_label_color(label), font)
+            for rect in rects:
+                painter.drawPixmap(rect.left() + 2, rect.top() - text_dy, sprite)
+
+        # Rubber band for the box being drawn, or the Shift+drag selection rectangle
+        if (owner.drawing or owner.selecting) and owner.bbox_start is not None and owner.bbox_end is not None:
+            x1, y1 = owner.bbox_start.x(), owner.bbox_start.y()
+            x2, y2 = owner.bbox_end.x(), owner.bbox_end.y()
+            rect = self._map_rect(min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1), ox, oy, scale)
+            if owner.selecting:
+                painter.fillRect(rect, QColor(0, 120, 215, 40))
+                painter.setPen(QPen(QColor(0, 120, 215), 1, Qt.DashLine))
+            else:
+                painter.setPen(QPen(QColor(0, 255, 255), 2, Qt.DashLine))
+            painter.drawRect(rect)
+        painter.end()
+
+
+class FileListModel(QAbstractListModel):
+    """Image list of the file panel, served row by row to a QListView.
+
+    Per-row status (viewed, labeled, auto-labeled, mean confidence) lives in
+    numpy arrays and a path -> row dict gives the row of an image, so marking
+    or locating one image costs O(1) whatever the project size; the view only
+    asks for the rows it is showing.
+    """
+    VIEWED_COLOR = QColor(0, 128, 0)
+    AUTO_LABELED_COLOR = QColor(0, 90, 180)
+    DEFAULT_COLOR = QColor(0, 0, 0)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.clear()
+
+    def clear(self):
+        self.beginResetModel()
+        self._paths = []
+        self._names = []
+        self._rows = {}  # path -> row
+        self.viewed = np.zeros(0, bool)
+        self.labeled = np.zeros(0, bool)
+        self.auto_labeled = np.zeros(0, bool)
+        self.confidence = np.zeros(0, np.float32)  # 自动标注框的平均置信度，NaN 表示没有
+        self.endResetModel()
+
+    def _reserve(self, n):
+        # 容量按倍数增长，追加一批时不用每次复制全部数组
+        if n <= len(self.viewed):
+            return
+        capacity = max(n, 2 * len(self.viewed), 256)
+        for name, fill in (('viewed', False), ('labeled', False), ('auto_labeled', False), ('confidence', np.nan)):
+            old = getattr(self, name)
+            grown = np.full(capacity, fill, old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def append(self, paths, labeled=None):
+        """Append image paths; ``labeled`` optionally gives their initial labeled flags."""
+        if not paths:
+            return
+        start = len(self._paths)
+        self._reserve(start + len(paths))
+        self.beginInsertRows(QModelIndex(), start, start + len(paths) - 1)
+        self._paths.extend(paths)
+        self._names.extend(os.path.basename(p) for p in paths)
+        self._rows.update((p, i) for i, p in enumerate(paths, start))
+        if labeled is not None:
+            self.labeled[start:start + len(paths)] = labeled
+        self.endInsertRows()
+
+    def row_of(self, path):
+        return self._rows.get(path, -1)
+
+    def path(self, row):
+        return self._paths[row]
+
+    def _row_changed(self, row):
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def set_viewed(self, row):
+        if 0 <= row < len(self._paths) and not self.viewed[row]:
+            self.viewed[row] = True
+            self._row_changed(row)
+
+    def set_labels(self, row, store):
+        """Update the labeled / auto-labeled status of ``row`` from its saved boxes (a BoxStore)."""
+        if not 0 <= row < len(self._paths):
+            return
+        conf = store.confidence[~np.isnan(store.confidence)]
+        self.labeled[row] = len(store) > 0
+        self.auto_labeled[row] = len(conf) > 0
+        self.confidence[row] = conf.mean() if len(conf) else np.nan
+        self._row_changed(row)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self._names[row]
+        if role == Qt.ForegroundRole:
+            if self.viewed[row]:
+                return self.VIEWED_COLOR
+            return self.AUTO_LABELED_COLOR if self.auto_labeled[row] else self.DEFAULT_COLOR
+        if role == Qt.ToolTipRole:
+            status = [tr("file_status_viewed") if self.viewed[row] else tr("file_status_not_viewed")]
+            if self.auto_labeled[row]:
+                status.append(tr("file_status_auto_labeled").format(float(self.confidence[row])))
+            elif self.labeled[row]:
+                status.append(tr("file_status_labeled"))
+            return f"{self._names[row]}\n" + " | ".join(status)
+        return None
+
+class DirectoryScanWorker(QThread):
+    """在后台扫描目录，分批把有效图片发送给界面"""
+    batch_found = pyqtSignal(list)  # list of image paths
+    progress = pyqtSignal(int, int)  # (processed, total)
+    finished = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, manifest, batch_size=256):
+        super().__init__()
+        self.manifest = manifest
+        self.batch_size = batch_size
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            found = 0
+            scan = self.manifest.iter_scan(self.batch_size)
+            for batch, processed, total in scan:
+                if self._cancelled:
+                    scan.close()
+                    return
+                if batch:
+                    found += len(batch)
+                    self.batch_found.emit(batch)
+                self.progress.emit(processed, total)
+            self.finished.emit(found)
+        except Exception as e:
+            self.error.emit(str(e))
+
+class AnnotationTableWorker(QThread):
+    """在后台批量读取整个项目的标注，用于统计"""
+    loaded = pyqtSignal(object, list)  # (AnnotationTable, image paths)
+    error = pyqtSignal(str)
+
+    def __init__(self, image_list, classes, size_lookup=None):
+        super().__init__()
+        self.image_list = list(image_list)
+        self.classes = list(classes)
+        self.size_lookup = size_lookup
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            table = load_annotation_table(self.image_list, self.classes, self.size_lookup, cancel=self._cancel)
+            if table is not None:
+                self.loaded.emit(table, self.image_list)
+        except Exception as e:
+            self.error.emit(str(e))
+
+class AutoLabelWorker(QThread):
+    """在后台线程中运行视觉提示自动标注
+
+    Targets go through an AutoLabelPipeline and every result is emitted as
+    soon as it is ready, so the GUI thread writes it (and refreshes the open
+    image) while later batches are still running. cancel / pause / resume
+    take effect at the next batch or result.
+    """
+    progress = pyqtSignal(int, int, str)  # (done, total, message)
+    result_ready = pyqtSignal(str, object, str)  # (image path, predictions or None, error)
+    finished = pyqtSignal(bool)  # cancelled
+    error = pyqtSignal(str)
+
+    def __init__(self, wrapper, prompt_images, visuals, targets, batch_size=8):
+        super().__init__()
+        self.wrapper = wrapper
+        self.prompt_images = prompt_images
+        self.visuals = visuals
+        self.targets = list(targets)
+        self.batch_size = batch_size
+        self.pipeline = None
+        self._cancelled = False
+        self._paused = False
+
+    def cancel(self):
+        self._cancelled = True
+        if self.pipeline is not None:
+            self.pipeline.cancel()
+
+    def set_paused(self, paused):
+        self._paused = paused
+        if self.pipeline is not None:
+            (self.pipeline.pause if paused else self.pipeline.resume)()
+
+    def run(self):
+        try:
+            total = len(self.targets)
+            self.progress.emit(0, total, "Building visual prompt encoder...")
+            self.wrapper.set_visual_prompts(self.prompt_images, self.visuals)
+            predict = functools.partial(self.wrapper.auto_label_batch, batch_size=self.batch_size)
+            self.pipeline = AutoLabelPipeline(predict, batch_size=self.batch_size, max_side=self.wrapper.input_size)
+            # 构建期间收到的取消 / 暂停
+            if self._cancelled:
+                self.pipeline.cancel()
+            self.set_paused(self._paused)
+            for done, result in enumerate(self.pipeline.results(self.targets), 1):
+                self.result_ready.emit(result.item, result.predictions, result.error or "")
+                self.progress.emit(done, total, os.path.basename(result.item))
+            print(f"[Debug] 流水线耗时: {self.pipeline.timings}")
+            self.finished.emit(self.pipeline.cancelled)
+        except Exception as e:
+            self.error.emit(str(e))
+
 class DataAugmentationWorker(QThread):
     progress = pyqtSignal(int, int)  # (current, total)
     finished = pyqtSignal(int)
@@ -153,44 +511,23 @@ class DataAugmentationWorker(QThread):
                 if image is None:
                     continue
                 base_name = os.path.splitext(os.path.basename(image_path))[0]
-                label_path = os.path.splitext(image_path)[0] + '.txt'
-                current_bboxes = []
+                yolo = get_codec("YOLO")
+                label_path = yolo.path_for(image_path)
+                img_h, img_w = image.shape[:2]
                 if os.path.exists(label_path):
-                    with open(label_path, 'r') as f:
-                        for line in f:
-                            parts = line.strip().split()
-                            if len(parts) == 5:
-                                class_idx = int(parts[0])
-                                x_center, y_center, w_norm, h_norm = map(float, parts[1:])
-                                img_h, img_w = image.shape[:2]
-                                x = int((x_center - w_norm/2) * img_w)
-                                y = int((y_center - h_norm/2) * img_h)
-                                w_pixels = int(w_norm * img_w)
-                                h_pixels = int(h_norm * img_h)
-                                label = self.classes[class_idx] if class_idx < len(self.classes) else "unknown"
-                                from ..core.bounding_box import BoundingBox
-                                current_bboxes.append(BoundingBox(x, y, w_pixels, h_pixels, label))
+                    current_bboxes = yolo.read(label_path, img_w, img_h, self.classes)
+                else:
+                    current_bboxes = BoxStore(self.classes)
                 for aug_idx in range(self.aug_count):
                     params = self.get_random_params()
-                    bboxes_to_augment = [b for b in current_bboxes]
-                    aug_image, aug_bboxes = self.apply_augmentation(image.copy(), bboxes_to_augment, params)
+                    aug_image, aug_bboxes = self.apply_augmentation(image.copy(), current_bboxes, params)
                     aug_suffix = f"_aug{aug_idx + 1}"
                     aug_image_path = os.path.join(self.output_folder, base_name + aug_suffix + os.path.splitext(image_path)[1])
-                    aug_label_path = os.path.join(self.output_folder, base_name + aug_suffix + '.txt')
+                    aug_label_path = os.path.join(self.output_folder, base_name + aug_suffix + yolo.extension)
                     cv2.imwrite(aug_image_path, aug_image)
-                    if aug_bboxes:
+                    if len(aug_bboxes):
                         aug_img_h, aug_img_w = aug_image.shape[:2]
-                        with open(aug_label_path, 'w') as f_aug:
-                            for bbox in aug_bboxes:
-                                x_c = (bbox.x + bbox.w/2) / aug_img_w
-                                y_c = (bbox.y + bbox.h/2) / aug_img_h
-                                w_n = bbox.w / aug_img_w
-                                h_n = bbox.h / aug_img_h
-                                try:
-                                    class_idx_aug = self.classes.index(bbox.label)
-                                    f_aug.write(f"{class_idx_aug} {x_c:.6f} {y_c:.6f} {w_n:.6f} {h_n:.6f}\n")
-                                except ValueError:
-                                    continue
+                        yolo.write(aug_label_path, aug_bboxes, self.classes, aug_img_w, aug_img_h)
                     total_augmented += 1
                 if self.preserve_original:
                     dst_img = os.path.join(self.output_folder, os.path.basename(image_path))
@@ -382,28 +719,9 @@ class DataAugmentationDialog(QDialog):
         }
         
     def apply_augmentation(self, image, bboxes_in, params):
-        # Ensure a deep copy of bboxes is made if they are to be modified
-        # from ..core.bounding_box import BoundingBox # Placeholder for eventual import
-        # bboxes = [BoundingBox(b.x,b.y,b.w,b.h,b.label) for b in bboxes_in]
-        # For now, assume bboxes_in is a list of objects that can be directly modified or are value types
-        bboxes = []
-        for b_orig in bboxes_in:
-            # Create a new BoundingBox object for each original to avoid modifying originals in place
-            # This requires BoundingBox to be defined or imported.
-            # For now, this will fail if BoundingBox is not accessible.
-            # Placeholder: if BoundingBox is not defined, this will cause an error.
-            # Assuming BoundingBox is defined as in the original single file for now.
-            try: 
-                from ..core.bounding_box import BoundingBox
-            except ImportError:
-                 # Fallback for direct execution or if structure isn't fully set up
-                 # This is a temporary measure for the refactoring process.
-                 class BoundingBoxPlaceholder:
-                    def __init__(self, x, y, w, h, label=""):
-                        self.x = int(x); self.y = int(y); self.w = int(w); self.h = int(h); self.label = label
-                 BoundingBox = BoundingBoxPlaceholder
-            bboxes.append(BoundingBox(b_orig.x, b_orig.y, b_orig.w, b_orig.h, b_orig.label))
-
+        """Augment ``image`` and return it with a transformed copy of the boxes as a BoxStore."""
+        bboxes = bboxes_in.copy() if isinstance(bboxes_in, BoxStore) else BoxStore.from_boxes(bboxes_in)
+        xywh = bboxes.xywh.astype(np.int64)
 
         height, width = image.shape[:2]
         
@@ -418,33 +736,30 @@ class DataAugmentationDialog(QDialog):
             rotation_matrix = cv2.getRotationMatrix2D(center, params['rotation'], 1.0)
             image = cv2.warpAffine(image, rotation_matrix, (width, height))
             
-            for bbox in bboxes:
-                corners = np.array([
-                    [bbox.x, bbox.y],
-                    [bbox.x + bbox.w, bbox.y],
-                    [bbox.x + bbox.w, bbox.y + bbox.h],
-                    [bbox.x, bbox.y + bbox.h]
-                ])
-                corners = cv2.transform(corners.reshape(-1, 1, 2), rotation_matrix).reshape(-1, 2)
-                x_min = np.min(corners[:, 0])
-                y_min = np.min(corners[:, 1])
-                x_max = np.max(corners[:, 0])
-                y_max = np.max(corners[:, 1])
-                bbox.x = max(0, int(x_min))
-                bbox.y = max(0, int(y_min))
-                bbox.w = min(width - bbox.x, int(x_max - x_min))
-                bbox.h = min(height - bbox.y, int(y_max - y_min))
+            if len(xywh):
+                # 所有框的四个角一次性变换：(N*4, 1, 2)
+                x1, y1 = xywh[:, 0], xywh[:, 1]
+                x2, y2 = x1 + xywh[:, 2], y1 + xywh[:, 3]
+                corners = np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                                    np.stack([x2, y2], 1), np.stack([x1, y2], 1)], axis=1)
+                corners = cv2.transform(corners.reshape(-1, 1, 2).astype(np.float64),
+                                        rotation_matrix).reshape(-1, 4, 2)
+                mins = corners.min(axis=1)
+                spans = (corners.max(axis=1) - mins).astype(np.int64)
+                xywh[:, 0] = np.maximum(0, mins[:, 0].astype(np.int64))
+                xywh[:, 1] = np.maximum(0, mins[:, 1].astype(np.int64))
+                xywh[:, 2] = np.minimum(width - xywh[:, 0], spans[:, 0])
+                xywh[:, 3] = np.minimum(height - xywh[:, 1], spans[:, 1])
         
         if params['flip_ud']:
             image = cv2.flip(image, 0)
-            for bbox in bboxes:
-                bbox.y = height - (bbox.y + bbox.h)
+            xywh[:, 1] = height - (xywh[:, 1] + xywh[:, 3])
                 
         if params['flip_lr']:
             image = cv2.flip(image, 1)
-            for bbox in bboxes:
-                bbox.x = width - (bbox.x + bbox.w)
-                
+            xywh[:, 0] = width - (xywh[:, 0] + xywh[:, 2])
+
+        bboxes.xywh = xywh.astype(np.int32)
         return image, bboxes
         
     def process_images(self):
@@ -453,6 +768,7 @@ class DataAugmentationDialog(QDialog):
             return
         if not self.parent_window or not self.parent_window.image_list:
             return
+        self.parent_window.save_queue.flush()  # 增强读取的是磁盘上的标注文件
         self.progress_dialog = QProgressDialog(tr("processing"), tr("cancel"), 0, len(self.parent_window.image_list), self)
         self.progress_dialog.setWindowModality(Qt.WindowModal)
         self.progress_dialog.setValue(0)
@@ -511,37 +827,26 @@ class AutoLabelDialog(QDialog):
         print("[Debug] 刷新自动标注对话框的项目数据...")
         
         # 重新扫描并同步标注缓存
-        self.parent_window.label_cache = {}
-        
-        for idx, img_path in enumerate(self.parent_window.image_list):
-            txt_path = os.path.splitext(img_path)[0] + '.txt'
-            if os.path.exists(txt_path):
-                # 创建临时状态来加载标注
-                original_current_index = self.parent_window.current_index
-                original_bboxes = self.parent_window.bboxes.copy()
-                original_current_image = self.parent_window.current_image
-                
-                try:
-                    # 临时设置状态
-                    self.parent_window.current_index = idx
-                    self.parent_window.current_image = cv2.imread(img_path)
-                    
-                    if self.parent_window.current_image is not None:
-                        self.parent_window.loadAnnotations(txt_path)
-                        self.parent_window.label_cache[idx] = [
-                            BoundingBox(b.x, b.y, b.w, b.h, b.label) 
-                            for b in self.parent_window.bboxes
-                        ]
-                        print(f"[Debug] 缓存图片 {idx} 的 {len(self.parent_window.bboxes)} 个标注")
-                    
-                finally:
-                    # 恢复原始状态
-                    self.parent_window.current_index = original_current_index
-                    self.parent_window.bboxes = original_bboxes
-                    self.parent_window.current_image = original_current_image
+        self.cache_annotations()
         
         print(f"[Debug] 项目数据刷新完成，找到 {len(self.parent_window.label_cache)} 个已标注图片")
         
+    def cache_annotations(self):
+        """Rebuild parent_window.label_cache with a BoxStore per labeled image.
+
+        All .txt files are read in parallel by the bulk loader, with image
+        sizes from the manifest or file headers, so the window's current
+        image and boxes are left untouched and nothing is decoded.
+        """
+        window = self.parent_window
+        window.save_queue.flush()  # 读取标注文件前先写完排队中的保存
+        manifest = getattr(window, 'manifest', None)
+        table = load_annotation_table(window.image_list, window.classes,
+                                      manifest.image_size if manifest is not None else None)
+        window.label_cache = table.to_label_cache()
+        window.stats.load_table(table, window.image_list)
+        window.updateColorLegend()
+
     def initUI(self):
         layout = QVBoxLayout()
         
@@ -642,12 +947,7 @@ class AutoLabelDialog(QDialog):
     def auto_label_all(self):
         # 1. 強制刷新 classes.txt 和 label_cache
         self.parent_window.loadClasses()
-        self.parent_window.label_cache = {}
-        for idx, img_path in enumerate(self.parent_window.image_list):
-            txt_path = os.path.splitext(img_path)[0] + '.txt'
-            if os.path.exists(txt_path):
-                self.parent_window.loadAnnotations(txt_path)
-                self.parent_window.label_cache[idx] = self.parent_window.bboxes.copy()
+        self.cache_annotations()
 
         prompt_image_paths, visuals, prompt_indices = self.get_prompt_data()
         if not prompt_image_paths:
@@ -704,56 +1004,30 @@ class AutoLabelDialog(QDialog):
             
             # 直接读取对应的YOLO标注文件
             img_path = self.parent_window.image_list[img_idx]
-            txt_path = os.path.splitext(img_path)[0] + '.txt'
+            txt_path = get_codec("YOLO").path_for(img_path)
             
             print(f"[Debug] 读取标注文件: {txt_path}")
             
             if os.path.exists(txt_path):
                 try:
-                    # 获取图片尺寸用于坐标转换
-                    import cv2
-                    img = cv2.imread(img_path)
-                    if img is not None:
-                        img_height, img_width = img.shape[:2]
+                    # 获取图片尺寸用于坐标转换（优先读取清单中的文件头尺寸）
+                    manifest = getattr(self.parent_window, 'manifest', None)
+                    size = manifest.image_size(img_path) if manifest is not None else None
+                    if size is None:
+                        img = self.parent_window.image_cache.load(img_path)
+                        size = (img.shape[1], img.shape[0]) if img is not None else None
+                    if size is not None:
+                        img_width, img_height = size
                         
-                        with open(txt_path, 'r') as f:
-                            for line_num, line in enumerate(f):
-                                line = line.strip()
-                                if not line:
-                                    continue
-                                
-                                parts = line.split()
-                                if len(parts) != 5:
-                                    print(f"[Debug] 跳过格式错误的行 {line_num+1}: {line}")
-                                    continue
-                                
-                                try:
-                                    # 🔍 关键修复：直接使用YOLO文件中的真实类别ID
-                                    real_class_id = int(parts[0])
-                                    center_x = float(parts[1])
-                                    center_y = float(parts[2])
-                                    width = float(parts[3])
-                                    height = float(parts[4])
-                                    
-                                    # 转换为绝对坐标
-                                    x1 = (center_x - width/2) * img_width
-                                    y1 = (center_y - height/2) * img_height
-                                    x2 = (center_x + width/2) * img_width
-                                    y2 = (center_y + height/2) * img_height
-                                    
-                                    bboxes.append([x1, y1, x2, y2])
-                                    clses.append(real_class_id)  # 使用真实的类别ID
-                                    
-                                    # 验证类别ID是否在合理范围内
-                                    if hasattr(self.parent_window, 'classes') and real_class_id < len(self.parent_window.classes):
-                                        class_name = self.parent_window.classes[real_class_id]
-                                        print(f"[Debug] 添加对象: 真实类别ID={real_class_id} -> 名称='{class_name}'")
-                                    else:
-                                        print(f"[Debug] 添加对象: 真实类别ID={real_class_id} (超出当前类别范围)")
-                                    
-                                except (ValueError, IndexError) as e:
-                                    print(f"[Debug] 解析标注行时出错 {line_num+1}: {e}")
-                                    continue
+                        # 🔍 关键修复：直接使用YOLO文件中的真实类别ID（不映射到当前类别表）
+                        rows = read_yolo_rows(txt_path)
+                        half_w, half_h = rows[:, 3] / 2, rows[:, 4] / 2
+                        xyxy = np.column_stack([(rows[:, 1] - half_w) * img_width, (rows[:, 2] - half_h) * img_height,
+                                                (rows[:, 1] + half_w) * img_width, (rows[:, 2] + half_h) * img_height])
+                        bboxes.extend(xyxy.tolist())
+                        clses.extend(rows[:, 0].astype(np.int64).tolist())
+                        known = int((rows[:, 0] < len(self.parent_window.classes)).sum())
+                        print(f"[Debug] 添加 {len(rows)} 个对象，其中 {len(rows) - known} 个类别ID超出当前类别范围")
                     else:
                         print(f"[Debug] 无法读取图片: {img_path}")
                         
@@ -831,6 +1105,7 @@ class AutoLabelDialog(QDialog):
 
 class AutoLabelProgressDialog(QProgressDialog):
     """自动标注进度对话框"""
+    paused_changed = pyqtSignal(bool)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -864,6 +1139,29 @@ class AutoLabelProgressDialog(QProgressDialog):
         self.current_step = 0
         self.total_steps = 0
         
+        # 暂停按钮，只有后台运行的任务才显示
+        self.pause_button = QPushButton(tr("auto_label_pause"), self)
+        self.pause_button.setCheckable(True)
+        self.pause_button.toggled.connect(self._on_pause_toggled)
+        self.pause_button.hide()
+        
+    def enable_pause(self):
+        self.pause_button.show()
+        self._place_pause_button()
+        
+    def _on_pause_toggled(self, paused):
+        self.pause_button.setText(tr("auto_label_resume") if paused else tr("auto_label_pause"))
+        self.paused_changed.emit(paused)
+        
+    def _place_pause_button(self):
+        # QProgressDialog 没有布局，和取消按钮一样放在底部（左侧）
+        hint = self.pause_button.sizeHint()
+        self.pause_button.setGeometry(10, self.height() - hint.height() - 10, hint.width(), hint.height())
+        
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._place_pause_button()
+        
     def setup_batch_progress(self, total_images):
         """设置批量处理进度"""
         self.total_images = total_images
@@ -890,6 +1188,12 @@ class AutoLabelProgressDialog(QProgressDialog):
         # 更新显示文本
         self.setLabelText(f"{message}\nProcessing image {self.current_image}/{self.total_images}")
         
+    def update_done_progress(self, done, message):
+        """Progress reported by AutoLabelWorker: ``done`` images finished."""
+        self.current_image = done
+        self.setValue(done * 4)
+        self.setLabelText(f"{message}\nProcessed {done}/{self.total_images} images")
+        
     def update_display(self):
         """更新显示"""
         if self.total_images > 0:
@@ -899,6 +1203,7 @@ class AutoLabelProgressDialog(QProgressDialog):
             
     def set_completed(self, success_count, total_count):
         """设置完成状态"""
+        self.pause_button.hide()
         self.setValue(self.maximum())
         if success_count == total_count:
             self.setLabelText(f"✅ Auto labeling completed!\nSuccessfully processed {success_count}/{total_count} images")
@@ -907,6 +1212,7 @@ class AutoLabelProgressDialog(QProgressDialog):
             
     def set_error(self, error_message):
         """设置错误状态"""
+        self.pause_button.hide()
         self.setLabelText(f"❌ Auto labeling failed\nError: {error_message}")
         
     def closeEvent(self, event):
@@ -1,5 +1,6 @@
 import sys
 import os
+import hashlib
 import torch
 import torch.nn.functional as F
 import numpy as np # 確保 numpy 已導入
@@ -36,6 +37,7 @@ class YOLOEWrapper:
         self.model = None
         self.true_class_names = class_names or []
         self.vpe = None  # Visual Prompt Encoder
+        self._prompt_key_cached = None  # 当前 VPE 对应的提示哈希
         
         # 延迟加载模型
         self._load_model()
@@ -50,6 +52,12 @@ class YOLOEWrapper:
             print(f"[Error] 加载YOLOE模型失败: {e}")
             raise
     
+    @property
+    def input_size(self) -> int:
+        """Long side of the model input; larger targets are shrunk to it by the predictor."""
+        imgsz = (getattr(self.model, 'overrides', None) or {}).get('imgsz') or 640
+        return int(max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz)
+    
     def auto_label_with_vp(self, 
                           source_image, 
                           visuals: Dict[str, Any], 
@@ -59,6 +67,9 @@ class YOLOEWrapper:
                           progress_callback=None) -> List[Dict[str, Any]]:
         """使用视觉提示进行自动标注
         
+        The VPE is cached by set_visual_prompts, so repeated calls with the
+        same prompts only run the target prediction.
+        
         Args:
             source_image: 源图像路径（提示图像），可以是字符串或列表
             visuals: 视觉提示字典，包含bboxes和cls
@@ -71,25 +82,14 @@ class YOLOEWrapper:
             List[Dict]: 预测结果列表，每个元素包含bbox、class_id、confidence
         """
         try:
-            # 如果 source_image 是列表，取第一个元素
-            if isinstance(source_image, list):
-                source_image_path = source_image[0]
-            else:
-                source_image_path = source_image
-                
             print(f"[Debug] 开始视觉提示自动标注")
-            print(f"[Debug] 源图像: {source_image_path}")
             print(f"[Debug] 目标图像: {target_image}")
-            print(f"[Debug] 视觉提示: {visuals}")
             print(f"[Debug] 置信度阈值: {conf_threshold}")
             
             # 报告进度：步骤1
             if progress_callback:
                 progress_callback(1, 4, "Validating input files...")
             
-            # 验证输入
-            if not os.path.exists(source_image_path):
-                raise FileNotFoundError(f"源图像不存在: {source_image_path}")
             if not os.path.exists(target_image):
                 raise FileNotFoundError(f"目标图像不存在: {target_image}")
             
@@ -97,81 +97,162 @@ class YOLOEWrapper:
             if progress_callback:
                 progress_callback(2, 4, "Building visual prompt encoder...")
             
-            # 使用新的VPE初始化方法
-            vpe_success = self._init_vpe_with_prompts(source_image_path, visuals, conf_threshold)
-            
-            if not vpe_success:
-                print(f"[Warning] VPE初始化失败，使用备用方法")
-                # 备用方案：直接在目标图像上进行预测
-                try:
-                    # 报告进度：步骤3（跳过VPE设置）
-                    if progress_callback:
-                        progress_callback(3, 4, "Using fallback prediction method...")
-                    
-                    # 报告进度：步骤4
-                    if progress_callback:
-                        progress_callback(4, 4, "Executing target image prediction...")
-                    
-                    # 直接预测目标图像
-                    print(f"[Debug] 备用方案: 直接预测目标图像")
-                    target_results = self.model.predict(
-                        target_image, 
-                        save=False,
-                        conf=conf_threshold
-                    )
-                    
-                    # 解析预测结果
-                    predictions = self._parse_predictions(target_results, min_confidence)
-                    print(f"[Debug] 备用方案解析得到 {len(predictions)} 个预测结果")
-                    
-                    return predictions
-                    
-                except Exception as fallback_error:
-                    print(f"[Error] 备用方案也失败了: {fallback_error}")
-                    raise RuntimeError(f"VPE获取失败且备用方案也失败: {fallback_error}")
-            
-            print(f"[Debug] VPE初始化成功，继续正常流程")
+            vpe_success = self.set_visual_prompts(source_image, visuals, conf_threshold)
             
             # 报告进度：步骤3
             if progress_callback:
-                progress_callback(3, 4, "Setting classes and preparing prediction...")
-            
-            # 第二步：设置类别并清除predictor
-            print(f"[Debug] 步骤2: 设置类别并清除predictor")
-            if self.true_class_names:
-                self.model.set_classes(self.true_class_names, self.vpe)
-                print(f"[Debug] 已设置类别: {self.true_class_names}")
-            else:
-                # 如果没有提供类别名称，使用默认类别
-                default_classes = [f"object{i}" for i in range(len(visuals.get('cls', [[]])[0]))]
-                self.model.set_classes(default_classes, self.vpe)
-                print(f"[Debug] 使用默认类别: {default_classes}")
-            
-            # 清除predictor以使用标准预测
-            self.model.predictor = None
+                progress_callback(3, 4, "Setting classes and preparing prediction..." if vpe_success
+                                  else "Using fallback prediction method...")
             
             # 报告进度：步骤4
             if progress_callback:
                 progress_callback(4, 4, "Executing target image prediction...")
             
-            # 第三步：在目标图像上进行预测
-            print(f"[Debug] 步骤3: 在目标图像上进行预测")
-            target_results = self.model.predict(
-                target_image, 
-                save=False,
-                conf=conf_threshold
-            )
-            
-            # 解析预测结果
-            predictions = self._parse_predictions(target_results, min_confidence)
-            print(f"[Debug] 解析得到 {len(predictions)} 个预测结果")
-            
-            return predictions
+            return self.predict_with_prompts(target_image, conf_threshold, min_confidence)
             
         except Exception as e:
             print(f"[Error] 视觉提示自动标注失败: {e}")
             raise
     
+    def set_visual_prompts(self, source_image, visuals: Dict[str, Any], conf_threshold: float = 0.25) -> bool:
+        """Build the VPE for a prompt set and set the model classes with it.
+        
+        The result is cached under a hash of the prompt image and boxes, so
+        calling this again with the same prompts (e.g. once per target image)
+        costs nothing. Returns False if no VPE could be built; predictions
+        then fall back to the plain model.
+        
+        Args:
+            source_image: 源图像路径（提示图像），可以是字符串或列表
+            visuals: 视觉提示字典，包含bboxes和cls
+            conf_threshold: 置信度阈值
+        """
+        # 如果 source_image 是列表，取第一个元素
+        source_image_path = source_image[0] if isinstance(source_image, list) else source_image
+        if not os.path.exists(source_image_path):
+            raise FileNotFoundError(f"源图像不存在: {source_image_path}")
+        
+        key = self._prompt_key(source_image_path, visuals)
+        if key == self._prompt_key_cached:
+            print(f"[Debug] 复用已缓存的VPE")
+            return self.vpe is not None
+        
+        print(f"[Debug] 源图像: {source_image_path}")
+        print(f"[Debug] 视觉提示: {visuals}")
+        self.vpe = None
+        vpe_success = self._init_vpe_with_prompts(source_image_path, visuals, conf_threshold)
+        if vpe_success:
+            print(f"[Debug] VPE初始化成功，设置类别")
+            if self.true_class_names:
+                self.model.set_classes(self.true_class_names, self.vpe)
+                print(f"[Debug] 已设置类别: {self.true_class_names}")
+            else:
+                # 如果没有提供类别名称，使用默认类别
+                default_classes = [f"object{i}" for i in range(len(visuals.get('cls', [[]])[0]))]
+                self.model.set_classes(default_classes, self.vpe)
+                print(f"[Debug] 使用默认类别: {default_classes}")
+        else:
+            print(f"[Warning] VPE初始化失败，使用备用方法: 直接预测目标图像")
+        
+        # 清除predictor；之后第一次预测会建立标准predictor，后续目标图像复用
+        self.model.predictor = None
+        # 失败也记录下来，同一组提示不再重复尝试
+        self._prompt_key_cached = key
+        return vpe_success
+    
+    def predict_with_prompts(self, target_image: str, conf_threshold: float = 0.25,
+                             min_confidence: float = 0.25) -> List[Dict[str, Any]]:
+        """Predict one target image with the prompts from the last set_visual_prompts call."""
+        target_results = self.model.predict(
+            target_image, 
+            save=False,
+            conf=conf_threshold
+        )
+        
+        # 解析预测结果
+        predictions = self._parse_predictions(target_results, min_confidence)
+        print(f"[Debug] 解析得到 {len(predictions)} 个预测结果")
+        return predictions
+    
+    def _prompt_key(self, source_image_path: str, visuals: Dict[str, Any]) -> str:
+        """Hash of a prompt set: the prompt image (path, size, mtime), its boxes and classes, and the class names."""
+        h = hashlib.sha1()
+        st = os.stat(source_image_path)
+        h.update(f"{os.path.abspath(source_image_path)}|{st.st_size}|{st.st_mtime_ns}".encode())
+        for name in sorted(visuals):
+            items = visuals[name] if isinstance(visuals[name], (list, tuple)) else [visuals[name]]
+            h.update(f"|{name}:{len(items)}".encode())
+            for item in items:
+                arr = np.asarray(item, dtype=np.float64)
+                h.update(str(arr.shape).encode())
+                h.update(arr.tobytes())
+        h.update("\0".join(self.true_class_names).encode())
+        return h.hexdigest()
+    
+    def auto_label_batch(self, targets, batch_size: int = 8, conf_threshold: float = 0.25,
+                         min_confidence: float = 0.25) -> List[Optional[List[Dict[str, Any]]]]:
+        """Predict many target images with the current prompts, ``batch_size`` images per forward pass.
+        
+        Call set_visual_prompts first. ``targets`` are image paths or decoded
+        BGR arrays; the predictor letterboxes each batch into one tensor.
+        
+        Returns:
+            One prediction list per target (same format as auto_label_with_vp),
+            None where the target could not be predicted.
+        """
+        outputs = []
+        batch_size = max(1, int(batch_size))
+        for start in range(0, len(targets), batch_size):
+            chunk = list(targets[start:start + batch_size])
+            try:
+                results = self.model.predict(chunk, save=False, conf=conf_threshold, batch=len(chunk), verbose=False)
+            except Exception as e:
+                # 一张坏图会让整批失败，逐张重试以找出它
+                print(f"[Warning] 批量预测失败，逐张重试: {e}")
+                results = []
+                for target in chunk:
+                    try:
+                        results.extend(self.model.predict(target, save=False, conf=conf_threshold, verbose=False))
+                    except Exception as target_error:
+                        print(f"[Error] 预测失败: {target_error}")
+                        results.append(None)
+            outputs.extend(self._parse_batch(results, min_confidence))
+        print(f"[Debug] 批量预测完成: {len(targets)} 张图片, batch={batch_size}")
+        return outputs
+    
+    def _parse_batch(self, results, min_confidence: float) -> List[Optional[List[Dict[str, Any]]]]:
+        """Parse one result per image; the boxes of all images are copied and filtered in one NumPy pass.
+        
+        Args:
+            results: YOLOE预测结果，None 表示该图片预测失败
+            min_confidence: 最终结果的最小置信度阈值
+        """
+        boxes = [getattr(r, 'boxes', None) if r is not None else None for r in results]
+        counts = np.array([len(b) if b is not None else 0 for b in boxes], dtype=np.int64)
+        present = [b.data for b in boxes if b is not None and len(b)]
+        # boxes.data 每行为 x1, y1, x2, y2, (track id,) conf, cls；整批只做一次设备到内存的拷贝
+        data = torch.cat(present).cpu().numpy().astype(np.float64) if present else np.zeros((0, 6))
+        image_id = np.repeat(np.arange(len(results)), counts)
+        
+        keep = data[:, -2] >= min_confidence
+        if not keep.all():
+            print(f"[Debug] 跳过 {int((~keep).sum())} 个低置信度预测")
+        data, image_id = data[keep], image_id[keep]
+        xywh = np.column_stack([data[:, :2], data[:, 2:4] - data[:, :2]])
+        split_at = np.cumsum(np.bincount(image_id, minlength=len(results)))[:-1]
+        
+        parsed = []
+        for result, img_xywh, img_cls, img_conf in zip(results, np.split(xywh, split_at),
+                                                       np.split(data[:, -1].astype(int), split_at),
+                                                       np.split(data[:, -2], split_at)):
+            if result is None:
+                parsed.append(None)
+                continue
+            parsed.append([{'bbox': bbox, 'class_id': class_id, 'confidence': confidence}
+                           for bbox, class_id, confidence in zip(img_xywh.tolist(), img_cls.tolist(),
+                                                                 img_conf.tolist())])
+        return parsed
+    
     def _parse_predictions(self, results, min_confidence: float) -> List[Dict[str, Any]]:
         """解析YOLOE预测结果
         
@@ -185,55 +266,9 @@ class YOLOEWrapper:
         predictions = []
         
         try:
-            for result in results:
-                if hasattr(result, 'boxes') and result.boxes is not None:
-                    boxes = result.boxes
-                    
-                    # 获取边界框坐标 (xyxy格式)
-                    if hasattr(boxes, 'xyxy') and boxes.xyxy is not None:
-                        xyxy = boxes.xyxy.cpu().numpy()
-                    else:
-                        continue
-                    
-                    # 获取置信度
-                    if hasattr(boxes, 'conf') and boxes.conf is not None:
-                        confidences = boxes.conf.cpu().numpy()
-                    else:
-                        confidences = np.ones(len(xyxy))
-                    
-                    # 获取类别ID
-                    if hasattr(boxes, 'cls') and boxes.cls is not None:
-                        class_ids = boxes.cls.cpu().numpy().astype(int)
-                    else:
-                        class_ids = np.zeros(len(xyxy), dtype=int)
-                    
-                    # 转换为预测结果格式
-                    for i in range(len(xyxy)):
-                        x1, y1, x2, y2 = xyxy[i]
-                        confidence = float(confidences[i])
-                        
-                        # 只保留置信度超过 0.4 的预测结果
-                        if confidence < min_confidence:
-                            print(f"[Debug] 跳过低置信度预测: confidence={confidence:.3f}")
-                            continue
-                        
-                        # 转换为 [x, y, width, height] 格式
-                        bbox = [
-                            float(x1),
-                            float(y1), 
-                            float(x2 - x1),
-                            float(y2 - y1)
-                        ]
-                        
-                        prediction = {
-                            'bbox': bbox,
-                            'class_id': int(class_ids[i]),
-                            'confidence': confidence
-                        }
-                        
-                        predictions.append(prediction)
-                        print(f"[Debug] 添加预测: {prediction}")
-        
+            for image_predictions in self._parse_batch(results, min_confidence):
+                predictions.extend(image_predictions or [])
+            print(f"[Debug] 添加 {len(predictions)} 个预测")
         except Exception as e:
             print(f"[Error] 解析预测结果时出错: {e}")
             
@@ -251,6 +286,7 @@ class YOLOEWrapper:
     def reset_vpe(self):
         """重置VPE"""
         self.vpe = None
+        self._prompt_key_cached = None
         if self.model:
             self.model.predictor = None
         print(f"[Debug] VPE已重置")
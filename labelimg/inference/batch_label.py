@@ -0,0 +1,155 @@
+"""Qt-free batch auto-labeling.
+
+Builds visual prompts from annotated prompt images, runs the targets
+through AutoLabelPipeline and writes their annotation files directly,
+so it works on machines without a display.
+"""
+import functools
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.box_store import BoxStore
+from ..core.image_probe import probe_image
+from ..core.manifest import ANNOTATION_EXTENSIONS, IMAGE_EXTENSIONS
+from ..io.formats import get_codec, read_annotations
+from .pipeline import AutoLabelPipeline, PipelineResult
+
+# 已处理目标图片的文件名，每行一个；--resume 时跳过这些图片（包括没有检测结果、没有写出标注文件的）
+PROGRESS_FILENAME = '.bakuflow_autolabel_done.txt'
+
+
+def load_classes(class_file: str) -> List[str]:
+    with open(class_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def list_images(directory: str) -> List[str]:
+    return sorted(entry.path for entry in os.scandir(directory)
+                  if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def annotation_file(image_path: str) -> Optional[str]:
+    """The existing per-image annotation file of ``image_path``, if any."""
+    base = os.path.splitext(image_path)[0]
+    for ext in ANNOTATION_EXTENSIONS:
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def build_visuals(prompt_images: Sequence[str], classes: Sequence[str]) -> Tuple[List[str], Dict[str, list]]:
+    """Visual prompts from the annotation files of ``prompt_images``.
+
+    Returns the prompt images that contributed boxes and
+    ``{'bboxes': [(N, 4) xyxy per image], 'cls': [(N,) class ids per image]}``
+    in the same order. Labels not in ``classes`` are skipped.
+    """
+    lookup = {name: i for i, name in enumerate(classes)}
+    used, bboxes_list, cls_list = [], [], []
+    for img_path in prompt_images:
+        label_path = annotation_file(img_path)
+        info = probe_image(img_path)
+        if label_path is None or not info.valid:
+            print(f"[Warning] 跳过提示图片（没有标注或无法读取）: {img_path}")
+            continue
+        store = read_annotations(label_path, info.width, info.height, classes, img_path)
+        if not len(store):
+            continue
+        ids = np.array([lookup.get(name, -1) for name in store.names], np.int64)[store.class_id]
+        keep = (ids >= 0) & (store.xywh[:, 2] > 0) & (store.xywh[:, 3] > 0)
+        if not keep.any():
+            continue
+        xywh = store.xywh[keep].astype(np.float32)
+        used.append(img_path)
+        bboxes_list.append(np.column_stack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]]))
+        cls_list.append(ids[keep].astype(np.int32))
+    return used, {'bboxes': bboxes_list, 'cls': cls_list}
+
+
+class BatchAutoLabeler:
+    """Label target images with a YOLOEWrapper and write their annotation files.
+
+    Images that already have an annotation file are never overwritten.
+    Every processed target is appended to the progress file (if given), so
+    ``resume=True`` continues an interrupted run where it stopped.
+    """
+
+    def __init__(self, wrapper, classes: Sequence[str], fmt: str = "YOLO", batch_size: int = 8,
+                 workers: int = 4, min_box_size: int = 1, progress_path: Optional[str] = None):
+        codec = get_codec(fmt)
+        if codec.dataset_wide:
+            raise ValueError(f"{fmt} annotations are not stored per image")
+        self.wrapper = wrapper
+        self.classes = list(classes)
+        self.codec = codec
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+        self.min_box_size = min_box_size
+        self.progress_path = progress_path
+        self.pipeline = None
+
+    def pending_targets(self, targets: Sequence[str], resume: bool = False) -> List[str]:
+        """Targets without an annotation file, minus those a previous run finished when ``resume``."""
+        done = set()
+        if resume and self.progress_path and os.path.exists(self.progress_path):
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                done = {line.strip() for line in f if line.strip()}
+        return [t for t in targets if os.path.basename(t) not in done and annotation_file(t) is None]
+
+    def cancel(self):
+        if self.pipeline is not None:
+            self.pipeline.cancel()
+
+    def _write(self, img_path: str, predictions: List[Dict[str, Any]]) -> bool:
+        info = probe_image(img_path)
+        if not info.valid:
+            return False
+        xywh = np.array([pred['bbox'] for pred in predictions], dtype=np.float64).reshape(-1, 4)
+        store = BoxStore.from_xyxy(np.column_stack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]]),
+                                   [pred['class_id'] for pred in predictions],
+                                   [pred['confidence'] for pred in predictions], self.classes)
+        known = np.isin(np.array(store.labels, dtype=object), self.classes) if len(store) else np.zeros(0, bool)
+        store = store.subset(store.valid_mask(info.width, info.height, self.min_box_size) & known)
+        if len(store):
+            self.codec.write(self.codec.path_for(img_path), store, self.classes, info.width, info.height,
+                             image_path=img_path, depth=info.channels or 3)
+        return True
+
+    def run(self, prompt_images: Sequence[str], visuals: Dict[str, list], targets: Sequence[str],
+            resume: bool = False, progress: Optional[Callable[[int, int, PipelineResult], None]] = None) -> Dict[str, Any]:
+        """Label ``targets``; ``progress(done, total, result)`` is called after each one.
+
+        Returns the pipeline stats plus ``skipped`` (targets left out because
+        they were already labeled or done).
+        """
+        pending = self.pending_targets(targets, resume)
+        if not resume and self.progress_path and os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        print(f"[Debug] 待标注 {len(pending)} 张, 跳过 {len(targets) - len(pending)} 张")
+        if not pending:
+            return {'total': 0, 'succeeded': 0, 'failed': 0, 'cancelled': False, 'skipped': len(targets)}
+
+        self.wrapper.set_visual_prompts(list(prompt_images), visuals)
+        predict = functools.partial(self.wrapper.auto_label_batch, batch_size=self.batch_size)
+        self.pipeline = AutoLabelPipeline(predict, batch_size=self.batch_size, decode_workers=self.workers,
+                                          max_side=self.wrapper.input_size)
+        done = [0]
+        progress_file = open(self.progress_path, 'a', encoding='utf-8') if self.progress_path else None
+
+        def on_result(result: PipelineResult):
+            if result.error is None and progress_file is not None:
+                progress_file.write(os.path.basename(result.item) + "\n")
+                progress_file.flush()  # 中断后也能从这里继续
+            done[0] += 1
+            if progress is not None:
+                progress(done[0], len(pending), result)
+
+        try:
+            stats = self.pipeline.run(pending, self._write, on_result)
+        finally:
+            if progress_file is not None:
+                progress_file.close()
+        stats['skipped'] = len(targets) - len(pending)
+        return stats
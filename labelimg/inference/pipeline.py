@@ -0,0 +1,254 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+_DONE = object()  # 队列结束标记
+_POLL = 0.1  # 阻塞的队列操作每隔多久检查一次取消
+
+
+class DecodedImage(NamedTuple):
+    image: Optional[np.ndarray]  # BGR, None if the file could not be read
+    scale: Tuple[float, float]  # (decoded width / original width, decoded height / original height)
+    error: Optional[str]
+
+
+class PipelineResult(NamedTuple):
+    item: str  # target image path
+    predictions: Optional[List[Dict[str, Any]]]  # in original image pixels; None on failure
+    error: Optional[str]
+
+
+def decode_image(path: str, max_side: Optional[int] = None) -> DecodedImage:
+    """Decode ``path`` as BGR, shrinking it so its long side is at most ``max_side``.
+
+    The shrink is the same ratio and interpolation the predictor's letterbox
+    uses, so doing it here moves the resize onto the decode pool and leaves
+    the inference thread only the padding.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        return DecodedImage(None, (1.0, 1.0), f"Cannot read image: {path}")
+    h, w = image.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return DecodedImage(image, (1.0, 1.0), None)
+    r = max_side / max(h, w)
+    new_w, new_h = max(1, int(round(w * r))), max(1, int(round(h * r)))
+    image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return DecodedImage(image, (new_w / w, new_h / h), None)
+
+
+def _rescale(predictions, scale):
+    if scale == (1.0, 1.0):
+        return predictions
+    sx, sy = scale
+    for pred in predictions:
+        x, y, w, h = pred['bbox']
+        pred['bbox'] = [x / sx, y / sy, w / sx, h / sy]
+    return predictions
+
+
+class AutoLabelPipeline:
+    """Batch auto-labeling as overlapped stages joined by bounded queues.
+
+    decode (thread pool) -> infer (one thread, ``batch_size`` images per
+    ``predict_batch`` call) -> consumer (the thread iterating ``results``, or
+    the I/O loop of ``run``). Each queue holds at most ``queue_batches``
+    batches, so memory stays bounded and the wall time approaches that of
+    the slowest stage instead of the sum of all of them. ``pause`` holds
+    inference and the consumer between batches / results; a cancelled
+    pipeline stays cancelled.
+
+    ``predict_batch(images)`` takes a list of BGR arrays and returns one
+    prediction list (dicts with bbox/class_id/confidence, as returned by
+    YOLOEWrapper.auto_label_batch) or None per image.
+    """
+
+    def __init__(self, predict_batch: Callable[[List[np.ndarray]], List[Optional[List[Dict[str, Any]]]]],
+                 batch_size: int = 8, decode_workers: int = 4, queue_batches: int = 2,
+                 max_side: Optional[int] = None, decode: Callable[..., DecodedImage] = decode_image):
+        self.predict_batch = predict_batch
+        self.batch_size = max(1, int(batch_size))
+        self.decode_workers = max(1, int(decode_workers))
+        self.queue_batches = max(1, int(queue_batches))
+        self.max_side = max_side
+        self.decode = decode
+        self.timings: Dict[str, float] = {}
+        self._cancel = threading.Event()
+        self._stop = threading.Event()  # 取消或消费者提前结束时通知各阶段退出
+        self._resume = threading.Event()
+        self._resume.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self._stop.set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resume.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _put(self, q, item) -> bool:
+        """Blocking put that gives up when the run is stopped."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _wait_if_paused(self):
+        while not self._resume.wait(_POLL):
+            if self._stop.is_set():
+                return
+
+    def _timed_decode(self, path):
+        start = time.perf_counter()
+        try:
+            decoded = self.decode(path, self.max_side)
+        except Exception as e:
+            decoded = DecodedImage(None, (1.0, 1.0), str(e))
+        return decoded, time.perf_counter() - start
+
+    def _feed(self, targets, pool, decoded_q, errors):
+        try:
+            for path in targets:
+                if not self._put(decoded_q, (path, pool.submit(self._timed_decode, path))):
+                    return
+        except Exception as e:
+            errors.append(e)
+            self._stop.set()
+        finally:
+            self._put(decoded_q, _DONE)
+
+    def _infer_batch(self, batch) -> List[PipelineResult]:
+        decoded = []
+        for path, future in batch:
+            image, seconds = future.result()
+            self.timings['decode'] += seconds
+            decoded.append((path, image))
+        valid = [(path, d) for path, d in decoded if d.image is not None]
+        start = time.perf_counter()
+        try:
+            predictions = self.predict_batch([d.image for _, d in valid]) if valid else []
+            error = None
+        except Exception as e:
+            print(f"[Error] 批量推理失败: {e}")
+            predictions, error = [None] * len(valid), str(e)
+        self.timings['infer'] += time.perf_counter() - start
+
+        results = [PipelineResult(path, None, d.error) for path, d in decoded]
+        valid_rows = [i for i, (_, d) in enumerate(decoded) if d.image is not None]
+        for i, (path, d), preds in zip(valid_rows, valid, predictions):
+            results[i] = (PipelineResult(path, _rescale(preds, d.scale), None) if preds is not None
+                          else PipelineResult(path, None, error or f"Prediction failed: {path}"))
+        return results
+
+    def _infer(self, decoded_q, out_q, errors):
+        try:
+            batch = []
+            while not self._stop.is_set():
+                try:
+                    entry = decoded_q.get(timeout=_POLL)
+                except queue.Empty:
+                    continue
+                if entry is not _DONE:
+                    batch.append(entry)
+                if batch and (entry is _DONE or len(batch) >= self.batch_size):
+                    self._wait_if_paused()
+                    if not self._put(out_q, self._infer_batch(batch)):
+                        break
+                    batch = []
+                if entry is _DONE:
+                    break
+        except Exception as e:
+            errors.append(e)
+            self._stop.set()
+        finally:
+            out_q.put(_DONE)  # 消费者一直在取，不会阻塞太久
+
+    def results(self, targets: Sequence[str]) -> Iterator[PipelineResult]:
+        """Yield one PipelineResult per target, in order, while later batches decode and infer.
+
+        Stopping the iteration early (or ``cancel``) stops the stages and
+        waits for their threads; errors raised inside a stage are re-raised here.
+        """
+        if not self._cancel.is_set():
+            self._stop.clear()
+        self.timings = {'decode': 0.0, 'infer': 0.0, 'consume': 0.0}
+        decoded_q = queue.Queue(maxsize=self.batch_size * self.queue_batches)
+        out_q = queue.Queue(maxsize=self.queue_batches)
+        errors = []
+        pool = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix='autolabel-decode')
+        feeder = threading.Thread(target=self._feed, args=(targets, pool, decoded_q, errors),
+                                  name='autolabel-feed', daemon=True)
+        infer = threading.Thread(target=self._infer, args=(decoded_q, out_q, errors),
+                                 name='autolabel-infer', daemon=True)
+        feeder.start()
+        infer.start()
+        try:
+            while True:
+                batch = out_q.get()
+                if batch is _DONE:
+                    break
+                for result in batch:
+                    self._wait_if_paused()
+                    if self._cancel.is_set():
+                        return
+                    start = time.perf_counter()
+                    yield result
+                    self.timings['consume'] += time.perf_counter() - start
+        finally:
+            self._stop.set()  # 提前结束时让各阶段退出
+            while infer.is_alive():
+                try:
+                    out_q.get(timeout=_POLL)
+                except queue.Empty:
+                    pass
+            feeder.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+        if errors:
+            raise errors[0]
+
+    def run(self, targets: Sequence[str], write: Callable[[str, List[Dict[str, Any]]], bool],
+            on_result: Optional[Callable[[PipelineResult], None]] = None) -> Dict[str, Any]:
+        """Label every target, calling ``write(path, predictions)`` on this thread as results arrive.
+
+        ``write`` returns False on failure. Returns counts and per-stage busy
+        seconds; decode seconds are summed over the pool threads.
+        """
+        wall = time.perf_counter()
+        succeeded = failed = 0
+        for result in self.results(targets):
+            if result.predictions is not None:
+                try:
+                    if not write(result.item, result.predictions):
+                        result = result._replace(error=f"Write failed: {result.item}")
+                except Exception as e:
+                    result = result._replace(error=str(e))
+            if result.error is None:
+                succeeded += 1
+            else:
+                failed += 1
+                print(f"[Debug] 自动标注失败: {result.error}")
+            if on_result is not None:
+                on_result(result)
+        stats = {'total': len(targets), 'succeeded': succeeded, 'failed': failed,
+                 'cancelled': self.cancelled,
+                 'wall': time.perf_counter() - wall}
+        stats.update(self.timings)
+        return stats
@@ -0,0 +1,168 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.box_store import BoxStore, UNKNOWN_LABEL
+from ..core.image_probe import probe_image
+from .formats import get_codec
+from .yolo import YoloCodec, read_yolo_rows
+
+_CHUNK = 256  # 每个线程任务处理的图片数
+
+
+class AnnotationTable:
+    """Columnar annotations of a whole image list, one row per box.
+
+    Rows ``offsets[i]:offsets[i + 1]`` belong to image ``i``; ``class_id``
+    indexes ``names``. ``has_file[i]`` tells whether image ``i`` has an
+    annotation file (possibly with no boxes) and ``sizes[i]`` is its
+    (width, height), (0, 0) if unknown.
+    """
+
+    def __init__(self, names: Sequence[str], offsets, xywh, class_id, has_file, sizes):
+        self.names: List[str] = list(names)
+        self.offsets = np.asarray(offsets, np.int64)
+        self.xywh = np.asarray(xywh, np.int32).reshape(-1, 4)
+        self.class_id = np.asarray(class_id, np.int32)
+        self.has_file = np.asarray(has_file, bool)
+        self.sizes = np.asarray(sizes, np.int32).reshape(-1, 2)
+
+    def __len__(self):
+        """Number of images."""
+        return len(self.offsets) - 1
+
+    @property
+    def box_counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def image_index(self) -> np.ndarray:
+        """Image index of every row."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), self.box_counts)
+
+    def labeled_indices(self) -> List[int]:
+        return np.flatnonzero(self.has_file).tolist()
+
+    def class_counts(self) -> np.ndarray:
+        return np.bincount(self.class_id, minlength=len(self.names))
+
+    def store(self, index: int) -> BoxStore:
+        """Boxes of one image; the arrays are views into the table."""
+        lo, hi = self.offsets[index], self.offsets[index + 1]
+        return BoxStore(self.names, self.xywh[lo:hi], self.class_id[lo:hi])
+
+    def to_label_cache(self) -> Dict[int, BoxStore]:
+        """``{image index: BoxStore}`` for every image with an annotation file."""
+        return {i: self.store(i) for i in self.labeled_indices()}
+
+
+def _image_size(img_path, size_lookup) -> Optional[Tuple[int, int]]:
+    size = size_lookup(img_path) if size_lookup is not None else None
+    if size is None:
+        info = probe_image(img_path)  # 清单中没有时只读文件头
+        size = (info.width, info.height) if info.valid else None
+    return size
+
+
+def _read_chunk(image_paths, start, codec, classes, size_lookup, cancel=None):
+    """Runs on a pool thread: (size, rows or BoxStore or None) for each image of one chunk."""
+    results = []
+    for img_path in image_paths:
+        if cancel is not None and cancel.is_set():
+            break  # 结果会被丢弃
+        label_path = codec.path_for(img_path)
+        if not os.path.exists(label_path):
+            results.append((None, None))
+            continue
+        size = _image_size(img_path, size_lookup)
+        if size is None:
+            print(f"[Debug] 无法获取图片尺寸，跳过: {img_path}")
+            results.append((None, None))
+            continue
+        try:
+            if isinstance(codec, YoloCodec):
+                data = read_yolo_rows(label_path)
+            else:
+                data = codec.read(label_path, size[0], size[1], classes, img_path)
+        except Exception as e:
+            print(f"Error loading annotations: {label_path} - {str(e)}")
+            data = None
+        results.append((size, data))
+    return start, results
+
+
+def load_annotation_table(image_paths: Sequence[str], classes: Sequence[str],
+                          size_lookup: Optional[Callable[[str], Optional[Tuple[int, int]]]] = None,
+                          fmt: str = "YOLO", workers: Optional[int] = None,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          cancel: Optional[threading.Event] = None) -> Optional[AnnotationTable]:
+    """Read the annotation files of every image in parallel into one AnnotationTable.
+
+    Image sizes come from ``size_lookup`` (e.g. the manifest), else from the
+    file header; nothing is decoded. YOLO rows are converted to pixels for
+    the whole dataset in one vectorized pass. ``progress(done, total)`` is
+    called from the calling thread as chunks complete. Setting ``cancel``
+    stops the pool threads at the next file and returns None.
+    """
+    codec = get_codec(fmt)
+    if codec.dataset_wide:
+        raise ValueError(f"{fmt} annotations are not stored per image")
+    total = len(image_paths)
+    workers = workers or min(16, (os.cpu_count() or 4) * 2)
+    sizes = np.zeros((total, 2), np.int32)
+    has_file = np.zeros(total, bool)
+    parts: List[Optional[object]] = [None] * total
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='annotation-loader') as pool:
+        futures = [pool.submit(_read_chunk, image_paths[start:start + _CHUNK], start, codec, classes, size_lookup,
+                               cancel)
+                   for start in range(0, total, _CHUNK)]
+        done = 0
+        for future in futures:
+            start, results = future.result()
+            if cancel is not None and cancel.is_set():
+                for pending in futures:
+                    pending.cancel()
+                print("[Debug] 批量读取标注已取消")
+                return None
+            for i, (size, data) in enumerate(results, start):
+                if data is not None:
+                    sizes[i] = size
+                    has_file[i] = True
+                    parts[i] = data
+            done += len(results)
+            if progress is not None:
+                progress(done, total)
+
+    names = list(classes)
+    counts = np.array([len(p) if p is not None else 0 for p in parts], np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    if isinstance(codec, YoloCodec):
+        rows = np.concatenate([p for p in parts if p is not None and len(p)] or [np.zeros((0, 5))])
+        wh = np.repeat(sizes, counts, axis=0).astype(np.float64)
+        # 与 BoxStore.from_yolo 相同的换算和截断
+        xywh = np.column_stack([(rows[:, 1] - rows[:, 3] / 2) * wh[:, 0], (rows[:, 2] - rows[:, 4] / 2) * wh[:, 1],
+                                rows[:, 3] * wh[:, 0], rows[:, 4] * wh[:, 1]]).astype(np.int32)
+        class_id = rows[:, 0].astype(np.int32)
+        known = (class_id >= 0) & (class_id < len(names))
+        if not known.all():
+            names.append(UNKNOWN_LABEL)
+            class_id[~known] = len(names) - 1
+    else:
+        lookup = {name: i for i, name in enumerate(names)}
+        xywh_parts, class_parts = [], []
+        for store in parts:
+            if store is None or not len(store):
+                continue
+            for name in store.names:
+                lookup.setdefault(name, len(lookup))
+            remap = np.array([lookup[name] for name in store.names], np.int32)
+            xywh_parts.append(store.xywh)
+            class_parts.append(remap[store.class_id])
+        names = list(lookup)
+        xywh = np.concatenate(xywh_parts) if xywh_parts else np.zeros((0, 4), np.int32)
+        class_id = np.concatenate(class_parts) if class_parts else np.zeros(0, np.int32)
+    print(f"[Debug] 批量读取标注完成: {int(has_file.sum())}/{total} 张图片有标注, 共 {len(class_id)} 个框")
+    return AnnotationTable(names, offsets, xywh, class_id, has_file, sizes)
@@ -0,0 +1,458 @@
+import json
+import os
+import re
+import threading
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.box_store import BoxStore
+from .save_queue import atomic_writer
+from .yolo import read_yolo_rows
+
+COCO_FILENAME = 'coco_annotations.json'
+
+_INFO = {"description": "BakuLabel COCO export", "version": "1.0", "year": 2024, "contributor": "BakuLabel User",
+         "date_created": ""}
+_LICENSES = [{"url": "http://creativecommons.org/licenses/by-nc-sa/2.0/", "id": 1,
+              "name": "Attribution-NonCommercial-ShareAlike License"}]
+_CHUNK = 1 << 20  # 攒够 1MB 再写一次文件
+STREAM_THRESHOLD = 64 << 20  # 超过该大小的 COCO 文件逐条流式解析，不整体 json.load
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'\s*')
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class _JsonStream:
+    """Pull parser over a text file: decodes one JSON value at a time from a sliding buffer."""
+
+    def __init__(self, f, chunk: int = _CHUNK):
+        self.f = f
+        self.chunk = chunk
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        data = self.f.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of file), without consuming it."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected: str) -> str:
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Malformed COCO JSON: expected {expected!r}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue  # 数字可能被缓冲区截断，读入更多内容后重新解析
+            self.pos = end
+            return obj
+
+
+def iter_coco(f, arrays: Sequence[str] = ('images', 'annotations', 'categories')) -> Iterator[Tuple[str, object]]:
+    """Stream a COCO file: yields (key, item) for every item of the top-level
+    ``arrays`` and (key, value) for the other top-level members.
+
+    Memory stays at one item plus the read buffer, whatever the file size.
+    """
+    stream = _JsonStream(f)
+    stream.take('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value()
+        stream.take(':')
+        if key in arrays and stream.peek() == '[':
+            stream.take('[')
+            if stream.peek() == ']':
+                stream.take(']')
+            else:
+                while True:
+                    yield key, stream.value()
+                    if stream.take(',]') == ']':
+                        break
+        else:
+            yield key, stream.value()
+        if stream.take(',}') == '}':
+            return
+
+
+class CocoIndex:
+    """Per-image lookup into a dataset-wide COCO file.
+
+    The file is parsed once into file_name -> image_id, category names and
+    image_id-sorted annotation arrays, so looking up one image costs a
+    binary search plus its own annotations. The index is rebuilt only
+    when the file's size or mtime changes; files above
+    ``STREAM_THRESHOLD`` are parsed item by item instead of loaded whole.
+    Saves made through IncrementalCocoWriter are folded in via
+    ``note_write`` without reparsing; saves still queued are served from
+    ``note_pending`` entries until they land. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.path: Optional[str] = None
+        self._stamp = None
+        # 已提交、尚未写入文件的图片 -> (条目, 序号)；排队中的保存可能被更新的保存取代，所以按序号清理
+        self._pending: Dict[Tuple[str, str], Tuple[Tuple[np.ndarray, List[str]], int]] = {}
+        self._generation = 0
+        self._clear()
+
+    def _clear(self):
+        self._image_ids: Dict[str, int] = {}  # 小写文件名 -> image_id
+        self._categories: Dict[int, str] = {}
+        self._ann_image = np.zeros(0, np.int64)
+        self._ann_xywh = np.zeros((0, 4), np.float64)
+        self._ann_category = np.zeros(0, np.int64)
+        self._overrides: Dict[str, Tuple[np.ndarray, List[str]]] = {}  # 本程序写入后更新的图片
+
+    def _load(self, path: str, stamp):
+        self._clear()
+        self.path, self._stamp = path, stamp
+        if stamp is None:
+            return
+        ann_image, ann_category, ann_xywh = array('q'), array('q'), array('d')
+        with open(path, 'r', encoding='utf-8') as f:
+            if stamp[0] > STREAM_THRESHOLD:
+                items = iter_coco(f)
+            else:
+                data = json.load(f)
+                items = ((key, item) for key in ('images', 'annotations', 'categories')
+                         for item in data.get(key, ()))
+            for key, item in items:
+                try:
+                    if key == 'annotations':
+                        x, y, w, h = item['bbox'][:4]
+                        ann_xywh.extend((x, y, w, h))
+                        ann_image.append(item['image_id'])
+                        ann_category.append(item['category_id'])
+                    elif key == 'images':
+                        self._image_ids.setdefault(str(item.get('file_name', '')).lower(), item['id'])
+                    elif key == 'categories':
+                        self._categories[item['id']] = item['name']
+                except (KeyError, TypeError, ValueError):
+                    continue  # 跳过格式不完整的条目
+        order = np.argsort(np.frombuffer(ann_image, np.int64), kind='stable')
+        self._ann_image = np.frombuffer(ann_image, np.int64)[order]
+        self._ann_xywh = np.frombuffer(ann_xywh, np.float64).reshape(-1, 4)[order]
+        self._ann_category = np.frombuffer(ann_category, np.int64)[order]
+        print(f"[Debug] COCO 索引已建立: {len(self._image_ids)} 张图片, {len(order)} 个标注")
+
+    def refresh(self, path: str) -> bool:
+        """Reparse ``path`` if it is not the indexed file or changed on disk; True if reparsed."""
+        stamp = _file_stamp(path)
+        with self._lock:
+            if path == self.path and stamp == self._stamp:
+                return False
+            self._load(path, stamp)
+            return True
+
+    def lookup(self, path: str, file_name: str) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """(N, 4) int xywh and labels of one image, or None if the file does not list it.
+
+        Category ids missing from ``categories`` come back as "unknown".
+        """
+        key = file_name.lower()
+        with self._lock:
+            pending = self._pending.get((os.path.abspath(path), key))
+        if pending is not None:
+            (xywh, labels), _ = pending
+            return xywh.copy(), list(labels)  # 不等待排队中的保存，也不重新解析文件
+        self.refresh(path)
+        with self._lock:
+            if key in self._overrides:
+                xywh, labels = self._overrides[key]
+                return xywh.copy(), list(labels)
+            image_id = self._image_ids.get(key)
+            if image_id is None:
+                return None
+            lo, hi = np.searchsorted(self._ann_image, [image_id, image_id + 1])
+            xywh = self._ann_xywh[lo:hi].astype(np.int32)  # 与 int() 一样向零截断
+            labels = [self._categories.get(c, "unknown") for c in self._ann_category[lo:hi].tolist()]
+            return xywh, labels
+
+    def note_write(self, path: str, old_stamp, new_stamp, changed: Dict[str, Tuple[np.ndarray, List[str]]]):
+        """Fold images re-serialized by a writer into the index instead of reparsing.
+
+        Only applies if the index was current for the file the writer
+        replaced (``old_stamp``); otherwise the next lookup reparses.
+        """
+        with self._lock:
+            if path != self.path or old_stamp is None or old_stamp != self._stamp:
+                return
+            for file_name, entry in changed.items():
+                self._overrides[file_name.lower()] = entry
+            self._stamp = new_stamp
+
+    def note_pending(self, path: str, file_name: str, entry: Tuple[np.ndarray, List[str]]) -> int:
+        """Serve ``entry`` for ``file_name`` until a write of ``path`` submitted after it lands.
+
+        Returns the entry's generation; pass it to ``drop_pending`` when that write finishes.
+        """
+        with self._lock:
+            self._generation += 1
+            self._pending[(os.path.abspath(path), file_name.lower())] = (entry, self._generation)
+            return self._generation
+
+    @property
+    def generation(self) -> int:
+        """Generation of the latest ``note_pending``, for writes that carry no entry of their own."""
+        with self._lock:
+            return self._generation
+
+    def drop_pending(self, path: str, generation: int):
+        """Forget the entries of ``path`` noted up to ``generation``, which the finished write covers."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k, (_, gen) in self._pending.items() if k[0] == path and gen <= generation]:
+                del self._pending[key]
+
+    def has_pending(self, path: str, file_name: str) -> bool:
+        with self._lock:
+            return (os.path.abspath(path), file_name.lower()) in self._pending
+
+
+class CocoCodec:
+    """One ``coco_annotations.json`` per image directory, read through a CocoIndex.
+
+    Writing goes through IncrementalCocoWriter, which shares ``index``.
+    """
+    name = "COCO"
+    extension = '.json'
+    dataset_wide = True
+
+    def __init__(self, index: Optional[CocoIndex] = None):
+        self.index = index if index is not None else CocoIndex()
+
+    def path_for(self, image_path: str) -> str:
+        return os.path.join(os.path.dirname(image_path), COCO_FILENAME)
+
+    def read(self, path: str, width: int, height: int, classes: Sequence[str], image_path: Optional[str] = None) -> BoxStore:
+        """Boxes of ``image_path``; labels from the file's categories are added to the store's names."""
+        store = BoxStore(classes)
+        found = self.index.lookup(path, os.path.basename(image_path or ''))
+        if found is None:
+            print(f"Warning: Image {os.path.basename(image_path or '')} not found in COCO json file {path}")
+            return store
+        xywh, labels = found
+        return BoxStore(store.names, xywh, [store.class_index(label) for label in labels])
+
+
+class _Fragment:
+    """Pre-serialized COCO entries of one image, minus the ids assigned at write time."""
+    __slots__ = ('stamp', 'size', 'image', 'annotations', 'count')
+
+    def __init__(self, stamp, size, image: bytes, annotations: bytes, count: int):
+        self.stamp = stamp  # YOLO .txt 的 (大小, 修改时间)，变化时重建
+        self.size = size
+        self.image = image
+        self.annotations = annotations  # 每个标注以 '{"id":%d,"image_id":%d,' 开头的模板
+        self.count = count
+
+
+class IncrementalCocoWriter:
+    """Keeps the dataset-wide COCO JSON up to date without rebuilding it.
+
+    Each image's ``images``/``annotations`` entries are serialized once and
+    kept in memory together with the stamp of the YOLO .txt they came from.
+    A write only re-parses images whose .txt changed (plus the current
+    image, passed in from memory), takes dimensions from ``size_lookup``
+    (the manifest) and streams the compact JSON into place. Image ids are
+    list positions and annotation ids are numbered at write time, so the
+    output matches a full rebuild. Not thread-safe: use from one thread,
+    except ``stage``, which may be called from any thread.
+
+    With an ``index`` (a CocoIndex) the re-serialized images are passed on
+    after each write, so reading the file back does not reparse it.
+    """
+
+    def __init__(self, size_lookup: Callable[[str], Optional[Tuple[int, int]]], min_box_size: int = 1,
+                 index: Optional[CocoIndex] = None):
+        self.size_lookup = size_lookup
+        self.min_box_size = min_box_size
+        self.index = index
+        self._fragments: Dict[str, _Fragment] = {}
+        self._classes: Tuple[str, ...] = ()
+        self._written_stamp = None  # 上次写出的文件，用于判断文件是否被外部改动
+        self._changed: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        self._staged: Dict[str, tuple] = {}  # 等待下次写入的内存快照，排队的保存被取代时也不会丢失
+        self._staged_lock = threading.Lock()
+
+    def stage(self, img_path: str, store: BoxStore, width: int, height: int):
+        """Take ``img_path``'s boxes from memory in the next ``write`` instead of from its .txt."""
+        with self._staged_lock:
+            self._staged[img_path] = (store, width, height)
+
+    def reset(self):
+        self._fragments.clear()
+        self._written_stamp = None
+
+    def __len__(self):
+        return len(self._fragments)
+
+    # --- fragments ----------------------------------------------------
+    def _filter(self, store: BoxStore, classes: Sequence[str]):
+        """Category ids of ``store``'s boxes in ``classes`` and the mask of boxes that get exported."""
+        lookup = {name: i for i, name in enumerate(classes)}
+        remap = np.array([lookup.get(name, -1) for name in store.names] + [-1], np.int32)
+        category = remap[store.class_id]
+        xywh = store.xywh
+        keep = (category >= 0) & (xywh[:, 2] >= self.min_box_size) & (xywh[:, 3] >= self.min_box_size)
+        return category, keep
+
+    def entry_for(self, store: BoxStore, classes: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+        """(xywh, labels) of ``store`` as the written file will list them, for CocoIndex.note_pending."""
+        category, keep = self._filter(store, classes)
+        return store.xywh[keep].copy(), [classes[c] for c in category[keep].tolist()]
+
+    def _build(self, img_path: str, store: BoxStore, classes: Sequence[str], width: int, height: int, stamp):
+        category, keep = self._filter(store, classes)
+        xywh = store.xywh
+        # 坐标都是整数，直接拼出与 float() 序列化相同的文本
+        annotations = ",".join(
+            f'{{"id":%d,"image_id":%d,"category_id":{c},"bbox":[{x}.0,{y}.0,{w}.0,{h}.0],'
+            f'"area":{w * h}.0,"iscrowd":0,"segmentation":[]}}'
+            for (x, y, w, h), c in zip(xywh[keep].tolist(), category[keep].tolist()))
+        image = (f'"file_name":{_dumps(os.path.basename(img_path))},"height":{height},"width":{width},'
+                 f'"license":1}}')
+        fragment = _Fragment(stamp, (width, height), image.encode('utf-8'), annotations.encode('utf-8'),
+                             int(keep.sum()))
+        self._fragments[img_path] = fragment
+        if self.index is not None:
+            self._changed[os.path.basename(img_path)] = (xywh[keep].copy(),
+                                                         [classes[c] for c in category[keep].tolist()])
+        return fragment
+
+    def _from_yolo(self, img_path: str, classes: Sequence[str], stamp, size):
+        if size is None:
+            size = self.size_lookup(img_path)
+            if size is None or not size[0] or not size[1]:
+                print(f"Warning: Skipping {img_path} for COCO export, cannot read for dimensions.")
+                return None
+        rows = np.zeros((0, 5))
+        if stamp is not None:
+            try:
+                rows = read_yolo_rows(os.path.splitext(img_path)[0] + '.txt')
+            except (OSError, ValueError):
+                pass
+            rows = rows[(rows[:, 0] >= 0) & (rows[:, 0] < len(classes))]  # 跳过未知类别
+        return self._build(img_path, BoxStore.from_yolo(rows, classes, *size), classes, *size, stamp)
+
+    # --- output -------------------------------------------------------
+    def write(self, json_path: str, image_list: Sequence[str], classes: Sequence[str],
+              current: Optional[tuple] = None) -> Tuple[int, int]:
+        """Refresh changed images and stream the JSON to ``json_path``.
+
+        ``current`` is ``(img_path, BoxStore, width, height)`` for the image
+        being edited; its boxes are taken as-is instead of from its .txt.
+        Returns (images written, images re-serialized).
+        """
+        classes = tuple(classes)
+        if classes != self._classes:
+            self._fragments.clear()  # 类别表变化后 category_id 全部失效
+            self._classes = classes
+        self._changed = {}
+        rebuilt = 0
+        with self._staged_lock:
+            staged, self._staged = self._staged, {}
+        if current is not None:
+            staged[current[0]] = current[1:]
+        for img_path, (store, width, height) in staged.items():
+            self._build(img_path, store, classes, width, height,
+                        _file_stamp(os.path.splitext(img_path)[0] + '.txt'))
+            rebuilt += 1
+        fragments = []
+        for img_path in image_list:
+            stamp = _file_stamp(os.path.splitext(img_path)[0] + '.txt')
+            fragment = self._fragments.get(img_path)
+            if fragment is None or fragment.stamp != stamp:
+                fragment = self._from_yolo(img_path, classes, stamp, fragment.size if fragment else None)
+                rebuilt += 1
+            fragments.append(fragment)
+        if len(self._fragments) > len(image_list):
+            listed = set(image_list)
+            for img_path in [p for p in self._fragments if p not in listed]:
+                del self._fragments[img_path]
+
+        old_stamp = _file_stamp(json_path)
+        with atomic_writer(json_path) as f:
+            self._stream(f, fragments, classes)
+        new_stamp = _file_stamp(json_path)
+        if self.index is not None and (old_stamp == self._written_stamp or rebuilt >= len(fragments)):
+            # 未改动的图片与索引中的内容一致，只需把重新生成的图片交给索引
+            self.index.note_write(json_path, old_stamp, new_stamp, self._changed)
+        self._written_stamp = new_stamp
+        self._changed = {}
+        written = sum(fragment is not None for fragment in fragments)
+        print(f"[Debug] COCO 标注已写入 {json_path}: {written} 张图片，重新生成 {rebuilt} 张")
+        return written, rebuilt
+
+    @staticmethod
+    def _stream(f, fragments, classes):
+        categories = [{"id": i, "name": name, "supercategory": "object"} for i, name in enumerate(classes)]
+        f.write(('{"info":' + _dumps(_INFO) + ',"licenses":' + _dumps(_LICENSES) + ',"images":[').encode('utf-8'))
+        parts, pending, sep = [], 0, b''
+        for image_id, fragment in enumerate(fragments):
+            if fragment is None:
+                continue
+            part = sep + b'{"id":%d,' % image_id + fragment.image
+            parts.append(part)
+            pending += len(part)
+            sep = b','
+            if pending >= _CHUNK:
+                f.write(b''.join(parts))
+                parts, pending = [], 0
+        parts.append(b'],"annotations":[')
+        next_id, sep = 1, b''
+        for image_id, fragment in enumerate(fragments):
+            if fragment is None or not fragment.count:
+                continue
+            ids = [image_id] * (2 * fragment.count)
+            ids[::2] = range(next_id, next_id + fragment.count)
+            part = sep + fragment.annotations % tuple(ids)
+            parts.append(part)
+            pending += len(part)
+            next_id += fragment.count
+            sep = b','
+            if pending >= _CHUNK:
+                f.write(b''.join(parts))
+                parts, pending = [], 0
+        parts.append(('],"categories":' + _dumps(categories) + '}').encode('utf-8'))
+        f.write(b''.join(parts))
@@ -0,0 +1,62 @@
+"""Registry of annotation file formats.
+
+A codec has ``name`` (as shown in the format combo box), ``extension``,
+``dataset_wide``, ``path_for(image_path)`` and
+``read(path, width, height, classes, image_path=None) -> BoxStore``.
+Per-image codecs also have ``encode(store, classes, width, height,
+min_size=None, **meta)`` and ``write(path, ...)``; a dataset-wide COCO
+file is written by IncrementalCocoWriter instead.
+"""
+import os
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from ..core.box_store import BoxStore
+from .coco import CocoCodec
+from .voc import VocCodec
+from .yolo import YoloCodec
+
+_CODECS: 'OrderedDict[str, object]' = OrderedDict()
+
+
+def register_codec(codec):
+    """Add (or replace) the codec for ``codec.name``."""
+    _CODECS[codec.name] = codec
+
+
+def get_codec(name: str):
+    try:
+        return _CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown annotation format: {name}") from None
+
+
+def codec_for_path(path: str):
+    """Codec whose files use the extension of ``path``."""
+    ext = os.path.splitext(path)[1].lower()
+    for codec in _CODECS.values():
+        if codec.extension == ext:
+            return codec
+    raise ValueError(f"Unsupported annotation file: {path}")
+
+
+def format_names() -> List[str]:
+    return list(_CODECS)
+
+
+def annotation_path(image_path: str, fmt: str) -> str:
+    return get_codec(fmt).path_for(image_path)
+
+
+def read_annotations(path: str, width: int, height: int, classes: Sequence[str],
+                     image_path: Optional[str] = None) -> BoxStore:
+    """Parse any registered annotation file into a BoxStore.
+
+    Does not touch window state, so it is safe to call from worker threads.
+    """
+    return codec_for_path(path).read(path, width, height, classes, image_path)
+
+
+register_codec(YoloCodec())
+register_codec(VocCodec())
+register_codec(CocoCodec())
@@ -0,0 +1,129 @@
+import contextlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Union
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _umask()  # 进程启动时读一次，os.umask 不是线程安全的
+
+
+@contextlib.contextmanager
+def atomic_writer(path: str):
+    """Binary file object for streaming into a temp file that replaces ``path`` on success.
+
+    Readers see either the old or the new file, never a half-written one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp 建的是 0600，改回原文件的权限（新文件则按 umask），和 open(path, 'w') 一致
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path: str, data: Union[str, bytes], encoding: str = 'utf-8'):
+    """Write ``data`` to a temp file next to ``path`` and rename it into place."""
+    with atomic_writer(path) as f:
+        f.write(data.encode(encoding) if isinstance(data, str) else data)
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SaveQueue:
+    """Write-behind queue that runs annotation saves on one background thread.
+
+    Jobs are keyed by target file: submitting a key that is still waiting
+    replaces the older job, so a burst of autosaves of the same image
+    writes the file once. Jobs run in submission order. Exceptions are
+    passed to ``on_error(key, exc)`` on the worker thread.
+    """
+
+    def __init__(self, on_error: Optional[Callable[[str, Exception], None]] = None):
+        self.on_error = on_error
+        self._pending: 'OrderedDict[str, Callable[[], None]]' = OrderedDict()
+        self._running: Optional[str] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='save-queue', daemon=True)
+        self._thread.start()
+
+    def submit(self, key: str, job: Callable[[], None]):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SaveQueue is shut down")
+            self._pending.pop(key, None)  # 同一文件只保留最新的一次保存
+            self._pending[key] = job
+            self._cond.notify_all()
+
+    def is_pending(self, key: str) -> bool:
+        with self._cond:
+            return key in self._pending or key == self._running
+
+    def wait_for(self, keys: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """Block until none of ``keys`` is queued or being written; False on timeout."""
+        keys = set(keys)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._running not in keys and not keys & self._pending.keys(),
+                                       timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued save has been written; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and self._running is None, timeout)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Write everything still queued, then stop the worker thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending) + (self._running is not None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return  # closed and drained
+                key, job = self._pending.popitem(last=False)
+                self._running = key
+            try:
+                job()
+            except Exception as e:
+                print(f"[Error] 保存 {key} 失败: {e}")
+                if self.on_error is not None:
+                    self.on_error(key, e)
+            finally:
+                with self._cond:
+                    self._running = None
+                    self._cond.notify_all()
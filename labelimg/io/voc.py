@@ -0,0 +1,79 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import Optional, Sequence
+
+from ..core.box_store import BoxStore, UNKNOWN_LABEL
+from .save_queue import atomic_write
+
+
+class VocCodec:
+    """One Pascal VOC ``<image stem>.xml`` per image with absolute corner coordinates."""
+    name = "VOC"
+    extension = '.xml'
+    dataset_wide = False
+
+    def path_for(self, image_path: str) -> str:
+        return os.path.splitext(image_path)[0] + self.extension
+
+    def read(self, path: str, width: int, height: int, classes: Sequence[str], image_path: Optional[str] = None) -> BoxStore:
+        """Stream the file with iterparse; each <object> is dropped once read."""
+        store = BoxStore(classes)
+        xywh, class_ids = [], []
+        for _, elem in ET.iterparse(path, events=('end',)):
+            if elem.tag != 'object':
+                continue
+            bndbox = elem.find('bndbox')
+            try:
+                xmin, ymin, xmax, ymax = (int(float(bndbox.findtext(tag)))
+                                          for tag in ('xmin', 'ymin', 'xmax', 'ymax'))
+            except (AttributeError, TypeError, ValueError):
+                print(f"Warning: Skipping malformed VOC object in {path}")
+            else:
+                xywh.append((xmin, ymin, xmax - xmin, ymax - ymin))
+                class_ids.append(store.class_index(elem.findtext('name') or UNKNOWN_LABEL))
+            elem.clear()
+        return BoxStore(store.names, xywh, class_ids)
+
+    def encode(self, store: BoxStore, classes: Sequence[str], width: int, height: int,
+               min_size: Optional[int] = None, image_path: str = "", depth: int = 3) -> str:
+        """Pretty-printed XML; every label is written, ``classes`` is not consulted."""
+        annotation = ET.Element('annotation')
+        ET.SubElement(annotation, 'folder').text = os.path.basename(os.path.dirname(image_path))
+        ET.SubElement(annotation, 'filename').text = os.path.basename(image_path)
+        # Add path for VOC, often useful
+        ET.SubElement(annotation, 'path').text = image_path
+
+        source = ET.SubElement(annotation, 'source')
+        ET.SubElement(source, 'database').text = 'Unknown' # Or a project name
+
+        size = ET.SubElement(annotation, 'size')
+        ET.SubElement(size, 'width').text = str(width)
+        ET.SubElement(size, 'height').text = str(height)
+        ET.SubElement(size, 'depth').text = str(depth)
+
+        ET.SubElement(annotation, 'segmented').text = '0' # Standard for object detection
+
+        if min_size is not None:
+            store = store.subset((store.xywh[:, 2] >= min_size) & (store.xywh[:, 3] >= min_size))
+        for (x, y, w, h), label in zip(store.xywh.tolist(), store.labels):
+            obj = ET.SubElement(annotation, 'object')
+            ET.SubElement(obj, 'name').text = label
+            ET.SubElement(obj, 'pose').text = 'Unspecified'
+            ET.SubElement(obj, 'truncated').text = '0' # Heuristic: if box touches image edge, it might be truncated
+            ET.SubElement(obj, 'difficult').text = '0'
+            bndbox = ET.SubElement(obj, 'bndbox')
+            ET.SubElement(bndbox, 'xmin').text = str(x)
+            ET.SubElement(bndbox, 'ymin').text = str(y)
+            ET.SubElement(bndbox, 'xmax').text = str(x + w)
+            ET.SubElement(bndbox, 'ymax').text = str(y + h)
+
+        xml_bytes = ET.tostring(annotation, 'utf-8')
+        try:
+            from xml.dom import minidom
+            return minidom.parseString(xml_bytes).toprettyxml(indent="  ")
+        except ImportError:
+            return "<?xml version='1.0' encoding='utf-8'?>\n" + xml_bytes.decode('utf-8')
+
+    def write(self, path: str, store: BoxStore, classes: Sequence[str], width: int, height: int,
+              min_size: Optional[int] = None, **meta):
+        atomic_write(path, self.encode(store, classes, width, height, min_size, **meta))
@@ -0,0 +1,77 @@
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+
+from ..core.box_store import BoxStore
+from .save_queue import atomic_write
+
+
+def read_yolo_rows(path: str) -> np.ndarray:
+    """Parse a YOLO .txt file into an (N, 5) float array, skipping malformed lines.
+
+    A line is kept only if it has exactly 5 numbers and a non-negative
+    integer class id.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    lines = [line for line in text.splitlines() if line.strip()]
+    split = [line.split() for line in lines]
+    if all(len(parts) == 5 for parts in split):
+        # 常见情况：每行正好 5 列，一次性转换
+        try:
+            rows = np.array(split, dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            rows = None  # 有非数字内容，逐行解析并记录
+        if rows is not None:
+            bad = (rows[:, 0] != np.floor(rows[:, 0])) | (rows[:, 0] < 0)
+            for i in np.flatnonzero(bad).tolist():
+                print(f"Error parsing YOLO line: {lines[i]} - invalid class id")
+            return rows[~bad]
+    rows = []
+    for line, parts in zip(lines, split):
+        if len(parts) != 5:
+            print(f"Error parsing YOLO line: {line} - expected 5 values, got {len(parts)}")
+            continue
+        try:
+            class_id = int(parts[0])
+            if class_id < 0:
+                raise ValueError("invalid class id")
+            rows.append([class_id] + [float(p) for p in parts[1:]])
+        except ValueError as e:
+            print(f"Error parsing YOLO line: {line} - {str(e)}")
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def format_yolo(class_idx, norm) -> str:
+    """YOLO .txt text for class indices and (N, 4) normalized xc/yc/w/h rows."""
+    return "".join(f"{c} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n"
+                   for c, (xc, yc, w, h) in zip(np.asarray(class_idx).tolist(), np.asarray(norm).tolist()))
+
+
+class YoloCodec:
+    """One ``<image stem>.txt`` per image: ``class xc yc w h`` normalized rows."""
+    name = "YOLO"
+    extension = '.txt'
+    dataset_wide = False
+
+    def path_for(self, image_path: str) -> str:
+        return os.path.splitext(image_path)[0] + self.extension
+
+    def read(self, path: str, width: int, height: int, classes: Sequence[str], image_path: Optional[str] = None) -> BoxStore:
+        return BoxStore.from_yolo(read_yolo_rows(path), classes, width, height)
+
+    def encode(self, store: BoxStore, classes: Sequence[str], width: int, height: int,
+               min_size: Optional[int] = None, **_) -> str:
+        """Text for the boxes whose label is in ``classes``.
+
+        With ``min_size`` boxes smaller than that or not fully inside the
+        image are dropped as well.
+        """
+        if min_size is not None:
+            store = store.subset(store.valid_mask(width, height, min_size))
+        return format_yolo(*store.to_yolo(classes, width, height))
+
+    def write(self, path: str, store: BoxStore, classes: Sequence[str], width: int, height: int,
+              min_size: Optional[int] = None, **meta):
+        atomic_write(path, self.encode(store, classes, width, height, min_size, **meta))
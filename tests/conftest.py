@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 直接从源码目录导入 labelimg，不需要先安装
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,116 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from labelimg.core.box_store import BoxStore
+from labelimg.io import coco
+from labelimg.io.coco import CocoCodec, CocoIndex, IncrementalCocoWriter, iter_coco
+
+DATA = {
+    "info": {"description": "test", "nested": {"list": [1, 2.5, "x\"y, ]}"]}},
+    "images": [{"id": 3, "file_name": "B.jpg", "width": 10, "height": 10},
+               {"id": 7, "file_name": "a.jpg", "width": 10, "height": 10},
+               {"id": 9, "file_name": "empty.jpg", "width": 10, "height": 10}],
+    "annotations": [{"id": 1, "image_id": 7, "category_id": 2, "bbox": [1.9, 2.0, 3.0, 4.0]},
+                    {"id": 2, "image_id": 3, "category_id": 1, "bbox": [5, 6, 7, 8]},
+                    {"id": 3, "image_id": 7, "category_id": 5, "bbox": [0, 0, 1, 1]},
+                    {"id": 4, "image_id": 7}],
+    "categories": [{"id": 1, "name": "cat"}, {"id": 2, "name": "dog"}],
+    "licenses": [],
+}
+
+
+def dump(path, data, **kwargs):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **kwargs)
+    return str(path)
+
+
+@pytest.fixture(params=['whole', 'stream'])
+def index(request, monkeypatch):
+    if request.param == 'stream':
+        monkeypatch.setattr(coco, 'STREAM_THRESHOLD', 0)
+    return CocoIndex()
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_iter_coco_matches_json_load(tmp_path, monkeypatch, chunk, indent):
+    path = dump(tmp_path / 'c.json', DATA, indent=indent)
+    monkeypatch.setattr(coco._JsonStream.__init__, '__defaults__', (chunk,))  # 让值跨越缓冲区边界
+    with open(path, encoding='utf-8') as f:
+        items = list(iter_coco(f))
+    expected = [(key, item) for key, value in DATA.items()
+                for item in (value if key in ('images', 'annotations', 'categories') else [value])]
+    assert items == expected
+
+
+def test_iter_coco_empty_and_malformed(tmp_path):
+    with open(dump(tmp_path / 'e.json', {}), encoding='utf-8') as f:
+        assert list(iter_coco(f)) == []
+    with open(dump(tmp_path / 'n.json', {"images": []}), encoding='utf-8') as f:
+        assert list(iter_coco(f)) == []
+    (tmp_path / 'bad.json').write_text('{"images": [{"id": 1} {"id": 2}]}')
+    with open(tmp_path / 'bad.json', encoding='utf-8') as f, pytest.raises(ValueError):
+        list(iter_coco(f))
+
+
+def test_lookup_is_case_insensitive_and_skips_broken_entries(tmp_path, index):
+    path = dump(tmp_path / 'c.json', DATA)
+    xywh, labels = index.lookup(path, 'A.JPG')
+    assert xywh.tolist() == [[1, 2, 3, 4], [0, 0, 1, 1]]
+    assert labels == ['dog', 'unknown']
+    xywh, labels = index.lookup(path, 'b.jpg')
+    assert xywh.tolist() == [[5, 6, 7, 8]] and labels == ['cat']
+    xywh, labels = index.lookup(path, 'empty.jpg')
+    assert xywh.shape == (0, 4) and labels == []
+    assert index.lookup(path, 'other.jpg') is None
+
+
+def test_refresh_reparses_only_when_the_file_changes(tmp_path, index):
+    path = dump(tmp_path / 'c.json', DATA)
+    assert index.refresh(path)
+    assert not index.refresh(path)
+    changed = dict(DATA, annotations=DATA['annotations'][:1])
+    dump(path, changed, indent=1)
+    assert index.refresh(path)
+    assert index.lookup(path, 'b.jpg')[0].shape == (0, 4)
+
+
+def test_codec_read_adds_file_labels_to_names(tmp_path):
+    path = dump(tmp_path / 'c.json', DATA)
+    store = CocoCodec(CocoIndex()).read(path, 10, 10, ['cat'], str(tmp_path / 'a.jpg'))
+    assert store.labels == ['dog', 'unknown'] and store.names[:1] == ['cat']
+
+
+def test_writer_updates_the_index_without_reparsing(tmp_path):
+    images = [str(tmp_path / name) for name in ('a.jpg', 'b.jpg')]
+    sizes = {path: (100, 100) for path in images}
+    index = CocoIndex()
+    writer = IncrementalCocoWriter(sizes.get, index=index)
+    json_path = str(tmp_path / coco.COCO_FILENAME)
+    writer.write(json_path, images, ['cat', 'dog'])
+    index.refresh(json_path)
+
+    store = BoxStore(['cat', 'dog'], [[1, 2, 3, 4]], [1])
+    writer.write(json_path, images, ['cat', 'dog'], current=(images[0], store, 100, 100))
+    assert not index.refresh(json_path)  # note_write 已把索引对齐到新文件
+    xywh, labels = index.lookup(json_path, 'a.jpg')
+    assert xywh.tolist() == [[1, 2, 3, 4]] and labels == ['dog']
+    assert CocoIndex().lookup(json_path, 'a.jpg')[0].tolist() == xywh.tolist()
+
+
+def test_pending_entries_are_served_until_a_later_write_lands(tmp_path):
+    json_path = str(tmp_path / coco.COCO_FILENAME)
+    index = CocoIndex()
+    entry = (np.array([[1, 1, 2, 2]], np.int32), ['cat'])
+    first = index.note_pending(json_path, 'a.jpg', entry)
+    assert index.has_pending(os.path.join(str(tmp_path), '.', coco.COCO_FILENAME), 'A.jpg')
+    assert index.lookup(json_path, 'a.jpg')[1] == ['cat']  # 文件还不存在
+    second = index.note_pending(json_path, 'b.jpg', entry)
+    index.drop_pending(json_path, first)
+    assert not index.has_pending(json_path, 'a.jpg') and index.has_pending(json_path, 'b.jpg')
+    index.drop_pending(json_path, second)
+    assert index.lookup(json_path, 'b.jpg') is None
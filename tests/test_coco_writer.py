@@ -0,0 +1,118 @@
+import json
+import os
+
+import pytest
+
+from labelimg.core.box_store import BoxStore
+from labelimg.io.coco import IncrementalCocoWriter
+
+CLASSES = ['cat', 'dog']
+SIZES = {'a.jpg': (100, 50), 'b.jpg': (200, 100), 'c.jpg': (64, 64)}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    images = [str(tmp_path / name) for name in SIZES]
+    write_txt(images[0], '0 0.5 0.5 0.2 0.2\n1 0.1 0.1 0.1 0.1\n')
+    write_txt(images[1], '1 0.25 0.25 0.5 0.5\n')
+    # c.jpg 没有标注文件
+    return tmp_path, images
+
+
+def write_txt(img_path, text):
+    with open(os.path.splitext(img_path)[0] + '.txt', 'w') as f:
+        f.write(text)
+
+
+def new_writer(**kwargs):
+    return IncrementalCocoWriter(lambda path: SIZES.get(os.path.basename(path)), **kwargs)
+
+
+def write(writer, json_path, images, classes=CLASSES, current=None):
+    result = writer.write(json_path, images, classes, current)
+    with open(json_path, 'rb') as f:
+        return result, f.read()
+
+
+def test_output_lists_every_image_with_sequential_ids(dataset):
+    tmp_path, images = dataset
+    json_path = str(tmp_path / 'coco.json')
+    (written, rebuilt), data = write(new_writer(), json_path, images)
+    coco = json.loads(data)
+    assert (written, rebuilt) == (3, 3)
+    assert [(i['id'], i['file_name'], i['width'], i['height']) for i in coco['images']] == [
+        (0, 'a.jpg', 100, 50), (1, 'b.jpg', 200, 100), (2, 'c.jpg', 64, 64)]
+    assert [a['id'] for a in coco['annotations']] == [1, 2, 3]
+    assert [(a['image_id'], a['category_id'], a['bbox']) for a in coco['annotations']] == [
+        (0, 0, [40.0, 20.0, 20.0, 10.0]), (0, 1, [5.0, 2.0, 10.0, 5.0]), (1, 1, [0.0, 0.0, 100.0, 50.0])]
+    assert [c['name'] for c in coco['categories']] == CLASSES
+
+
+def test_incremental_write_matches_a_full_rebuild(dataset):
+    tmp_path, images = dataset
+    json_path = str(tmp_path / 'coco.json')
+    writer = new_writer()
+    write(writer, json_path, images)
+    write_txt(images[1], '0 0.5 0.5 0.25 0.25\n0 0.75 0.75 0.1 0.1\n')
+    write_txt(images[2], '1 0.5 0.5 0.5 0.5\n')
+    (_, rebuilt), incremental = write(writer, json_path, images)
+    assert rebuilt == 2
+    (_, rebuilt), unchanged = write(writer, json_path, images)
+    assert rebuilt == 0 and unchanged == incremental
+    _, full = write(new_writer(), str(tmp_path / 'full.json'), images)
+    assert incremental == full
+
+
+def test_current_image_comes_from_memory(dataset):
+    tmp_path, images = dataset
+    json_path = str(tmp_path / 'coco.json')
+    writer = new_writer()
+    store = BoxStore(CLASSES, [[1, 2, 3, 4]], [1])
+    _, data = write(writer, json_path, images, current=(images[2], store, 64, 64))
+    anns = [a for a in json.loads(data)['annotations'] if a['image_id'] == 2]
+    assert [(a['category_id'], a['bbox']) for a in anns] == [(1, [1.0, 2.0, 3.0, 4.0])]
+
+
+def test_staged_snapshots_survive_until_the_next_write(dataset):
+    tmp_path, images = dataset
+    json_path = str(tmp_path / 'coco.json')
+    writer = new_writer()
+    writer.stage(images[0], BoxStore(CLASSES, [[7, 7, 7, 7]], [0]), 100, 50)
+    writer.stage(images[2], BoxStore(CLASSES, [[1, 1, 2, 2]], [1]), 64, 64)
+    _, data = write(writer, json_path, images)
+    by_image = {}
+    for a in json.loads(data)['annotations']:
+        by_image.setdefault(a['image_id'], []).append(a['bbox'])
+    assert by_image[0] == [[7.0, 7.0, 7.0, 7.0]] and by_image[2] == [[1.0, 1.0, 2.0, 2.0]]
+
+
+def test_filters_small_boxes_and_unknown_labels(dataset):
+    tmp_path, images = dataset
+    writer = new_writer(min_box_size=4)
+    store = BoxStore(CLASSES + ['bird'], [[0, 0, 10, 10], [0, 0, 3, 10], [0, 0, 10, 10]], [0, 1, 2])
+    _, data = write(writer, str(tmp_path / 'coco.json'), images, current=(images[2], store, 64, 64))
+    anns = [a for a in json.loads(data)['annotations'] if a['image_id'] == 2]
+    assert [(a['category_id'], a['bbox']) for a in anns] == [(0, [0.0, 0.0, 10.0, 10.0])]
+    assert writer.entry_for(store, CLASSES)[1] == ['cat']
+
+
+def test_class_change_and_removed_images_rebuild(dataset):
+    tmp_path, images = dataset
+    json_path = str(tmp_path / 'coco.json')
+    writer = new_writer()
+    write(writer, json_path, images)
+    (_, rebuilt), data = write(writer, json_path, images, classes=['dog', 'cat'])
+    assert rebuilt == 3
+    # YOLO 文件存的是类别编号，换了类别表后按新表输出类别名
+    assert [c['name'] for c in json.loads(data)['categories']] == ['dog', 'cat']
+    (written, _), data = write(writer, json_path, images[:2], classes=['dog', 'cat'])
+    assert written == 2 and len(writer) == 2
+    assert [i['file_name'] for i in json.loads(data)['images']] == ['a.jpg', 'b.jpg']
+
+
+def test_images_without_size_are_skipped(dataset):
+    tmp_path, images = dataset
+    unknown = str(tmp_path / 'missing.jpg')
+    (written, _), data = write(new_writer(), str(tmp_path / 'coco.json'), images + [unknown])
+    assert written == 3
+    assert 'missing.jpg' not in [i['file_name'] for i in json.loads(data)['images']]
@@ -0,0 +1,114 @@
+from labelimg.core.bounding_box import BoundingBox
+from labelimg.core.history import Edit, EditHistory, box_state
+
+
+def make_boxes(n):
+    return [BoundingBox(10 * i, 10 * i, 5, 5, 'cat') for i in range(n)]
+
+
+def move(boxes, i, dx, coalesce=None):
+    """Move box ``i`` by ``dx`` and return the matching Edit."""
+    before = box_state(boxes[i])
+    boxes[i].x += dx
+    return Edit(len(boxes), modified=[(i, before, box_state(boxes[i]))], coalesce=coalesce)
+
+
+def add(boxes, box):
+    boxes.append(box)
+    return Edit(len(boxes) - 1, added=[(len(boxes) - 1, box_state(box))])
+
+
+def test_drag_steps_with_same_key_coalesce_into_one_undo():
+    history = EditHistory(coalesce_window=60)
+    boxes = make_boxes(2)
+    for _ in range(5):
+        history.record('a', move(boxes, 0, 3, coalesce=('drag', 0)))
+    assert boxes[0].x == 15
+    assert history.undo('a', boxes)
+    assert boxes[0].x == 0
+    assert not history.can_undo('a')
+    assert history.redo('a', boxes)
+    assert boxes[0].x == 15
+
+
+def test_different_key_or_expired_window_starts_a_new_step():
+    history = EditHistory(coalesce_window=60)
+    boxes = make_boxes(2)
+    history.record('a', move(boxes, 0, 1, coalesce=('drag', 0)))
+    history.record('a', move(boxes, 1, 1, coalesce=('drag', 1)))
+    assert history.undo('a', boxes) and boxes[1].x == 10 and boxes[0].x == 1
+    assert history.undo('a', boxes) and boxes[0].x == 0
+
+    history = EditHistory(coalesce_window=0)
+    boxes = make_boxes(1)
+    first = move(boxes, 0, 1, coalesce='k')
+    second = move(boxes, 0, 1, coalesce='k')
+    second.stamp = first.stamp + 1
+    history.record('a', first)
+    history.record('a', second)
+    assert history.undo('a', boxes) and boxes[0].x == 1
+
+
+def test_undo_then_new_edit_does_not_coalesce_and_drops_redo():
+    history = EditHistory(coalesce_window=60)
+    boxes = make_boxes(1)
+    history.record('a', move(boxes, 0, 1, coalesce='k'))
+    history.record('a', move(boxes, 0, 1, coalesce='k'))
+    history.undo('a', boxes)
+    history.redo('a', boxes)
+    history.record('a', move(boxes, 0, 1, coalesce='k'))
+    assert not history.can_redo('a')
+    assert history.undo('a', boxes) and boxes[0].x == 2
+
+
+def test_structural_edit_round_trip():
+    history = EditHistory()
+    boxes = make_boxes(1)
+    history.record('a', add(boxes, BoundingBox(1, 2, 3, 4, 'dog')))
+    assert history.undo('a', boxes) and len(boxes) == 1
+    assert history.redo('a', boxes) and box_state(boxes[1]) == (1, 2, 3, 4, 'dog', None)
+
+
+def test_max_steps_keeps_the_newest_steps():
+    history = EditHistory(max_steps=3)
+    boxes = make_boxes(1)
+    for _ in range(5):
+        history.record('a', move(boxes, 0, 1))
+    undone = 0
+    while history.undo('a', boxes):
+        undone += 1
+    assert undone == 3 and boxes[0].x == 2
+
+
+def test_global_budget_evicts_least_recently_edited_image_first():
+    # 每个原地修改记 2 个框状态
+    history = EditHistory(max_states=8)
+    lists = {key: make_boxes(1) for key in 'abc'}
+    for key in 'ab':
+        history.record(key, move(lists[key], 0, 1))
+        history.record(key, move(lists[key], 0, 1))
+    assert history.size == 8
+    history.record('a', move(lists['a'], 0, 1))  # a 变为最近编辑
+    history.record('c', move(lists['c'], 0, 1))
+    assert history.size <= 8
+    assert not history.can_undo('b')
+    assert history.can_undo('a') and history.can_undo('c')
+
+
+def test_budget_trims_the_current_image_when_it_alone_is_over():
+    history = EditHistory(max_states=4)
+    boxes = make_boxes(1)
+    for _ in range(4):
+        history.record('a', move(boxes, 0, 1))
+    assert history.size <= 4
+    assert history.undo('a', boxes)
+
+
+def test_mismatched_list_clears_history_instead_of_corrupting():
+    history = EditHistory()
+    boxes = make_boxes(1)
+    history.record('a', move(boxes, 0, 5))
+    boxes[0].x = 100  # 历史以外的修改
+    assert not history.undo('a', boxes)
+    assert boxes[0].x == 100
+    assert not history.can_undo('a') and history.size == 0
@@ -0,0 +1,132 @@
+import os
+
+from labelimg.core import journal as journal_mod
+from labelimg.core.bounding_box import BoundingBox
+from labelimg.core.history import Edit, EditHistory, box_state
+from labelimg.core.journal import EditJournal
+
+
+def move(boxes, i, dx, coalesce=None):
+    before = box_state(boxes[i])
+    boxes[i].x += dx
+    return Edit(len(boxes), modified=[(i, before, box_state(boxes[i]))], coalesce=coalesce)
+
+
+def add(boxes, x):
+    boxes.append(BoundingBox(x, x, 5, 5, 'cat'))
+    return Edit(len(boxes) - 1, added=[(len(boxes) - 1, box_state(boxes[-1]))])
+
+
+def states(edits):
+    return [(e.count, e.modified, e.removed, e.added) for e in edits]
+
+
+def test_replay_restores_undo_and_redo_across_sessions(tmp_path):
+    img = str(tmp_path / 'a.jpg')
+    history = EditHistory(journal=EditJournal(str(tmp_path)))
+    boxes = []
+    for x in range(3):
+        history.record(img, add(boxes, x))
+    history.undo(img, boxes)
+    history.journal.close()
+
+    reopened = EditHistory(journal=EditJournal(str(tmp_path)))
+    assert reopened.redo(img, boxes) and len(boxes) == 3
+    assert reopened.undo(img, boxes) and reopened.undo(img, boxes) and len(boxes) == 1
+
+
+def test_replay_merges_coalesced_drags(tmp_path):
+    img = str(tmp_path / 'a.jpg')
+    history = EditHistory(coalesce_window=60, journal=EditJournal(str(tmp_path)))
+    boxes = [BoundingBox(0, 0, 5, 5, 'cat')]
+    for _ in range(4):
+        history.record(img, move(boxes, 0, 2, coalesce='drag'))
+    history.journal.close()
+
+    undo, redo = EditJournal(str(tmp_path)).replay(img)
+    assert len(undo) == 1 and not redo
+    assert undo[0].revert(boxes) and boxes[0].x == 0
+
+
+def test_reset_drops_earlier_history(tmp_path):
+    img = str(tmp_path / 'a.jpg')
+    history = EditHistory(journal=EditJournal(str(tmp_path)))
+    boxes = []
+    history.record(img, add(boxes, 1))
+    history.clear(img)
+    history.record(img, add(boxes, 2))
+    history.journal.close()
+    undo, _ = EditJournal(str(tmp_path)).replay(img)
+    assert states(undo) == states([Edit(1, added=[(1, (2, 2, 5, 5, 'cat', None))])])
+
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    img = str(tmp_path / 'a.jpg')
+    journal = EditJournal(str(tmp_path))
+    journal.log_edit(img, Edit(0, added=[(0, (1, 1, 5, 5, 'cat', None))]))
+    journal.close()
+    with open(journal.path, 'ab') as f:
+        f.write(b'a.jpg\t\t{"n":1,"a":[[1,')
+    undo, _ = EditJournal(str(tmp_path)).replay(img)
+    assert len(undo) == 1
+    with open(journal.path, 'rb') as f:
+        assert f.read().endswith(b'\n')
+
+
+def test_batch_revert_inverts_every_image_of_the_batch(tmp_path):
+    journal = EditJournal(str(tmp_path))
+    first = journal.start_batch('first')
+    second = journal.start_batch('second')
+    lists = {}
+    for name in ('a.jpg', 'b.jpg'):
+        lists[name] = [BoundingBox(0, 0, 5, 5, 'dog')]
+        journal.log_edit(str(tmp_path / name), add(lists[name], 10), batch=first)
+    journal.log_edit(str(tmp_path / 'a.jpg'), add(lists['a.jpg'], 20), batch=second)
+
+    assert [b['note'] for b in journal.batches()] == ['second', 'first']
+    assert [b['images'] for b in journal.batches()] == [1, 2]
+    edits = journal.batch_edits(first)
+    assert sorted(name for name, _ in edits) == ['a.jpg', 'b.jpg']
+    # a.jpg 之后又被第二批修改过，第一批的反向编辑不再适用
+    results = {name: edit.inverted().apply(lists[name]) for name, edit in edits}
+    assert results == {'a.jpg': False, 'b.jpg': True}
+    assert len(lists['b.jpg']) == 1
+
+
+def test_compaction_keeps_stacks_and_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_mod, 'COMPACT_BYTES', 1)
+    directory = str(tmp_path)
+    journal = EditJournal(directory)
+    batch = journal.start_batch('auto')
+    a, b, c = (str(tmp_path / name) for name in ('a.jpg', 'b.jpg', 'c.jpg'))
+    boxes = {}
+    history = EditHistory(coalesce_window=60, journal=journal)
+    boxes[a] = []
+    history.record(a, add(boxes[a], 0), batch=batch)
+    for _ in range(5):
+        history.record(a, move(boxes[a], 0, 1, coalesce='drag'))
+    history.record(a, add(boxes[a], 50))
+    history.undo(a, boxes[a])
+    boxes[b] = []
+    for x in range(10):
+        history.record(b, add(boxes[b], x))
+    history.clear(b)
+    boxes[c] = []
+    history.record(c, add(boxes[c], 1), batch=batch)
+    expected = {key: tuple(states(s) for s in journal.replay(key)) for key in (a, b, c)}
+    expected_batch = [(name, states([edit])) for name, edit in journal.batch_edits(batch)]
+    journal.close()
+    before = os.path.getsize(journal.path)
+
+    compacted = EditJournal(directory)
+    assert os.path.getsize(compacted.path) < before
+    assert {key: tuple(states(s) for s in compacted.replay(key)) for key in (a, b, c)} == expected
+    assert [(name, states([edit])) for name, edit in compacted.batch_edits(batch)] == expected_batch
+    assert compacted.batches()[0]['images'] == 2
+
+    # 压缩后继续追加，重新打开时不会再次压缩
+    compacted.log_edit(c, add(boxes[c], 2))
+    compacted.close()
+    size = os.path.getsize(compacted.path)
+    assert len(EditJournal(directory).replay(c)[0]) == 2
+    assert os.path.getsize(compacted.path) == size
@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from labelimg.inference.pipeline import AutoLabelPipeline, DecodedImage, decode_image
+
+TARGETS = [f"img_{i:03d}.jpg" for i in range(23)]
+
+
+def fake_decode(path, max_side=None):
+    """Decoded 'image' that carries its index; img_005 cannot be read."""
+    time.sleep(random.random() * 0.002)  # 打乱解码完成的顺序
+    if path == "img_005.jpg":
+        return DecodedImage(None, (1.0, 1.0), f"Cannot read image: {path}")
+    return DecodedImage(np.full((4, 4), int(path[4:7])), (0.5, 0.5), None)
+
+
+def fake_predict(images):
+    return [[{'bbox': [int(image[0, 0]), 0, 2, 2], 'class_id': 0, 'confidence': 0.9}] for image in images]
+
+
+def pipeline(predict=fake_predict, **kwargs):
+    kwargs.setdefault('batch_size', 4)
+    kwargs.setdefault('decode_workers', 3)
+    return AutoLabelPipeline(predict, decode=fake_decode, **kwargs)
+
+
+def worker_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('autolabel')]
+
+
+def test_results_come_back_in_target_order_and_rescaled():
+    results = list(pipeline().results(TARGETS))
+    assert [r.item for r in results] == TARGETS
+    assert results[5].predictions is None and "Cannot read" in results[5].error
+    assert results[7].predictions == [{'bbox': [14.0, 0.0, 4.0, 4.0], 'class_id': 0, 'confidence': 0.9}]
+    assert not worker_threads()
+
+
+def test_failed_batch_marks_only_its_own_images():
+    def predict(images):
+        if any(int(image[0, 0]) == 9 for image in images):
+            raise RuntimeError("out of memory")
+        return [None if int(image[0, 0]) == 1 else [] for image in images]
+
+    results = list(pipeline(predict).results(TARGETS))
+    failed = {r.item: r.error for r in results if r.error}
+    assert set(failed) == {"img_001.jpg", "img_005.jpg", "img_008.jpg", "img_009.jpg", "img_010.jpg",
+                           "img_011.jpg"}
+    assert failed["img_009.jpg"] == "out of memory"
+    assert "Prediction failed" in failed["img_001.jpg"]
+
+
+def test_run_writes_on_the_calling_thread_and_counts():
+    written = []
+    caller = threading.get_ident()
+
+    def write(path, predictions):
+        assert threading.get_ident() == caller
+        written.append(path)
+        return path != "img_002.jpg"
+
+    stats = pipeline().run(TARGETS, write)
+    assert written == [t for t in TARGETS if t != "img_005.jpg"]
+    assert (stats['total'], stats['succeeded'], stats['failed'], stats['cancelled']) == (23, 21, 2, False)
+
+
+def test_cancel_stops_early_and_stays_cancelled():
+    p = pipeline(batch_size=2)
+    seen = []
+
+    def on_result(result):
+        seen.append(result.item)
+        if len(seen) == 3:
+            p.cancel()
+
+    stats = p.run(TARGETS, lambda path, predictions: True, on_result)
+    assert stats['cancelled'] and len(seen) == 3
+    assert not worker_threads()
+    assert list(p.results(TARGETS)) == []
+
+
+def test_breaking_out_of_results_stops_the_stages():
+    p = pipeline(batch_size=2, queue_batches=1)
+    for i, _ in enumerate(p.results(TARGETS)):
+        if i == 1:
+            break
+    assert not worker_threads()
+    assert len(list(p.results(TARGETS))) == len(TARGETS)  # 提前结束不等于取消，可以再次运行
+
+
+def test_stage_errors_are_reraised():
+    def targets():
+        yield TARGETS[0]
+        raise OSError("listing failed")
+
+    with pytest.raises(OSError, match="listing failed"):
+        list(pipeline().results(targets()))
+    assert not worker_threads()
+
+
+def test_pause_holds_results_until_resumed():
+    p = pipeline(batch_size=2)
+    p.pause()
+    results = []
+    consumer = threading.Thread(target=lambda: results.extend(p.results(TARGETS[:6])))
+    consumer.start()
+    time.sleep(0.3)
+    assert p.paused and results == []
+    p.resume()
+    consumer.join(5)
+    assert [r.item for r in results] == TARGETS[:6]
+
+
+def test_decode_image_shrinks_to_max_side(tmp_path):
+    cv2 = pytest.importorskip('cv2')
+    path = str(tmp_path / 'wide.png')
+    cv2.imwrite(path, np.zeros((50, 200, 3), np.uint8))
+    decoded = decode_image(path, max_side=100)
+    assert decoded.image.shape[:2] == (25, 100) and decoded.scale == (0.5, 0.5)
+    assert decode_image(path).scale == (1.0, 1.0)
+    assert decode_image(str(tmp_path / 'missing.png')).error
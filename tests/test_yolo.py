@@ -0,0 +1,44 @@
+import numpy as np
+
+from labelimg.io.yolo import format_yolo, read_yolo_rows
+
+
+def read(tmp_path, text):
+    path = tmp_path / 'a.txt'
+    path.write_text(text)
+    return read_yolo_rows(str(path))
+
+
+def test_well_formed_file(tmp_path):
+    rows = read(tmp_path, "0 0.5 0.5 0.2 0.2\n\n1 0.1 0.2 0.3 0.4\n")
+    assert rows.tolist() == [[0, 0.5, 0.5, 0.2, 0.2], [1, 0.1, 0.2, 0.3, 0.4]]
+
+
+def test_empty_file(tmp_path):
+    assert read(tmp_path, "").shape == (0, 5)
+    assert read(tmp_path, "\n  \n").shape == (0, 5)
+
+
+def test_mixed_column_counts_do_not_merge_into_bogus_rows(tmp_path):
+    rows = read(tmp_path, "0 0.5 0.5 0.2\n1 0.5 0.5 0.2 0.2 0.9\n2 0.1 0.1 0.1 0.1\n")
+    assert rows.tolist() == [[2, 0.1, 0.1, 0.1, 0.1]]
+
+
+def test_non_integer_and_negative_class_ids_are_skipped(tmp_path, capsys):
+    rows = read(tmp_path, "1.7 0.5 0.5 0.2 0.2\n-1 0.5 0.5 0.2 0.2\n3 0.5 0.5 0.2 0.2\n")
+    assert rows.tolist() == [[3, 0.5, 0.5, 0.2, 0.2]]
+    assert capsys.readouterr().out.count("Error parsing YOLO line") == 2
+    # 列数不齐时走逐行解析，同样跳过
+    rows = read(tmp_path, "1.7 0.5 0.5 0.2 0.2\n0 0.5\n2 0.5 0.5 0.2 0.2\n")
+    assert rows.tolist() == [[2, 0.5, 0.5, 0.2, 0.2]]
+
+
+def test_non_numeric_values_are_skipped(tmp_path):
+    rows = read(tmp_path, "0 0.5 abc 0.2 0.2\n1 0.5 0.5 0.2 0.2\n")
+    assert rows.tolist() == [[1, 0.5, 0.5, 0.2, 0.2]]
+
+
+def test_round_trip_with_format_yolo(tmp_path):
+    norm = np.array([[0.5, 0.25, 0.125, 0.75]])
+    rows = read(tmp_path, format_yolo([4], norm))
+    assert rows[:, 0].tolist() == [4] and np.allclose(rows[:, 1:], norm)